@@ -0,0 +1,405 @@
+"""
+FAIR-y Export Benchmarks
+
+Headless timing of the export paths on synthetic drawings, so exporter
+changes can be compared on the same machine. No GUI is started.
+
+Dependencies: pymupdf, numpy, openpyxl (same as the app)
+
+Usage:
+    python fairy_benchmark.py            # run every benchmark
+    python fairy_benchmark.py pdf        # run selected benchmarks by name
+    python fairy_benchmark.py parallel   # multi-process export, 1..N workers
+    python fairy_benchmark.py profiles   # time and size per save profile
+    python fairy_benchmark.py report     # Excel FAIR report generation per engine
+    python fairy_benchmark.py refresh    # updating an existing report vs writing it again
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from copy import copy
+
+import fitz
+import numpy as np
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import range_boundaries
+
+from fairy_pdf import (
+    SAVE_PROFILES,
+    draw_page_balloons,
+    export_ballooned_pdf,
+    export_ballooned_pdf_file,
+)
+from fairy_numeric import number_format
+from fairy_report import ReportLayout, refresh_report, save_report_file
+from fairy_store import BalloonStore
+
+# =============================================================================
+# CONFIGURABLE CONSTANTS
+# =============================================================================
+
+# (pages, balloons) sizes for the ballooned PDF export benchmark
+PDF_EXPORT_SIZES = [(25, 500), (50, 1000), (100, 2000), (200, 4000)]
+
+# Largest size also timed with the old per-page copy + full balloon scan
+LEGACY_PDF_MAX_PAGES = 100
+
+# (pages, balloons) for the multi-process export scaling benchmark
+PARALLEL_EXPORT_SIZE = (320, 6400)
+
+# (pages, balloons) for the save profile comparison
+SAVE_PROFILE_SIZE = (100, 2000)
+
+# Balloon counts for the Excel report benchmark
+REPORT_SIZES = [1000, 10000, 50000]
+
+# Largest count also timed with the old insert_rows + per-cell style copying
+LEGACY_REPORT_MAX_BALLOONS = 10000
+
+# Balloon counts for the report refresh benchmark, and the balloons edited,
+# added and removed between the saved report and the refresh
+REFRESH_SIZES = [1000, 10000]
+REFRESH_EDITS = 10
+
+# Balloons kept when a report is shrunk below the template's data rows
+REFRESH_SHRINK_TO = 5
+
+# Synthetic report template shaped like FORMAT.xlsx (test.py)
+REPORT_LAYOUT = ReportLayout(start_row=8, template_rows=15)
+REPORT_COLUMNS = ("sheet", "zone", "no", "char", "req", "neg", "pos", "lower", "upper", "equip")
+REPORT_TEMPLATE_COLUMNS = 16
+REPORT_FOOTER_MERGES = ["A24:C24", "D24:P24", "A25:C25", "D25:P25", "A26:C26", "D26:E26", "F26:I26", "N26:P26"]
+
+# A3 landscape, in points
+PAGE_WIDTH, PAGE_HEIGHT = 1191, 842
+
+RANDOM_SEED = 1234
+
+BALLOON_COLORS = ["#ff0000", "#0095ff", "#00aa00"]
+
+
+# =============================================================================
+# SYNTHETIC INPUTS
+# =============================================================================
+
+def make_drawing(pages):
+    """Multi-page drawing with a title block, grid lines and shared fonts."""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        shape = page.new_shape()
+        for x in range(40, PAGE_WIDTH - 40, 60):
+            shape.draw_line((x, 40), (x, PAGE_HEIGHT - 40))
+        for y in range(40, PAGE_HEIGHT - 40, 60):
+            shape.draw_line((40, y), (PAGE_WIDTH - 40, y))
+        shape.finish(color=(0.6, 0.6, 0.6), width=0.3)
+        shape.commit()
+        page.insert_text((60, PAGE_HEIGHT - 60), f"DRAWING SHEET {i + 1} OF {pages}", fontsize=14)
+        for row in range(20):
+            page.insert_text((60, 80 + row * 30), f"NOTE {row + 1}: TOLERANCE +/-0.{row % 10} UNLESS STATED", fontsize=8)
+    return doc
+
+
+def make_balloons(pages, count, rng):
+    store = BalloonStore()
+    for i in range(count):
+        two_point = i % 3 == 0
+        x = rng.uniform(60, PAGE_WIDTH - 60)
+        y = rng.uniform(60, PAGE_HEIGHT - 60)
+        store.append({
+            "page": rng.randrange(pages),
+            "x": x,
+            "y": y,
+            "r": rng.choice((6, 6, 6, 8, 10)),
+            "color": rng.choice(BALLOON_COLORS),
+            "start_x": x - 25 if two_point else None,
+            "start_y": y + 25 if two_point else None,
+        })
+    return store
+
+
+def make_report_template(path):
+    """Report template with a header, bordered data rows and a merged footer."""
+    wb = Workbook()
+    ws = wb.active
+    thin = Side(style="thin")
+    ws.merge_cells("A1:P1")
+    ws["A1"] = "FIRST ARTICLE INSPECTION REPORT"
+    ws["A1"].font = Font(bold=True, size=14)
+    for column in range(1, REPORT_TEMPLATE_COLUMNS + 1):
+        ws.cell(row=REPORT_LAYOUT.start_row - 1, column=column, value=f"H{column}").font = Font(bold=True)
+    for row in range(REPORT_LAYOUT.start_row, REPORT_LAYOUT.footer_row):
+        ws.row_dimensions[row].height = 18
+        for column in range(1, REPORT_TEMPLATE_COLUMNS + 1):
+            cell = ws.cell(row=row, column=column)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    for row in range(REPORT_LAYOUT.footer_row + 1, REPORT_LAYOUT.footer_row + 4):
+        ws.row_dimensions[row].height = 30
+        ws.cell(row=row, column=1, value=f"Footer {row}").font = Font(italic=True)
+    for rng in REPORT_FOOTER_MERGES:
+        ws.merge_cells(rng)
+    wb.save(path)
+
+
+def make_report_balloons(count, rng):
+    store = BalloonStore()
+    for i in range(count):
+        store.append({
+            "page": rng.randrange(20),
+            "zone": f"{'ABCDEF'[i % 6]}{i % 8 + 1}",
+            "char": rng.choice(("Diameter", "Length", "Flatness", "Thread")),
+            "req": rng.choice(("10", "12.50", "3.125", "M8")),
+            "neg": rng.choice(("0.1", "0.05", "")),
+            "pos": rng.choice(("0.1", "0.200", "")),
+            "equip": rng.choice(("CMM", "Caliper", "Gauge")),
+        })
+    return store
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+def _per_page_export(doc, out_path, balloons):
+    """The previous exporter: one insert_pdf per page, full balloon scan per page."""
+    pages = balloons["page"].tolist()
+    out = fitz.open()
+    for i in range(len(doc)):
+        out.insert_pdf(doc, from_page=i, to_page=i)
+        on_page = [j for j, page in enumerate(pages) if page == i]
+        draw_page_balloons(out[i], balloons, np.array(on_page, dtype=np.intp))
+    out.save(out_path)
+    out.close()
+
+
+def bench_pdf_export(workdir):
+    """Ballooned PDF export; time per (pages + balloons) should stay flat."""
+    rng = random.Random(RANDOM_SEED)
+    print(f"{'pages':>6} {'balloons':>9} {'export s':>9} {'us/item':>8} {'size KB':>8} {'legacy s':>9}")
+    for pages, count in PDF_EXPORT_SIZES:
+        doc = make_drawing(pages)
+        snapshot = make_balloons(pages, count, rng).snapshot()
+        out_path = os.path.join(workdir, f"ballooned_{pages}.pdf")
+        seconds = timed(export_ballooned_pdf, doc, out_path, snapshot)
+        size_kb = os.path.getsize(out_path) / 1024
+        legacy = "-"
+        if pages <= LEGACY_PDF_MAX_PAGES:
+            legacy = f"{timed(_per_page_export, doc, out_path, snapshot):9.3f}"
+        per_item = seconds / (pages + count) * 1e6
+        print(f"{pages:>6} {count:>9} {seconds:>9.3f} {per_item:>8.1f} {size_kb:>8.0f} {legacy:>9}")
+        doc.close()
+
+
+def bench_parallel_export(workdir):
+    """Multi-process PDF export scaling from 1 worker (serial path) to all cores."""
+    pages, count = PARALLEL_EXPORT_SIZE
+    doc = make_drawing(pages)
+    pdf_path = os.path.join(workdir, "pack.pdf")
+    doc.save(pdf_path)
+    doc.close()
+    snapshot = make_balloons(pages, count, random.Random(RANDOM_SEED)).snapshot()
+    out_path = os.path.join(workdir, "pack_ballooned.pdf")
+
+    cores = os.cpu_count() or 1
+    print(f"{pages} pages, {count} balloons, {cores} core(s)")
+    print(f"{'workers':>8} {'export s':>9} {'speedup':>8}")
+    serial = timed(export_ballooned_pdf_file, pdf_path, out_path, snapshot, 0, None, 1)
+    print(f"{1:>8} {serial:>9.3f} {1.0:>8.2f}")
+    # Through the same entry point as the app; 2 workers run even on one core
+    for workers in range(2, max(cores, 2) + 1):
+        seconds = timed(export_ballooned_pdf_file, pdf_path, out_path, snapshot, 0, None, workers)
+        with fitz.open(out_path) as out:
+            if len(out) != pages:
+                raise AssertionError(f"{workers} workers wrote {len(out)} of {pages} pages")
+        print(f"{workers:>8} {seconds:>9.3f} {serial / seconds:>8.2f}")
+
+
+def bench_save_profiles(workdir):
+    """Ballooned PDF export time and output size per save profile."""
+    pages, count = SAVE_PROFILE_SIZE
+    doc = make_drawing(pages)
+    source_path = os.path.join(workdir, "source.pdf")
+    doc.save(source_path)
+    source_kb = os.path.getsize(source_path) / 1024
+    snapshot = make_balloons(pages, count, random.Random(RANDOM_SEED)).snapshot()
+    print(f"{pages} pages, {count} balloons, source {source_kb:.0f} KB")
+    print(f"{'profile':>9} {'export s':>9} {'size KB':>8} {'vs source':>10}")
+    for profile in SAVE_PROFILES:
+        out_path = os.path.join(workdir, f"ballooned_{profile}.pdf")
+        seconds = timed(export_ballooned_pdf, doc, out_path, snapshot, 0, None, profile)
+        size_kb = os.path.getsize(out_path) / 1024
+        print(f"{profile:>9} {seconds:>9.3f} {size_kb:>8.0f} {size_kb / source_kb:>9.2f}x")
+    doc.close()
+
+
+def _legacy_report(template_path, out_path, balloons):
+    """The previous report path: insert_rows, footer re-merge, two style passes."""
+    wb = load_workbook(template_path)
+    ws = wb.active
+    start_row = REPORT_LAYOUT.start_row
+    insert_at = REPORT_LAYOUT.footer_row
+    footer_heights = {row: ws.row_dimensions[row].height for row in range(insert_at + 1, insert_at + 4)}
+
+    def copy_row_style(src_row, dest_row, clear_values=True):
+        for column in range(1, ws.max_column + 1):
+            dest = ws.cell(row=dest_row, column=column)
+            dest._style = copy(ws.cell(row=src_row, column=column)._style)
+            if clear_values:
+                dest.value = None
+        ws.row_dimensions[dest_row].height = ws.row_dimensions[src_row].height
+
+    extra_rows = REPORT_LAYOUT.extra_rows(len(balloons))
+    if extra_rows:
+        ws.insert_rows(insert_at, amount=extra_rows)
+        for i in range(extra_rows):
+            copy_row_style(insert_at - 1, insert_at + i)
+        for rng in REPORT_FOOTER_MERGES:
+            ws.unmerge_cells(rng)
+        for rng in REPORT_FOOTER_MERGES:
+            min_col, min_row, max_col, max_row = range_boundaries(rng)
+            ws.merge_cells(start_row=min_row + extra_rows, start_column=min_col,
+                           end_row=max_row + extra_rows, end_column=max_col)
+        for row, height in footer_heights.items():
+            ws.row_dimensions[row + extra_rows].height = height
+    for row in range(start_row, start_row + len(balloons) + 1):
+        copy_row_style(start_row, row, clear_values=False)
+    for row, balloon in enumerate(balloons, start_row):
+        for column, field in enumerate(REPORT_COLUMNS, 1):
+            cell = ws.cell(row=row, column=column)
+            if field == "sheet":
+                cell.value = balloon["page"] + 1
+            else:
+                cell.value = balloon[field]
+            if field in ("sheet", "req", "neg", "pos", "lower", "upper"):
+                cell.number_format = number_format(cell.value)
+    wb.save(out_path)
+
+
+def peak_mb(fn, *args):
+    """Peak Python heap growth while running ``fn``, in MB."""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def _sheet_contents(path):
+    """Cell values and formats, merges and row heights of a report's sheet."""
+    ws = load_workbook(path).active
+    cells = {
+        cell.coordinate: (cell.value, cell.number_format, copy(cell.font), copy(cell.border), copy(cell.fill),
+                          copy(cell.alignment))
+        for row in ws.iter_rows() for cell in row if cell.value is not None or cell.has_style
+    }
+    heights = {row: dim.height for row, dim in ws.row_dimensions.items() if dim.height}
+    return cells, {str(rng) for rng in ws.merged_cells.ranges}, heights
+
+
+def bench_report(workdir):
+    """Excel FAIR report generation per engine/mode, including the save."""
+    template_path = os.path.join(workdir, "FORMAT.xlsx")
+    make_report_template(template_path)
+    rng = random.Random(RANDOM_SEED)
+    modes = {
+        "ooxml": {"engine": "ooxml"},
+        "openpyxl": {"engine": "openpyxl", "streaming": False},
+        "stream": {"engine": "openpyxl", "streaming": True},
+    }
+    print(f"{'balloons':>9}" + "".join(f" {mode + ' s':>10} {'MB':>6}" for mode in modes)
+          + f" {'same':>5} {'legacy s':>9} {'speedup':>8}")
+    for count in REPORT_SIZES:
+        balloons = make_report_balloons(count, rng)
+        columns = []
+        seconds = {}
+        for mode, options in modes.items():
+            out_path = os.path.join(workdir, f"report_{mode}.xlsx")
+            args = (template_path, out_path, REPORT_LAYOUT, REPORT_COLUMNS, balloons)
+            seconds[mode] = timed(lambda: save_report_file(*args, **options))
+            columns.append(f"{seconds[mode]:>10.3f} {peak_mb(lambda: save_report_file(*args, **options)):>6.1f}")
+        # The patched workbook must read back exactly like the openpyxl one
+        same = _sheet_contents(os.path.join(workdir, "report_ooxml.xlsx")) == _sheet_contents(
+            os.path.join(workdir, "report_openpyxl.xlsx"))
+        legacy = speedup = "-"
+        if count <= LEGACY_REPORT_MAX_BALLOONS:
+            legacy_seconds = timed(_legacy_report, template_path, os.path.join(workdir, "report_legacy.xlsx"), balloons)
+            legacy = f"{legacy_seconds:9.3f}"
+            speedup = f"{legacy_seconds / seconds['ooxml']:8.1f}"
+        print(f"{count:>9} {' '.join(columns)} {'yes' if same else 'NO':>5} {legacy:>9} {speedup:>8}")
+
+
+def bench_refresh(workdir):
+    """Refreshing a saved report after a few edits vs writing it again."""
+    template_path = os.path.join(workdir, "FORMAT.xlsx")
+    make_report_template(template_path)
+    rng = random.Random(RANDOM_SEED)
+    fields = ("page",) + tuple(field for field in REPORT_COLUMNS if field != "sheet")
+    # (balloons, shrink): a few edits, or all but the first balloons removed,
+    # which takes the data back below the template's data rows
+    cases = [(count, False) for count in REFRESH_SIZES] + [(REPORT_LAYOUT.template_rows + 4, True)]
+    print(f"{'balloons':>9} {'after':>6} {'full s':>8} {'refresh s':>10} {'changed':>8} {'same':>5}")
+    for count, shrink in cases:
+        rows = make_report_balloons(count, rng).rows(fields)
+        report_path = os.path.join(workdir, "report_refresh.xlsx")
+        full_path = os.path.join(workdir, "report_full.xlsx")
+        save_report_file(template_path, report_path, REPORT_LAYOUT, REPORT_COLUMNS, rows)
+
+        if shrink:
+            del rows[REFRESH_SHRINK_TO:]
+        else:
+            for _ in range(REFRESH_EDITS):
+                rows[rng.randrange(len(rows))]["char"] = "Edited"
+                rows.insert(rng.randrange(len(rows)), dict(rows[0], char="Added"))
+                del rows[rng.randrange(len(rows))]
+        for number, row in enumerate(rows, 1):
+            row["no"] = number
+
+        full = timed(save_report_file, template_path, full_path, REPORT_LAYOUT, REPORT_COLUMNS, rows)
+        start = time.perf_counter()
+        changed = sum(refresh_report(template_path, report_path, REPORT_LAYOUT, REPORT_COLUMNS, rows))
+        refresh = time.perf_counter() - start
+        # The refreshed report must read back like one written from scratch,
+        # cell formats, merges and row heights included
+        same = _sheet_contents(report_path) == _sheet_contents(full_path)
+        print(f"{count:>9} {len(rows):>6} {full:>8.3f} {refresh:>10.3f} {changed:>8} {'yes' if same else 'NO':>5}")
+
+
+BENCHMARKS = {
+    "pdf": bench_pdf_export,
+    "parallel": bench_parallel_export,
+    "profiles": bench_save_profiles,
+    "report": bench_report,
+    "refresh": bench_refresh,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        return 2
+    with tempfile.TemporaryDirectory(prefix="fairy_bench_") as workdir:
+        for name in names:
+            print(f"\n== {name}: {BENCHMARKS[name].__doc__.strip()}")
+            BENCHMARKS[name](workdir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
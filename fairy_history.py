@@ -0,0 +1,66 @@
+"""Bounded undo/redo history for FAIR-y project edits."""
+
+from collections import deque
+
+DEFAULT_HISTORY_LIMIT = 200
+
+
+class History:
+    """Undo/redo stacks of reversible commands.
+
+    A command is recorded after it has been applied, as a label plus the
+    ``undo`` and ``redo`` callables that reverse and re-apply it. Callers keep
+    commands compact by capturing only what changed (a balloon reference and
+    its old/new field values, an old/new setting). Both stacks are deques
+    capped at ``limit`` entries, so every step is O(1) and the oldest commands
+    are dropped once the limit is reached.
+    """
+
+    def __init__(self, limit=DEFAULT_HISTORY_LIMIT):
+        self._undo = deque(maxlen=max(1, int(limit)))
+        self._redo = deque(maxlen=max(1, int(limit)))
+
+    @property
+    def limit(self):
+        return self._undo.maxlen
+
+    @limit.setter
+    def limit(self, value):
+        value = max(1, int(value))
+        self._undo = deque(self._undo, maxlen=value)
+        self._redo = deque(self._redo, maxlen=value)
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def record(self, label, undo, redo):
+        """Push an applied command; any redo branch is discarded."""
+        self._undo.append((label, undo, redo))
+        self._redo.clear()
+
+    def undo(self):
+        """Reverse the latest command; returns its label, or None if empty."""
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        command[1]()
+        self._redo.append(command)
+        return command[0]
+
+    def redo(self):
+        """Re-apply the latest undone command; returns its label, or None."""
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        command[2]()
+        self._undo.append(command)
+        return command[0]
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
@@ -0,0 +1,77 @@
+"""Background jobs for long-running exports.
+
+A job runs its work function on a worker thread against data the caller has
+already snapshotted. The work reports progress and checks for cancellation
+through the job; the Tk side polls the job with ``root.after`` and never
+touches widgets from the worker.
+"""
+
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside the work function once the job has been cancelled."""
+
+
+class BackgroundJob:
+    """Run ``work(job, *args)`` on a daemon thread.
+
+    After the thread finishes, ``error`` holds any exception the work raised;
+    otherwise ``result`` holds its return value, which stays None when the
+    work stopped on cancellation. A cancel that arrives after the work's last
+    check does not undo a finished result.
+    """
+
+    def __init__(self, work, *args):
+        self._work = work
+        self._args = args
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._progress = (0, 0, "")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.result = None
+        self.error = None
+
+    def _run(self):
+        try:
+            self.result = self._work(self, *self._args)
+        except JobCancelled:
+            pass
+        except Exception as exc:
+            self.error = exc
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def progress(self):
+        """Latest ``(done, total, message)`` reported by the worker."""
+        with self._lock:
+            return self._progress
+
+    def cancel(self):
+        """Ask the worker to stop at its next progress report."""
+        self._cancel.set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, done, total, message=""):
+        """Worker side: publish progress, then stop here if cancelled."""
+        with self._lock:
+            self._progress = (done, total, message)
+        self.check()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self.running
@@ -0,0 +1,51 @@
+"""Balloon number label metrics shared by the canvas and the PDF exporter.
+
+Labels are set in Helvetica (PyMuPDF's built-in "helv"; Arial on screen is
+metric-compatible). Widths come from a glyph-advance table read from the font
+once, so placing a label is plain arithmetic for any number and size, and the
+canvas and the exported PDF centre labels the same way.
+"""
+
+import fitz
+
+LABEL_FONT = "helv"
+
+# The label baseline sits this fraction of the font size below the balloon centre
+LABEL_BASELINE_SHIFT = 0.35
+
+# Advance (in font-size units) used when the font cannot be loaded
+FALLBACK_ADVANCE = 0.6
+
+try:
+    _font = fitz.Font(LABEL_FONT)
+except Exception:
+    _font = None
+
+# Advance per character at font size 1; digits are filled in up front
+ADVANCES = {}
+
+
+def glyph_advance(char):
+    """Advance width of ``char`` at font size 1, cached."""
+    advance = ADVANCES.get(char)
+    if advance is None:
+        try:
+            advance = _font.glyph_advance(ord(char))
+        except Exception:
+            advance = FALLBACK_ADVANCE
+        ADVANCES[char] = advance
+    return advance
+
+
+for _digit in "0123456789":
+    glyph_advance(_digit)
+
+
+def label_width(text, fontsize):
+    """Width of ``text`` at ``fontsize``; matches ``fitz.get_text_length``."""
+    return fontsize * sum(glyph_advance(char) for char in text)
+
+
+def label_origin(x, y, text, fontsize):
+    """Left end of the baseline that centres ``text`` on (x, y)."""
+    return x - label_width(text, fontsize) / 2, y + fontsize * LABEL_BASELINE_SHIFT
@@ -0,0 +1,106 @@
+"""Numeric handling for requirement and tolerance fields.
+
+Values are parsed once, when they are entered or loaded, into ``Decimal`` so
+the precision the inspector typed ("2.50" stays 2.50) survives through the
+list view, the report and the project file. Text that is not a number (for
+example "M6 thread") is kept as entered.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+ZERO = Decimal(0)
+
+
+def parse_value(value):
+    """Parse a requirement/tolerance entry into ``Decimal``, or keep it as text.
+
+    Accepts user text, JSON numbers from older project files and values that
+    are already ``Decimal``. Empty input becomes ``""``.
+    """
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, bool) or value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        value = repr(value)
+    text = str(value).strip()
+    if not text:
+        return ""
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return text
+    if not number.is_finite():
+        return text
+    if number.as_tuple().exponent > 0:
+        # "1E+2" and the like: keep the digits of the whole number
+        number = Decimal(format(number, "f"))
+    return number
+
+
+def tolerance_limits(req, neg, pos):
+    """Exact (lower, upper) limits, or (None, None) when req is not numeric.
+
+    An empty tolerance counts as zero; a non-numeric one leaves the limits
+    undefined rather than guessing.
+    """
+    if not isinstance(req, Decimal):
+        return None, None
+    neg = ZERO if neg == "" else neg
+    pos = ZERO if pos == "" else pos
+    if not isinstance(neg, Decimal) or not isinstance(pos, Decimal):
+        return None, None
+    return req - neg, req + pos
+
+
+def measurement_result(measured, lower, upper):
+    """"pass" when ``measured`` lies within the limits, "fail" outside them.
+
+    Blank when nothing was measured or either side is not numeric.
+    """
+    if not isinstance(measured, Decimal) or lower is None or upper is None:
+        return ""
+    return "pass" if lower <= measured <= upper else "fail"
+
+
+def decimal_places(value):
+    """Digits after the decimal point as entered (0 for whole numbers)."""
+    exponent = value.as_tuple().exponent
+    return -exponent if exponent < 0 else 0
+
+
+def number_format(value):
+    """Excel number format that shows a Decimal with its entered precision."""
+    if not isinstance(value, Decimal):
+        return "General"
+    places = decimal_places(value)
+    return "0." + "0" * places if places else "General"
+
+
+def format_value(value):
+    """Text for display; limits that cannot be computed show blank.
+
+    Decimals are always written out plainly (0.0000001, never 1E-7).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return str(value)
+
+
+def to_json_value(value):
+    """JSON-safe form of a parsed value that round-trips exactly.
+
+    Whole numbers and decimals whose float repr matches the entered text are
+    written as JSON numbers (read back with ``parse_float=Decimal``). Anything
+    a float would alter, such as trailing zeros, is written as a string.
+    """
+    if not isinstance(value, Decimal):
+        return value
+    text = format(value, "f")
+    if decimal_places(value) == 0:
+        return int(value)
+    if repr(float(value)) == text:
+        return float(value)
+    return text
@@ -0,0 +1,664 @@
+"""Ballooned PDF export.
+
+The exporter works on a plain snapshot of balloon columns (see
+``BalloonStore.snapshot``) rather than on the live store, and copies the
+source document in one ``insert_pdf`` call. Balloons are grouped by page with
+a single stable sort, so export cost grows with pages plus balloons instead
+of pages times balloons.
+
+Balloon circles and connector handles are drawn once per (radius, colour,
+stroke) as Form XObject stamps and placed with a translation per balloon;
+only the connector lines and the number labels are written out per balloon.
+
+Large drawing packs can be exported in worker processes: each worker copies a
+chunk of pages and balloons them, and the chunks are merged in page order.
+
+The layered export instead keeps the drawing's bytes as they are and appends
+the balloons as an optional content group ("FAIR Balloons") in an incremental
+update; re-exporting to the same file only rewrites the pages that changed.
+"""
+
+import hashlib
+import math
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz
+import numpy as np
+
+from fairy_labels import LABEL_FONT, label_origin
+
+# Drawings with at least this many pages are exported in worker processes
+PARALLEL_MIN_PAGES = 100
+
+# Smallest chunk handed to one worker; larger packs get about
+# PARALLEL_CHUNKS_PER_WORKER chunks per worker to even out the load
+PARALLEL_MIN_CHUNK_PAGES = 10
+PARALLEL_CHUNKS_PER_WORKER = 3
+
+# Named output profiles, mapped to MuPDF Document.save() options.
+# fast: write as-is; balanced: drop unused/duplicate objects and compress
+# streams; smallest: also merge duplicate streams, compress fonts and images,
+# clean content streams and pack objects into object streams.
+SAVE_PROFILES = {
+    "fast": {},
+    "balanced": {"garbage": 3, "deflate": True},
+    "smallest": {
+        "garbage": 4,
+        "deflate": True,
+        "deflate_images": True,
+        "deflate_fonts": True,
+        "clean": True,
+        "use_objstms": 1,
+    },
+}
+DEFAULT_SAVE_PROFILE = "balanced"
+
+# Optional content group the layered export draws into
+BALLOON_LAYER_NAME = "FAIR Balloons"
+
+# Page dict key pointing at that page's balloon layer content stream
+LAYER_STREAM_KEY = "FAIRyBalloons"
+
+
+def unpack_rgb(packed):
+    """0xRRGGBB -> fitz (r, g, b) floats."""
+    packed = int(packed)
+    return (
+        ((packed >> 16) & 0xFF) / 255.0,
+        ((packed >> 8) & 0xFF) / 255.0,
+        (packed & 0xFF) / 255.0,
+    )
+
+
+def page_groups(pages):
+    """Yield ``(page_index, indices)`` per page that has balloons.
+
+    ``indices`` keep balloon order within the page.
+    """
+    pages = np.asarray(pages)
+    if not len(pages):
+        return
+    order = np.argsort(pages, kind="stable")
+    sorted_pages = pages[order]
+    bounds = np.flatnonzero(np.diff(sorted_pages)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(order)]))
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield int(sorted_pages[start]), order[start:end]
+
+
+def connector_end(x, y, sx, sy, r):
+    """Point where a connector from (sx, sy) meets the balloon circle."""
+    dx = x - sx
+    dy = y - sy
+    dist = (dx * dx + dy * dy) ** 0.5
+    if dist < 1e-6:
+        return x, y
+    scale = r / dist
+    return x - dx * scale, y - dy * scale
+
+
+# Bezier control distance for a quarter circle of radius 1
+CIRCLE_KAPPA = 0.5522847498
+
+
+def _num(value):
+    """Compact PDF number."""
+    return format(value, ".6g")
+
+
+def _circle_path(r):
+    """Closed circle of radius ``r`` around the origin, as path operators."""
+    k = r * CIRCLE_KAPPA
+    n = _num
+    return (
+        f"{n(r)} 0 m\n"
+        f"{n(r)} {n(k)} {n(k)} {n(r)} 0 {n(r)} c\n"
+        f"{n(-k)} {n(r)} {n(-r)} {n(k)} {n(-r)} 0 c\n"
+        f"{n(-r)} {n(-k)} {n(-k)} {n(-r)} 0 {n(-r)} c\n"
+        f"{n(k)} {n(-r)} {n(r)} {n(-k)} {n(r)} 0 c\n"
+        "h\n"
+    )
+
+
+def _add_resource(doc, page, category, name, xref):
+    """Add ``name`` -> ``xref`` to a page resource dict (e.g. /XObject).
+
+    Follows indirect /Resources and category dicts, and leaves the page
+    untouched when the entry is already there.
+    """
+    target, path = page.xref, "Resources"
+    for sub in ("", category):
+        key = f"{path}/{sub}" if path and sub else (path or sub)
+        kind, value = doc.xref_get_key(target, key)
+        if kind == "xref":
+            target, path = int(value.split()[0]), ""
+        else:
+            path = key
+    key = f"{path}/{name}" if path else name
+    ref = f"{xref} 0 R"
+    if doc.xref_get_key(target, key) != ("xref", ref):
+        doc.xref_set_key(target, key, ref)
+
+
+class StampSheet:
+    """Form XObject stamps shared by all pages of one output document.
+
+    A stamp is a circle centred on the origin, keyed by (radius, colour,
+    stroke width, filled). It is written to the document the first time it is
+    used and registered in a page's resources the first time that page uses
+    it, so each page's content only carries a ``cm`` and a ``Do`` per stamp.
+
+    With ``registry`` (the xref of an object to keep the stamp list in), the
+    stamps written by an earlier export of the same file are reused.
+    """
+
+    def __init__(self, doc, registry=None):
+        self.doc = doc
+        self.registry = registry
+        self._stamps = {}
+        self._page_names = {}
+        if registry:
+            self._load()
+
+    def _load(self):
+        kind, value = self.doc.xref_get_key(self.registry, "FAIRyStamps")
+        if kind != "dict":
+            return
+        for name, xref in re.findall(r"/(\w+)\s+(\d+)\s+0\s+R", value):
+            kind, key = self.doc.xref_get_key(int(xref), "FAIRyKey")
+            if kind != "array":
+                continue
+            r, packed, width, filled = key.strip("[]").split()
+            key = (float(r), int(packed), float(width), filled == "1")
+            self._stamps[key] = (name, int(xref))
+
+    def _create(self, key):
+        r, packed, width, filled = key
+        rgb = " ".join(_num(c) for c in unpack_rgb(packed))
+        ops = f"{_num(width)} w\n{rgb} RG\n"
+        if filled:
+            ops += f"{rgb} rg\n"
+        ops += _circle_path(r) + ("B\n" if filled else "S\n")
+        extent = _num(r + width)
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(
+            xref,
+            f"<</Type/XObject/Subtype/Form/BBox[-{extent} -{extent} {extent} {extent}]/Resources<<>>"
+            f"/FAIRyKey[{r!r} {packed} {width!r} {int(filled)}]>>",
+        )
+        self.doc.update_stream(xref, ops.encode())
+        name = f"FairyStamp{xref}"
+        self._stamps[key] = (name, xref)
+        if self.registry:
+            self.doc.xref_set_key(self.registry, f"FAIRyStamps/{name}", f"{xref} 0 R")
+        return name, xref
+
+    def use(self, page, r, packed, width, filled=False):
+        """Resource name of the stamp, registered on ``page``."""
+        key = (float(r), int(packed), float(width), bool(filled))
+        name, xref = self._stamps.get(key) or self._create(key)
+        names = self._page_names.setdefault(page.xref, set())
+        if name not in names:
+            _add_resource(self.doc, page, "XObject", name, xref)
+            names.add(name)
+        return name
+
+
+def _place_stamp(shape, name, point):
+    """Append a stamp placed at ``point`` (page coordinates) to ``shape``."""
+    p = point * shape.ipctm
+    shape.totalcont += f"\nq\n1 0 0 1 {_num(p.x)} {_num(p.y)} cm\n/{name} Do\nQ\n"
+
+
+def balloon_shape(page, balloons, indices, stamps):
+    """``Shape`` holding the balloons at ``indices`` of the snapshot, uncommitted.
+
+    Circles and handles come from ``stamps`` (a ``StampSheet`` for the page's
+    document). Balloon coords are stored in raw mediabox space (unrotated),
+    and PyMuPDF's drawing API on an inserted page also uses raw mediabox
+    coordinates (/Rotate is ignored for drawing), so no transform is needed.
+    All operators end up in ``shape.totalcont``.
+    """
+    shape = page.new_shape()
+    for i in indices.tolist():
+        x = float(balloons["x"][i])
+        y = float(balloons["y"][i])
+        r = float(balloons["r"][i])
+        packed = int(balloons["color"][i])
+        balloon_rgb = unpack_rgb(packed)
+
+        # Draw connector line if this was a two-point balloon.
+        sx = float(balloons["start_x"][i])
+        sy = float(balloons["start_y"][i])
+        if not (np.isnan(sx) or np.isnan(sy)):
+            ex, ey = connector_end(x, y, sx, sy, r)
+            shape.draw_line(fitz.Point(sx, sy), fitz.Point(ex, ey))
+            shape.finish(color=balloon_rgb, width=r / 10, closePath=False)
+            handle = stamps.use(page, r / 10, packed, 1, filled=True)
+            _place_stamp(shape, handle, fitz.Point(sx, sy))
+
+        circle = stamps.use(page, r, packed, r / 10)
+        _place_stamp(shape, circle, fitz.Point(x, y))
+        text = str(int(balloons["no"][i]))
+        font_size = r
+        tx, ty = label_origin(x, y, text, font_size)
+        shape.insert_text(fitz.Point(tx, ty), text, fontname=LABEL_FONT, fontsize=font_size, color=balloon_rgb)
+        # Shape collects text after all graphics; flush it per balloon so a
+        # later balloon still paints over an earlier label, as before.
+        shape.totalcont += shape.text_cont
+        shape.text_cont = ""
+    return shape
+
+
+def draw_page_balloons(page, balloons, indices, stamps=None):
+    """Draw the balloons at ``indices`` of the snapshot onto ``page``.
+
+    All geometry and labels for the page go into one ``Shape`` with a single
+    commit, so the page gains one content stream.
+    """
+    if stamps is None:
+        stamps = StampSheet(page.parent)
+    balloon_shape(page, balloons, indices, stamps).commit()
+
+
+# Page selections for export_pages()
+PAGE_SELECTIONS = ("all", "annotated", "current", "range")
+
+
+def parse_page_range(text, page_count):
+    """Sorted 0-based pages for a 1-based range like "1-3, 7, 10-".
+
+    An open end runs to the last page. Raises ValueError on anything else.
+    """
+    pages = set()
+    for part in text.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        try:
+            start = int(first) if first.strip() else 1
+            stop = (int(last) if last.strip() else page_count) if dash else start
+        except ValueError:
+            raise ValueError(f"Not a page or page range: {part!r}")
+        if start < 1 or stop > page_count or start > stop:
+            raise ValueError(f"Pages {part!r} are outside 1-{page_count}")
+        pages.update(range(start - 1, stop))
+    if not pages:
+        raise ValueError("No pages given")
+    return sorted(pages)
+
+
+def export_pages(selection, page_count, balloons, current=0, page_range=""):
+    """Source pages to export for a ``PAGE_SELECTIONS`` entry; None means all."""
+    if selection == "all":
+        return None
+    if selection == "annotated":
+        return np.unique(balloons["page"]).tolist()
+    if selection == "current":
+        return [current]
+    if selection == "range":
+        return parse_page_range(page_range, page_count)
+    raise ValueError(f"Unknown page selection: {selection}")
+
+
+def page_runs(pages):
+    """Contiguous ``(first, last)`` runs of sorted page indices."""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [tuple(run) for run in runs]
+
+
+def select_pages(balloons, pages):
+    """Snapshot rows on ``pages`` (sorted), pages renumbered to output positions.
+
+    Balloon numbers are kept, so a partial export shows the project's numbers.
+    """
+    pages = np.asarray(pages, dtype=balloons["page"].dtype)
+    column = balloons["page"]
+    position = np.searchsorted(pages, column)
+    mask = position < len(pages)
+    mask[mask] = pages[position[mask]] == column[mask]
+    selected = {name: values[mask] for name, values in balloons.items()}
+    selected["page"] = position[mask]
+    return selected
+
+
+def _copy_pages(out, src, pages):
+    """Copy ``pages`` of ``src`` into ``out``, one insert_pdf per run."""
+    if pages is None:
+        out.insert_pdf(src)
+        return
+    for first, last in page_runs(pages):
+        out.insert_pdf(src, from_page=first, to_page=last)
+
+
+def _balloon_document(out, balloons, rotation, progress=None):
+    """Rotate and balloon every page of ``out``; ``progress`` per page drawn."""
+    # Apply any additional user rotation on top of the page's stored rotation.
+    if rotation != 0:
+        for page in out:
+            page.set_rotation((page.rotation + rotation) % 360)
+
+    groups = list(page_groups(balloons["page"]))
+    stamps = StampSheet(out)
+    for done, (page_index, indices) in enumerate(groups, 1):
+        draw_page_balloons(out[page_index], balloons, indices, stamps)
+        if progress:
+            progress(done, len(groups), page_index)
+
+
+def _save_replacing(out, out_path, profile):
+    """Save ``out`` under a temporary name, then move it onto ``out_path``.
+
+    ``profile`` names the ``SAVE_PROFILES`` entry to save with.
+    """
+    options = SAVE_PROFILES[profile]
+    part_path = out_path + ".part"
+    try:
+        out.save(part_path, **options)
+        os.replace(part_path, out_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def export_ballooned_pdf(doc, out_path, balloons, rotation=0, progress=None, profile=DEFAULT_SAVE_PROFILE,
+                         pages=None):
+    """Write ``doc`` with balloons drawn on it to ``out_path``.
+
+    ``balloons`` is a ``BalloonStore.snapshot()``; ``rotation`` is the
+    user's view rotation, added on top of each page's stored rotation.
+    ``profile`` names the ``SAVE_PROFILES`` entry used to write the file.
+    ``pages`` (sorted source page indices, see ``export_pages``) limits the
+    export to those pages; only they are copied.
+
+    ``progress(done, total, message)`` is called after each ballooned page
+    and before saving; an exception it raises (e.g. a cancelled job) aborts
+    the export. The file is written under a temporary name and moved into
+    place only when complete, so an aborted export leaves no partial file.
+    """
+    if pages is not None:
+        balloons = select_pages(balloons, pages)
+
+    def page_done(done, drawn, page_index):
+        if progress:
+            source_page = page_index if pages is None else pages[page_index]
+            progress(done, drawn + 1, f"Drawing page {source_page + 1} ({done} of {drawn})")
+
+    drawn = len(np.unique(balloons["page"]))
+    out = fitz.open()
+    try:
+        # Copy the source exactly - content, fonts, resources and stored
+        # page.rotation all transfer intact - in one pass over shared objects.
+        _copy_pages(out, doc, pages)
+        _balloon_document(out, balloons, rotation, page_done)
+        if progress:
+            progress(drawn, drawn + 1, "Saving...")
+        _save_replacing(out, out_path, profile)
+    finally:
+        out.close()
+
+
+def chunk_ranges(page_count, workers):
+    """Contiguous ``(start, stop)`` page ranges for ``workers`` processes."""
+    chunks = max(1, workers * PARALLEL_CHUNKS_PER_WORKER)
+    size = max(PARALLEL_MIN_CHUNK_PAGES, math.ceil(page_count / chunks))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def chunk_balloons(balloons, start, stop):
+    """Snapshot rows on pages ``start <= page < stop``, pages made chunk-relative."""
+    pages = balloons["page"]
+    mask = (pages >= start) & (pages < stop)
+    chunk = {name: column[mask] for name, column in balloons.items()}
+    chunk["page"] = chunk["page"] - start
+    return chunk
+
+
+def _export_chunk(pdf_path, chunk_path, source_pages, balloons, rotation):
+    """Worker process: copy ``source_pages``, balloon them, save."""
+    src = fitz.open(pdf_path)
+    out = fitz.open()
+    try:
+        _copy_pages(out, src, source_pages)
+        _balloon_document(out, balloons, rotation)
+        out.save(chunk_path, **SAVE_PROFILES["fast"])
+    finally:
+        out.close()
+        src.close()
+    return chunk_path
+
+
+def export_ballooned_pdf_parallel(pdf_path, out_path, balloons, rotation=0, workers=None, progress=None,
+                                  profile=DEFAULT_SAVE_PROFILE, pages=None):
+    """``export_ballooned_pdf`` split over worker processes.
+
+    Pages are cut into contiguous chunks; each worker opens ``pdf_path``
+    itself and writes its chunk to a temporary file. The chunks are merged
+    with ``insert_pdf`` in page order, whatever order they finish in, so the
+    output does not depend on scheduling. ``progress`` is called per chunk;
+    ``pages`` selects source pages as in ``export_ballooned_pdf``.
+    Chunks are written with the "fast" profile and ``profile`` applies to the
+    merged file; "smallest" also folds the fonts and images each chunk
+    copied from the source back into one.
+    """
+    workers = workers or os.cpu_count() or 1
+    if pages is None:
+        with fitz.open(pdf_path) as src:
+            pages = list(range(len(src)))
+    balloons = select_pages(balloons, pages)
+    chunks = chunk_ranges(len(pages), workers)
+    total = len(chunks) + 1
+    workdir = tempfile.mkdtemp(prefix="fairy_export_")
+    try:
+        paths = [os.path.join(workdir, f"chunk_{i:05d}.pdf") for i in range(len(chunks))]
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+        try:
+            futures = [
+                pool.submit(_export_chunk, pdf_path, path, pages[start:stop],
+                            chunk_balloons(balloons, start, stop), rotation)
+                for path, (start, stop) in zip(paths, chunks)
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress:
+                    progress(done, total, f"Drawing pages ({done} of {len(chunks)} chunks)")
+        finally:
+            # On cancel or error, drop queued chunks; running ones are short
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        if progress:
+            progress(len(chunks), total, "Merging and saving...")
+        out = fitz.open()
+        try:
+            for path in paths:
+                with fitz.open(path) as chunk:
+                    out.insert_pdf(chunk)
+            _save_replacing(out, out_path, profile)
+        finally:
+            out.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def file_digest(path):
+    """SHA-1 hex digest of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_balloon_layer(doc):
+    """Xref of the "FAIR Balloons" optional content group, or 0."""
+    for xref, info in doc.get_ocgs().items():
+        if info.get("name") == BALLOON_LAYER_NAME:
+            return xref
+    return 0
+
+
+def _layer_source(doc, layer):
+    kind, value = doc.xref_get_key(layer, "FAIRySource")
+    return value if kind == "string" else None
+
+
+def _is_layer_export(path, source_id, page_count):
+    """True when ``path`` is a layered export of the source with ``source_id``."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with fitz.open(path) as doc:
+            layer = find_balloon_layer(doc)
+            return bool(layer) and len(doc) == page_count and _layer_source(doc, layer) == source_id
+    except Exception:
+        return False
+
+
+def _append_contents(doc, page, xref):
+    """Append content stream ``xref`` to the page's /Contents."""
+    kind, value = doc.xref_get_key(page.xref, "Contents")
+    ref = f"{xref} 0 R"
+    if kind == "xref":
+        target = int(value.split()[0])
+        if not doc.xref_is_stream(target):
+            # /Contents points at an array object; extend it in place
+            array = doc.xref_object(target, compressed=True)
+            doc.update_object(target, array.rstrip()[:-1] + f" {ref}]")
+            return
+        value = f"[{value} {ref}]"
+    elif kind == "array":
+        value = value.rstrip()[:-1] + f" {ref}]"
+    else:
+        value = f"[{ref}]"
+    doc.xref_set_key(page.xref, "Contents", value)
+
+
+def _set_layer_stream(doc, page, content):
+    """Make ``content`` the page's balloon layer; True if anything changed."""
+    kind, value = doc.xref_get_key(page.xref, LAYER_STREAM_KEY)
+    if kind == "xref":
+        xref = int(value.split()[0])
+        if doc.xref_stream(xref) == content:
+            return False
+        doc.update_stream(xref, content)
+        return True
+    if not content:
+        return False
+    # Balance any graphics state the drawing leaves open, so the layer is
+    # drawn in page space; this only adds q/Q streams around the original.
+    if not page.is_wrapped:
+        page.wrap_contents()
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, content)
+    _append_contents(doc, page, xref)
+    doc.xref_set_key(page.xref, LAYER_STREAM_KEY, f"{xref} 0 R")
+    return True
+
+
+def export_balloon_layer(pdf_path, out_path, balloons, rotation=0, progress=None, profile=DEFAULT_SAVE_PROFILE):
+    """Write the balloons as a toggleable "FAIR Balloons" layer.
+
+    If ``out_path`` already holds a layered export of the same source PDF
+    (matched by content digest), it is updated in place: only pages whose
+    balloons changed get a new layer stream, appended as an incremental
+    update. Otherwise the source file is copied byte for byte and the layer
+    is added as an incremental update on top, so the original drawing is
+    never rewritten. ``profile`` applies only when the file cannot be saved
+    incrementally (e.g. a repaired source) and is rewritten in full.
+    Returns the number of pages whose layer changed.
+    """
+    source_id = file_digest(pdf_path)
+    with fitz.open(pdf_path) as src:
+        source_rotations = [page.rotation for page in src]
+    base = out_path if _is_layer_export(out_path, source_id, len(source_rotations)) else pdf_path
+
+    groups = dict(page_groups(balloons["page"]))
+    part_path = out_path + ".part"
+    full_path = out_path + ".full.part"
+    shutil.copyfile(base, part_path)
+    try:
+        doc = fitz.open(part_path)
+        try:
+            layer = find_balloon_layer(doc)
+            if not layer:
+                layer = doc.add_ocg(BALLOON_LAYER_NAME, on=True)
+                doc.xref_set_key(layer, "FAIRySource", fitz.get_pdf_str(source_id))
+            stamps = StampSheet(doc, registry=layer)
+
+            pages = [
+                i for i in range(len(doc))
+                if i in groups or doc.xref_get_key(doc[i].xref, LAYER_STREAM_KEY)[0] == "xref"
+            ]
+            changed = 0
+            for done, page_index in enumerate(pages, 1):
+                page = doc[page_index]
+                wanted = (source_rotations[page_index] + rotation) % 360
+                if page.rotation != wanted:
+                    page.set_rotation(wanted)
+                content = b""
+                if page_index in groups:
+                    _add_resource(doc, page, "Properties", "FAIRyLayer", layer)
+                    shape = balloon_shape(page, balloons, groups[page_index], stamps)
+                    content = f"/OC /FAIRyLayer BDC\n{shape.totalcont}\nEMC\n".encode()
+                changed += _set_layer_stream(doc, page, content)
+                if progress:
+                    progress(done, len(pages) + 1, f"Layer on page {page_index + 1} ({done} of {len(pages)})")
+
+            if progress:
+                progress(len(pages), len(pages) + 1, "Saving...")
+            if doc.can_save_incrementally():
+                doc.save(part_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            else:
+                doc.save(full_path, **SAVE_PROFILES[profile])
+        finally:
+            doc.close()
+        if os.path.exists(full_path):
+            os.replace(full_path, part_path)
+        os.replace(part_path, out_path)
+        return changed
+    finally:
+        for path in (part_path, full_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def export_ballooned_pdf_file(pdf_path, out_path, balloons, rotation=0, progress=None, workers=None,
+                              profile=DEFAULT_SAVE_PROFILE, layered=False, pages=None):
+    """Export from ``pdf_path`` on a document handle of its own.
+
+    For background jobs: the worker opens ``pdf_path`` itself instead of
+    sharing the viewer's ``fitz.Document`` across threads. Packs of
+    ``PARALLEL_MIN_PAGES`` or more go to ``export_ballooned_pdf_parallel``
+    when more than one worker is available (all cores by default).
+    ``layered`` selects ``export_balloon_layer`` instead, which always keeps
+    the whole document; ``pages`` limits the other exports.
+    """
+    if layered:
+        export_balloon_layer(pdf_path, out_path, balloons, rotation, progress, profile)
+        return
+    workers = workers or os.cpu_count() or 1
+    doc = fitz.open(pdf_path)
+    try:
+        page_count = len(doc) if pages is None else len(pages)
+        if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+            # The worker processes open the file themselves
+            doc.close()
+            doc = None
+            export_ballooned_pdf_parallel(pdf_path, out_path, balloons, rotation, workers, progress, profile, pages)
+            return
+        export_ballooned_pdf(doc, out_path, balloons, rotation, progress, profile, pages)
+    finally:
+        if doc is not None:
+            doc.close()
@@ -0,0 +1,193 @@
+"""Customer report profiles: what differs between the FAIR report variants.
+
+A profile is plain data: the Excel template, where its data rows are, which
+balloon field goes in each report column, the column inspectors type
+measured values into, and the report headers (popup labels, template cells,
+Return-key order, the date header and any whole-number headers). ``load_report_profiles`` compiles each one once into
+a ``ReportProfile`` holding ready-to-use lookups; its template's
+``ReportPlan`` is built once as well, so an export only fills in values and
+any build of the app can switch customers at runtime.
+
+Extra or changed profiles can be put in ``report_profiles.json`` next to the
+templates, in the same format as ``REPORT_PROFILES``.
+"""
+
+import json
+import os
+
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple
+
+from fairy_report import ReportLayout, read_measurements, refresh_report, report_templates, save_report_file
+from fairy_store import FIELDS
+
+REPORT_PROFILES_FILE = "report_profiles.json"
+
+# Fields a report column can show; "sheet" is the balloon's 1-based page
+REPORT_FIELDS = ("sheet",) + FIELDS
+
+# "headers" lists the Headers popup row by row, each row as
+# [label, key, template cell] for the left and right column.
+# "header_order" is the Return-key order: "down" each column in turn,
+# "across" each row in turn.
+REPORT_PROFILES = {
+    "company_a": {
+        "name": "Company A",
+        "template": "FORMAT.xlsx",
+        # 15 data rows (8-22); row 23 and the footer below it move down as needed
+        "start_row": 8,
+        "template_rows": 15,
+        "columns": ["sheet", "zone", "no", "char", "req", "neg", "pos", "lower", "upper", "equip"],
+        # Inspectors type the actual measurement in the first column after ours
+        "measured_column": "K",
+        "headers": [
+            [["Part Number", "part_number", "E2"], ["Part Description", "part_description", "L2"]],
+            [["Drawing Rev", "drawing_rev", "E3"], ["Customer", "customer", "L3"]],
+            [["RM Used", "rm_used", "E4"], ["Project Name", "project_name", "L4"]],
+            [["Date Inspected", "date_inspected", "E5"], ["Accepted Qty", "accepted_qty", "L5"]],
+        ],
+        "header_order": "down",
+        "date_header": ["date_inspected", "%Y-%m-%d"],
+        "integer_headers": ["accepted_qty"],
+        "limit_labels": ["Min", "Max"],
+        "limit_width": 8,
+    },
+    "worbyn": {
+        "name": "WORBYN",
+        "template": "FORMAT_WORBYN_2.xlsx",
+        # 35 data rows (10-44); row 45 and the footer below it move down as needed
+        "start_row": 10,
+        "template_rows": 35,
+        "columns": ["no", "sheet", "zone", "char", "req", "pos", "neg", "lower", "upper", "equip"],
+        "measured_column": "K",
+        "headers": [
+            [["FAIR Number", "fair_number", "D4"], ["Part Number", "part_number", "I4"]],
+            [["Drawing Number", "drawing_number", "D5"], ["Part Name", "part_name", "I5"]],
+            [["Drawing Rev No", "drawing_rev_no", "D6"], ["Material Spec", "material_spec", "M4"]],
+            [["Customer Name", "customer_name", "D7"], ["MTC No", "mtc_no", "M5"]],
+            [["Batch/Heat No", "batch_heat_no", "M6"], ["Inspection Date", "inspection_date", "M7"]],
+        ],
+        "header_order": "across",
+        "date_header": ["inspection_date", "%d/%m/%Y"],
+        "integer_headers": [],
+        "limit_labels": ["Low", "Up"],
+        "limit_width": 6,
+    },
+}
+
+
+class ReportProfile:
+    """A compiled report profile.
+
+    ``header_rows`` holds the popup rows as ((label, key), ...);
+    ``header_keys`` every header key, column by column; ``header_order`` the
+    Return-key order; ``header_cells`` the template cell of each key.
+    """
+
+    def __init__(self, key, spec, template_path):
+        self.key = key
+        self.name = spec["name"]
+        self.template_path = template_path
+        self.layout = ReportLayout(spec["start_row"], spec["template_rows"])
+        self.columns = tuple(spec["columns"])
+        unknown = [field for field in self.columns if field not in REPORT_FIELDS]
+        if unknown:
+            raise ValueError(f"Report profile {key}: unknown column fields {unknown}")
+        self.measured_column = spec.get("measured_column")
+        if self.measured_column and column_index_from_string(self.measured_column) <= len(self.columns):
+            raise ValueError(f"Report profile {key}: measured column {self.measured_column} is a report column")
+        # Balloon fields the columns read, for ``BalloonStore.rows``
+        self.fields = tuple(dict.fromkeys("page" if field == "sheet" else field for field in self.columns))
+
+        grid = [[tuple(field) for field in row] for row in spec["headers"]]
+        width = max((len(row) for row in grid), default=0)
+        down = [row[column] for column in range(width) for row in grid if column < len(row)]
+        across = [field for row in grid for field in row]
+        self.header_rows = tuple(tuple((label, name) for label, name, _ in row) for row in grid)
+        self.header_keys = tuple(name for _, name, _ in down)
+        self.header_labels = {name: label for label, name, _ in down}
+        self.header_cells = {}
+        for _, name, cell in down:
+            coordinate_to_tuple(cell)  # raises on a malformed cell reference
+            self.header_cells[name] = cell
+        if len(self.header_cells) != len(down):
+            raise ValueError(f"Report profile {key}: duplicate header keys")
+        order = spec.get("header_order", "down")
+        if order not in ("down", "across"):
+            raise ValueError(f"Report profile {key}: unknown header order {order}")
+        self.header_order = tuple(name for _, name, _ in (down if order == "down" else across))
+
+        self.date_key, self.date_format = spec.get("date_header") or (None, None)
+        self.integer_keys = frozenset(spec.get("integer_headers", ()))
+        for name in self.integer_keys | ({self.date_key} - {None}):
+            if name not in self.header_cells:
+                raise ValueError(f"Report profile {key}: unknown header {name}")
+        self.limit_labels = tuple(spec.get("limit_labels", ("Min", "Max")))
+        self.limit_width = spec.get("limit_width", 8)
+
+    def default_headers(self):
+        return {name: "" for name in self.header_keys}
+
+    def normalize_headers(self, headers):
+        """This profile's header values from ``headers``, as stripped strings."""
+        normalized = self.default_headers()
+        if isinstance(headers, dict):
+            for name in self.header_keys:
+                val = headers.get(name, "")
+                normalized[name] = "" if val is None else str(val).strip()
+        return normalized
+
+    def header_values(self, headers):
+        """Template cell -> value for the filled-in ``headers``."""
+        return {cell: headers[name] for name, cell in self.header_cells.items()
+                if headers.get(name) not in ("", None)}
+
+    def plan(self):
+        """The template's ``ReportPlan`` (parsed and derived once, kept until the file changes)."""
+        return report_templates.plan(self.template_path, self.layout, self.columns)
+
+    def read_measurements(self, report_path):
+        """``{number: (sheet, value)}`` typed into a report made with this profile."""
+        if not self.measured_column or "no" not in self.columns:
+            raise ValueError(f"The {self.name} report has no measured value column")
+        return read_measurements(report_path, self.layout, self.columns, self.measured_column)
+
+    def prepare(self):
+        """Parse and plan the template now, so the first export does no template work.
+
+        A missing or broken template is left to surface when a report is saved.
+        """
+        try:
+            self.plan()
+        except Exception:
+            pass
+
+    def save_report(self, out_path, balloons, headers, **options):
+        """Write the FAIR report for ``balloons`` with ``headers`` to ``out_path``.
+
+        ``options`` go to ``save_report_file`` (engine, streaming, progress).
+        """
+        save_report_file(self.template_path, out_path, self.layout, self.columns, balloons,
+                         self.header_values(headers), **options)
+
+    def refresh_report(self, report_path, balloons, headers, **options):
+        """Update a report made with this profile to ``balloons`` and ``headers``.
+
+        ``options`` go to ``refresh_report`` (out_path, progress). Returns
+        ``(updated, inserted, deleted)`` row counts.
+        """
+        return refresh_report(self.template_path, report_path, self.layout, self.columns, balloons,
+                              self.header_values(headers), **options)
+
+
+def load_report_profiles(resolve=os.path.abspath):
+    """Compile ``REPORT_PROFILES`` (plus ``report_profiles.json``, if any).
+
+    ``resolve`` maps a file name to its path. Templates are not read here;
+    see ``ReportProfile.prepare``.
+    """
+    specs = dict(REPORT_PROFILES)
+    extra_path = resolve(REPORT_PROFILES_FILE)
+    if os.path.exists(extra_path):
+        with open(extra_path, "r", encoding="utf-8") as f:
+            specs.update(json.load(f))
+    return {key: ReportProfile(key, spec, resolve(spec["template"])) for key, spec in specs.items()}
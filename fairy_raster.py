@@ -0,0 +1,165 @@
+"""Raster export of ballooned pages: one PNG per page or a multi-page TIFF.
+
+For viewers that struggle with large vector PDFs. Pages are rendered in a
+process pool; each worker copies one page, balloons it, renders it and writes
+the image straight to disk. Only a few pages per worker are in flight at a
+time, so memory stays bounded however long the drawing is. TIFF frames are
+appended in page order as their pages finish.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import fitz
+import numpy as np
+from PIL import Image, TiffImagePlugin
+
+from fairy_pdf import chunk_balloons, draw_page_balloons, page_groups
+
+RASTER_FORMATS = ("png", "tiff")
+DEFAULT_RASTER_DPI = 150
+
+# Pages queued or waiting for their TIFF turn per worker process
+RASTER_PAGES_PER_WORKER = 2
+
+TIFF_COMPRESSION = "tiff_deflate"
+
+_worker_source = None  # source document, opened once per worker process
+
+
+def _open_worker_source(pdf_path):
+    global _worker_source
+    _worker_source = fitz.open(pdf_path)
+
+
+def render_page(src, page_index, balloons, rotation, dpi, out_file, output):
+    """Render page ``page_index`` of ``src`` with ``balloons`` to ``out_file``.
+
+    ``balloons`` is a snapshot holding only this page's rows, with page 0.
+    ``output`` is a pixmap format ("png", "pnm").
+    """
+    out = fitz.open()
+    try:
+        out.insert_pdf(src, from_page=page_index, to_page=page_index)
+        page = out[0]
+        if rotation != 0:
+            page.set_rotation((page.rotation + rotation) % 360)
+        if len(balloons["page"]):
+            draw_page_balloons(page, balloons, np.arange(len(balloons["page"])))
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
+        pix.save(out_file, output=output)
+    finally:
+        out.close()
+    return page_index
+
+
+def _render_in_worker(page_index, balloons, rotation, dpi, out_file, output):
+    return render_page(_worker_source, page_index, balloons, rotation, dpi, out_file, output)
+
+
+def raster_file_names(out_path, pages, page_count):
+    """PNG names for ``pages``: ``<stem>_p001.png`` and so on."""
+    stem = os.path.splitext(out_path)[0]
+    digits = max(3, len(str(page_count)))
+    return {page: f"{stem}_p{page + 1:0{digits}d}.png" for page in pages}
+
+
+def export_raster(pdf_path, out_path, balloons, rotation=0, dpi=DEFAULT_RASTER_DPI, image_format="png",
+                  annotated_only=True, workers=None, progress=None):
+    """Render ballooned pages to images; returns the files written.
+
+    ``image_format`` "png" writes one ``<stem>_pNNN.png`` per page next to
+    ``out_path``; "tiff" writes ``out_path`` as one multi-page TIFF. With
+    ``annotated_only`` pages without balloons are skipped. ``workers``
+    defaults to all cores; 1 renders in this process. ``progress(done, total,
+    message)`` is called per page; an exception it raises aborts the export
+    and removes everything written so far.
+    """
+    if image_format not in RASTER_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    with fitz.open(pdf_path) as src:
+        page_count = len(src)
+    if annotated_only:
+        pages = [page for page, _ in page_groups(balloons["page"])]
+    else:
+        pages = list(range(page_count))
+    workers = min(workers or os.cpu_count() or 1, max(1, len(pages)))
+    tiff = image_format == "tiff"
+
+    workdir = tempfile.mkdtemp(prefix="fairy_raster_") if tiff else None
+    if tiff:
+        targets = {page: os.path.join(workdir, f"page_{page:05d}.pnm") for page in pages}
+        output = "pnm"
+    else:
+        targets = raster_file_names(out_path, pages, page_count)
+        output = "png"
+
+    part_path = out_path + ".part"
+    tiff_writer = TiffImagePlugin.AppendingTiffWriter(part_path, True) if tiff else None
+    ready = set()
+    state = {"next": 0, "done": 0}
+
+    def finished(page):
+        """Record a rendered page; append TIFF frames that are now in order."""
+        state["done"] += 1
+        if tiff:
+            ready.add(page)
+            while state["next"] < len(pages) and pages[state["next"]] in ready:
+                frame_page = pages[state["next"]]
+                ready.discard(frame_page)
+                with Image.open(targets[frame_page]) as image:
+                    image.save(tiff_writer, format="TIFF", compression=TIFF_COMPRESSION, dpi=(dpi, dpi))
+                tiff_writer.newFrame()
+                os.remove(targets[frame_page])
+                state["next"] += 1
+        if progress:
+            progress(state["done"], len(pages), f"Rendered page {page + 1} ({state['done']} of {len(pages)})")
+
+    def task(page):
+        return (page, chunk_balloons(balloons, page, page + 1), rotation, dpi, targets[page], output)
+
+    try:
+        if workers == 1:
+            with fitz.open(pdf_path) as src:
+                for page in pages:
+                    finished(render_page(src, *task(page)))
+        else:
+            limit = workers * RASTER_PAGES_PER_WORKER
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_source, initargs=(pdf_path,))
+            try:
+                pending = set()
+                for page in pages:
+                    while len(pending) + len(ready) >= limit and pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finished(future.result())
+                    pending.add(pool.submit(_render_in_worker, *task(page)))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(future.result())
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        if tiff:
+            tiff_writer.close()
+            tiff_writer = None
+            os.replace(part_path, out_path)
+            return [out_path]
+        return [targets[page] for page in pages]
+    except BaseException:
+        # Workers may have finished pages that were never reported back
+        if not tiff:
+            for path in targets.values():
+                if os.path.exists(path):
+                    os.remove(path)
+        raise
+    finally:
+        if tiff_writer is not None:
+            tiff_writer.close()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,948 @@
+"""FAIR report generation from the customer Excel templates.
+
+A template has a header block, a block of styled data rows starting at a fixed
+row, and a footer (legends, observations, sign-off) below the data rows. When
+a report needs more data rows than the template has, the footer is moved down
+once to its final position before any data is written.
+
+Very large reports are streamed instead: a write-only workbook that shares the
+template's style tables replays the template rows around the data rows, which
+go to disk as they are produced, so memory does not grow with the row count.
+
+The default engine skips openpyxl altogether: it patches the template's OOXML
+parts directly (see ``fairy_xlsx``), rewriting only the sheet rows, shared
+strings and number-format styles, and falls back to openpyxl for templates it
+does not support. All modes produce the same cells, styles, merges and row
+heights.
+
+Measured values typed into a filled report are read back with
+``read_measurements``, streaming the sheet's cell values only, and
+``refresh_report`` brings an existing report up to date with the balloons
+without touching what was typed into it.
+"""
+
+import copy
+import os
+import threading
+from decimal import Decimal
+from difflib import SequenceMatcher
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple, get_column_letter
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.worksheet import Worksheet
+
+from fairy_numeric import number_format, parse_value
+from fairy_xlsx import SheetPatch, TemplateRow, UnsupportedTemplate, XlsxTemplate, format_attrs, number_text
+
+# Balloon fields written as numbers, formatted to show the entered precision.
+# "sheet" is the balloon's 1-based page number.
+NUMERIC_FIELDS = ("sheet", "req", "neg", "pos", "lower", "upper")
+
+# Report writers: patch the template's XML parts, or load it with openpyxl
+REPORT_ENGINES = ("ooxml", "openpyxl")
+DEFAULT_REPORT_ENGINE = "ooxml"
+
+# With openpyxl, reports with at least this many balloons are streamed
+STREAMING_REPORT_MIN_BALLOONS = 5000
+
+# Data rows written between progress reports
+REPORT_PROGRESS_ROWS = 500
+
+# Row attributes carried over from template rows in streaming mode
+_ROW_ATTRIBUTES = ("height", "hidden", "outlineLevel", "collapsed", "thickBot", "thickTop")
+
+
+def clone_workbook(template):
+    """Independent copy of a loaded workbook, without re-parsing the file.
+
+    ``copy.deepcopy`` empties openpyxl's ``IndexedList`` style tables (their
+    lookup dict is restored before the items, so every item looks like a
+    duplicate), so those are rebuilt from the template. The style objects in
+    them are immutable and can be shared. It also loses the worksheets'
+    row/column dimension factories, which are bound again here.
+    """
+    clone = copy.deepcopy(template)
+    for name, value in vars(template).items():
+        if isinstance(value, IndexedList):
+            setattr(clone, name, IndexedList(value))
+    for ws in clone.worksheets:
+        if isinstance(ws, Worksheet):
+            ws.row_dimensions.worksheet = ws
+            ws.row_dimensions.default_factory = ws._add_row
+            ws.column_dimensions.worksheet = ws
+            ws.column_dimensions.default_factory = ws._add_column
+    return clone
+
+
+class TemplateCache:
+    """Parsed report templates, re-read only when the file changes.
+
+    A template is parsed on first use and whenever its modification time or
+    size changes; every report starts from a clone of the parsed workbook.
+    Reports may be written from worker threads, so lookups are locked.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._plans = {}
+        self._lock = threading.RLock()
+
+    def _load(self, path, loader):
+        with self._lock:
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            key = (path, loader)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, loader(path))
+                self._entries[key] = entry
+            return entry[1]
+
+    def template(self, path):
+        """The shared parsed template; read it, never modify it."""
+        return self._load(path, load_workbook)
+
+    def parts(self, path):
+        """The template's OOXML parts (``XlsxTemplate``), shared like ``template``."""
+        return self._load(path, XlsxTemplate)
+
+    def plan(self, path, layout, columns):
+        """The ``ReportPlan`` for ``layout`` and ``columns``, rebuilt with the template."""
+        with self._lock:
+            template = self.parts(path)
+            key = (path, layout.start_row, layout.template_rows, tuple(columns))
+            plan = self._plans.get(key)
+            if plan is None or plan.template is not template:
+                plan = ReportPlan(template, layout, columns)
+                self._plans[key] = plan
+            return plan
+
+    def workbook(self, path):
+        """A fresh copy of the template to fill in."""
+        return clone_workbook(self.template(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+
+report_templates = TemplateCache()
+
+
+class ReportLayout:
+    """Where the data rows of a report template are.
+
+    ``start_row`` is the first data row and ``template_rows`` the number of
+    data rows the template provides. Everything from the row after them down
+    (spacer and footer rows) is the footer block.
+    """
+
+    def __init__(self, start_row, template_rows):
+        self.start_row = start_row
+        self.template_rows = template_rows
+
+    @property
+    def footer_row(self):
+        """First row below the template's data rows."""
+        return self.start_row + self.template_rows
+
+    def extra_rows(self, count):
+        """Data rows ``count`` balloons need beyond the template's own."""
+        return max(0, count - self.template_rows)
+
+
+def move_rows_down(ws, first_row, shift):
+    """Move rows ``first_row`` and below down by ``shift`` rows.
+
+    Unlike ``ws.insert_rows`` this only touches the moved block: its cells
+    (values and styles), merged ranges and row dimensions go straight to
+    their new rows, and merges move with the block instead of being undone
+    and redone by hand.
+    """
+    if shift <= 0:
+        return
+    merges = [rng for rng in ws.merged_cells.ranges if rng.min_row >= first_row]
+    for rng in merges:
+        ws.merged_cells.remove(rng)
+
+    for row, column in sorted((key for key in ws._cells if key[0] >= first_row), reverse=True):
+        cell = ws._cells.pop((row, column))
+        cell.row = row + shift
+        ws._cells[cell.row, column] = cell
+
+    for row in sorted((row for row in ws.row_dimensions if row >= first_row), reverse=True):
+        dim = ws.row_dimensions.pop(row)
+        dim.index = row + shift
+        ws.row_dimensions[dim.index] = dim
+
+    for rng in merges:
+        rng.shift(row_shift=shift)
+        ws.merged_cells.add(rng)
+
+
+def lay_out_report(ws, layout, count):
+    """Make room for ``count`` data rows; returns the rows added.
+
+    The footer block is moved to its final position; the added rows between
+    the template's data rows and the footer are left empty.
+    """
+    extra_rows = layout.extra_rows(count)
+    move_rows_down(ws, layout.footer_row, extra_rows)
+    return extra_rows
+
+
+class RowStyles:
+    """Styles of a template's canonical data row, shared by all data rows.
+
+    openpyxl keeps a cell's formatting as a small ``StyleArray`` of indices
+    into the workbook's style tables. Data rows get the canonical row's arrays
+    by reference rather than a copy per cell, and numeric cells get one shared
+    array per (column, number format). Shared arrays must be replaced, never
+    changed in place (as ``cell.number_format = ...`` would).
+    """
+
+    def __init__(self, ws, row, number_formats=None):
+        self.ws = ws
+        self.styles = []
+        for column in range(1, ws.max_column + 1):
+            cell = ws._cells.get((row, column))
+            self.styles.append(copy.copy(cell._style) if cell is not None else StyleArray())
+        self.height = ws.row_dimensions[row].height
+        # Table that custom number formats are added to
+        self.number_formats = ws.parent._number_formats if number_formats is None else number_formats
+        self._formatted = {}
+
+    def apply(self, rows):
+        """Give every cell of ``rows`` the canonical style and row height."""
+        ws = self.ws
+        for row in rows:
+            for column, style in enumerate(self.styles, 1):
+                ws.cell(row=row, column=column)._style = style
+            ws.row_dimensions[row].height = self.height
+
+    def formatted(self, column, fmt):
+        """Canonical style of ``column`` with number format ``fmt``."""
+        key = (column, fmt)
+        style = self._formatted.get(key)
+        if style is None:
+            style = copy.copy(self.styles[column - 1])
+            fmt_id = BUILTIN_FORMATS_REVERSE.get(fmt)
+            if fmt_id is None:
+                fmt_id = self.number_formats.add(fmt) + BUILTIN_FORMATS_MAX_SIZE
+            style.numFmtId = fmt_id
+            self._formatted[key] = style
+        return style
+
+
+def _row_progress(progress, done, count):
+    """Report data-row progress every ``REPORT_PROGRESS_ROWS`` rows."""
+    if progress and done % REPORT_PROGRESS_ROWS == 0:
+        progress(done, count, f"Writing rows: {done} of {count}")
+
+
+def report_value(balloon, field):
+    """Report cell value of ``field`` for ``balloon``."""
+    if field == "sheet":
+        return balloon["page"] + 1
+    return balloon[field]
+
+
+def fill_report(ws, layout, columns, balloons, progress=None):
+    """Write one data row per balloon into a template sheet.
+
+    ``columns`` names the balloon field of each column, starting at column A.
+    The footer is moved first, then the data rows are styled in one pass and
+    filled. ``progress`` is as for ``save_report_file``.
+    """
+    count = len(balloons)
+    lay_out_report(ws, layout, count)
+    styles = RowStyles(ws, layout.start_row)
+    # The row after the last balloon gets the data-row style too
+    styles.apply(range(layout.start_row, layout.start_row + count + 1))
+    for row, balloon in enumerate(balloons, layout.start_row):
+        _row_progress(progress, row - layout.start_row, count)
+        for column, field in enumerate(columns, 1):
+            value = report_value(balloon, field)
+            cell = ws.cell(row=row, column=column)
+            cell.value = value
+            if field in NUMERIC_FIELDS:
+                cell._style = styles.formatted(column, number_format(value))
+
+
+def _write_only_copy(template):
+    """Empty write-only workbook with the template's style tables.
+
+    Sharing the tables keeps the template's style indices valid, so template
+    cells are replayed with their ``StyleArray`` as is.
+    """
+    wb = Workbook(write_only=True)
+    for name, value in vars(template).items():
+        if isinstance(value, IndexedList):
+            setattr(wb, name, IndexedList(value))
+    wb._named_styles = copy.copy(template._named_styles)
+    wb._differential_styles = copy.deepcopy(template._differential_styles)
+    wb._colors = template._colors
+    wb._table_styles = template._table_styles
+    wb.loaded_theme = template.loaded_theme
+    wb.epoch = template.epoch
+    return wb
+
+
+def _copy_sheet_setup(src, ws, layout, extra_rows):
+    """Column widths, page setup, views and merges of ``src`` onto ``ws``."""
+    for key, dim in src.column_dimensions.items():
+        target = ws.column_dimensions[key]
+        for attr in ("width", "bestFit", "hidden", "outlineLevel", "collapsed", "min", "max"):
+            setattr(target, attr, getattr(dim, attr))
+        target._style = copy.copy(dim._style)
+    ws.sheet_properties = copy.deepcopy(src.sheet_properties)
+    ws.sheet_format = copy.deepcopy(src.sheet_format)
+    ws.views = copy.deepcopy(src.views)
+    ws.page_margins = copy.deepcopy(src.page_margins)
+    ws.print_options = copy.deepcopy(src.print_options)
+    ws.page_setup = copy.deepcopy(src.page_setup)
+    ws.page_setup.worksheet = ws
+    ws.HeaderFooter = copy.deepcopy(src.HeaderFooter)
+    ws.conditional_formatting = copy.deepcopy(src.conditional_formatting)
+    ws.data_validations = copy.deepcopy(src.data_validations)
+    if src.print_area:
+        ws.print_area = src.print_area
+    ws.print_title_rows = src.print_title_rows
+    ws.print_title_cols = src.print_title_cols
+    for image in src._images:
+        ws.add_image(image)
+    for rng in src.merged_cells.ranges:
+        rng = copy.copy(rng)
+        if rng.min_row >= layout.footer_row:
+            rng.shift(row_shift=extra_rows)
+        ws.merged_cells.add(rng)
+
+
+def stream_report(template, out_path, layout, columns, balloons, cell_values=None, progress=None):
+    """Write a report with the same layout as ``fill_report``, streaming.
+
+    ``template`` is the parsed template workbook; it is only read.
+    ``cell_values`` maps template coordinates (such as "E2") to values
+    written over the template, e.g. the report headers.
+    """
+    src = template.active
+    wb = _write_only_copy(template)
+    ws = wb.create_sheet(src.title)
+
+    count = len(balloons)
+    extra_rows = layout.extra_rows(count)
+    _copy_sheet_setup(src, ws, layout, extra_rows)
+
+    cells = {}
+    for (row, column), cell in src._cells.items():
+        cells.setdefault(row, {})[column] = [cell.value, cell._style]
+    for coordinate, value in (cell_values or {}).items():
+        row, column = coordinate_to_tuple(coordinate)
+        cells.setdefault(row, {}).setdefault(column, [None, StyleArray()])[0] = value
+
+    styles = RowStyles(src, layout.start_row, number_formats=wb._number_formats)
+    data_end = layout.start_row + count  # first row after the data rows
+    last_row = max(src.max_row + extra_rows, data_end)
+
+    def template_row(row):
+        """Template row shown at report row ``row``."""
+        return row if row < layout.footer_row else row - extra_rows
+
+    def set_row_dimension(row, source):
+        dim = src.row_dimensions.get(source)
+        if dim is not None:
+            target = ws.row_dimensions[row]
+            for attr in _ROW_ATTRIBUTES:
+                setattr(target, attr, getattr(dim, attr))
+            target._style = copy.copy(dim._style)
+
+    def cell(value, style):
+        out = WriteOnlyCell(ws, value)
+        out._style = style
+        return out
+
+    rows = iter(balloons)
+    try:
+        for row in range(1, last_row + 1):
+            if layout.start_row <= row <= data_end:
+                # Data row, or the styled row after the last one
+                template_cells = cells.get(template_row(row), {}) if row == data_end or row < layout.footer_row else {}
+                values = [template_cells.get(column, (None,))[0] for column in range(1, len(styles.styles) + 1)]
+                row_styles = list(styles.styles)
+                if row < data_end:
+                    _row_progress(progress, row - layout.start_row, count)
+                    balloon = next(rows)
+                    for column, field in enumerate(columns, 1):
+                        value = values[column - 1] = report_value(balloon, field)
+                        if field in NUMERIC_FIELDS:
+                            row_styles[column - 1] = styles.formatted(column, number_format(value))
+                out = [cell(value, style) for value, style in zip(values, row_styles)]
+                ws.row_dimensions[row].height = styles.height
+            else:
+                source = template_row(row)
+                template_cells = cells.get(source, {})
+                out = [None] * max(template_cells, default=0)
+                for column, (value, style) in template_cells.items():
+                    out[column - 1] = cell(value, style)
+                set_row_dimension(row, source)
+            ws.append(out)
+            # Row dimensions are written with the row; drop them to keep memory flat
+            ws.row_dimensions.pop(row, None)
+    except BaseException:
+        # An aborted report still has to close the sheet's temporary file
+        ws.close()
+        ws._writer.cleanup()
+        raise
+    wb.save(out_path)
+
+
+class ReportPlan:
+    """Everything ``write`` needs from an ``XlsxTemplate``, derived once.
+
+    Column letters, the canonical data-row style ids and height, the column
+    writers and the footer merges are worked out when the plan is built, so
+    an export only generates rows. Plans are cached per template and layout
+    by ``TemplateCache.plan``.
+    """
+
+    def __init__(self, template, layout, columns):
+        self.template = template
+        self.layout = layout
+        self.columns = tuple(columns)
+        self.width = template.max_column
+        self.letters = [get_column_letter(column) for column in range(1, max(self.width, len(columns)) + 1)]
+        self.styles = [template.cell_style(layout.start_row, column) for column in range(1, self.width + 1)]
+        canonical = template.rows.get(layout.start_row)
+        self.height = {key: canonical.attrs[key] for key in ("ht", "customHeight")
+                       if canonical and key in canonical.attrs}
+        # (letter, field, numeric, style) per report column
+        self.writers = [(self.letters[index], field, field in NUMERIC_FIELDS,
+                         self.styles[index] if index < self.width else 0)
+                        for index, field in enumerate(self.columns)]
+        # Merges above the footer stay put; footer merges move with the footer
+        self.fixed_merges = []
+        self.footer_merges = []
+        for ref in template.merges:
+            min_col, min_row, max_col, max_row = range_boundaries(ref)
+            if min_row >= layout.footer_row:
+                self.footer_merges.append((get_column_letter(min_col), min_row, get_column_letter(max_col), max_row))
+            else:
+                self.fixed_merges.append(ref)
+
+    def letter(self, column):
+        return self.letters[column - 1] if column <= len(self.letters) else get_column_letter(column)
+
+    def merges(self, extra_rows):
+        """Merged ranges of a report with ``extra_rows`` rows added."""
+        return self.fixed_merges + [f"{first}{min_row + extra_rows}:{last}{max_row + extra_rows}"
+                                    for first, min_row, last, max_row in self.footer_merges]
+
+    def row_builders(self, patch, count, cell_values=None):
+        """``(plain_row, styled_row)`` for a report of ``count`` balloons written through ``patch``.
+
+        ``plain_row(row)`` is the template row that lands on ``row``, with
+        ``cell_values`` written. ``styled_row(row, balloon, kept=None)`` is a
+        data row in the canonical formats (the row after the data when
+        ``balloon`` is None), with ``kept`` ({column: value}) written in the
+        columns after the report's own.
+        """
+        template = self.template
+        layout = self.layout
+        extra_rows = layout.extra_rows(count)
+        data_end = layout.start_row + count  # first row after the data rows
+        width = self.width
+        styles = self.styles
+        writers = self.writers
+
+        overlay = {}
+        for coordinate, value in (cell_values or {}).items():
+            row, column = coordinate_to_tuple(coordinate)
+            overlay.setdefault(row, {})[column] = value
+
+        def template_row(row):
+            return row if row < layout.footer_row else row - extra_rows
+
+        def template_cell(source, column, ref, style=None):
+            """Template cell ``column`` of row ``source`` at ``ref``, or None."""
+            values = overlay.get(source)
+            cells = template.rows[source].cells if source in template.rows else {}
+            if values and column in values:
+                attrs = cells[column][0] if column in cells else {}
+                return patch.cell(ref, attrs.get("s", 0) if style is None else style, values[column])
+            if column not in cells:
+                return None
+            attrs, inner = cells[column]
+            attrs = dict(attrs, r=ref)
+            if style is not None:
+                if style:
+                    attrs["s"] = str(style)
+                else:
+                    attrs.pop("s", None)
+            return f"<c{format_attrs(attrs)}/>" if inner is None else f"<c{format_attrs(attrs)}>{inner}</c>"
+
+        def plain_row(row):
+            source = template_row(row)
+            if source not in template.rows and source not in overlay:
+                return ""
+            attrs = dict(template.rows[source].attrs) if source in template.rows else {}
+            attrs["r"] = str(row)
+            columns_used = sorted(set(template.rows[source].cells if source in template.rows else ())
+                                  | set(overlay.get(source, ())))
+            cells = [template_cell(source, column, f"{self.letter(column)}{row}") for column in columns_used]
+            return f"<row{format_attrs(attrs)}>{''.join(cells)}</row>"
+
+        def styled_row(row, balloon, kept=None):
+            source = template_row(row) if row == data_end or row < layout.footer_row else None
+            attrs = {"r": str(row)}
+            if source in template.rows:
+                attrs.update(template.rows[source].attrs)
+                attrs["r"] = str(row)
+            attrs.pop("ht", None)
+            attrs.pop("customHeight", None)
+            attrs.update(self.height)
+            cells = []
+            if balloon is not None:
+                for letter, field, numeric, style in writers:
+                    value = report_value(balloon, field)
+                    if numeric:
+                        style = patch.formatted(style, number_format(value))
+                    cells.append(patch.cell(f"{letter}{row}", style, value))
+            kept = kept or {}
+            for column in range(len(cells) + 1, max([width] + list(kept)) + 1):
+                ref = f"{self.letter(column)}{row}"
+                style = styles[column - 1] if column <= width else 0
+                if column in kept:
+                    cells.append(patch.cell(ref, style, kept[column]))
+                    continue
+                if column > width:
+                    continue
+                cell = template_cell(source, column, ref, style) if source is not None else None
+                cells.append(cell or (f'<c r="{ref}" s="{style}"/>' if style else f'<c r="{ref}"/>'))
+            return f"<row{format_attrs(attrs)}>{''.join(cells)}</row>"
+
+        return plain_row, styled_row
+
+    def write(self, out_path, balloons, cell_values=None, progress=None, kept=None):
+        """Write a report with the same layout as ``fill_report`` as OOXML.
+
+        Template rows are re-emitted as they are (moved below the data when
+        needed); data rows get the canonical row's cell formats. Rows are
+        generated while the sheet is written. ``kept`` maps a balloon's
+        index to values ({column: value}) for the columns after the report's.
+        """
+        layout = self.layout
+        patch = SheetPatch(self.template)
+        count = len(balloons)
+        extra_rows = layout.extra_rows(count)
+        data_end = layout.start_row + count
+        last_row = max(self.template.max_row + extra_rows, data_end)
+        plain_row, styled_row = self.row_builders(patch, count, cell_values)
+        kept = kept or {}
+
+        def rows():
+            data = iter(balloons)
+            for row in range(1, last_row + 1):
+                if layout.start_row <= row < data_end:
+                    index = row - layout.start_row
+                    _row_progress(progress, index, count)
+                    yield styled_row(row, next(data), kept.get(index))
+                elif row == data_end:
+                    yield styled_row(row, None)
+                else:
+                    yield plain_row(row)
+
+        patch.save(out_path, rows(), self.merges(extra_rows), last_row)
+
+
+def save_report_file(template_path, out_path, layout, columns, balloons, cell_values=None, streaming=None,
+                     engine=DEFAULT_REPORT_ENGINE, progress=None):
+    """Write the FAIR report for ``balloons`` to ``out_path``.
+
+    ``engine`` "ooxml" patches the template's XML directly and falls back to
+    openpyxl when the template is not supported. With openpyxl,
+    ``streaming`` picks the write-only mode; None uses it from
+    ``STREAMING_REPORT_MIN_BALLOONS`` balloons on.
+
+    ``progress(done, total, message)`` is called at each phase and every
+    ``REPORT_PROGRESS_ROWS`` data rows; an exception it raises aborts the
+    report. The report goes to ``<out_path>.part`` and replaces
+    ``out_path`` only once complete, so an aborted report leaves nothing.
+    """
+    if engine not in REPORT_ENGINES:
+        raise ValueError(f"Unknown report engine: {engine}")
+    count = len(balloons)
+    part_path = out_path + ".part"
+    try:
+        if progress:
+            progress(0, count, "Reading template")
+        _write_report_file(template_path, part_path, layout, columns, balloons, cell_values, streaming, engine,
+                           progress)
+        if progress:
+            progress(count, count, "Finishing")
+        os.replace(part_path, out_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def _write_report_file(template_path, out_path, layout, columns, balloons, cell_values, streaming, engine,
+                       progress):
+    if engine == "ooxml":
+        try:
+            plan = report_templates.plan(template_path, layout, columns)
+        except UnsupportedTemplate:
+            pass
+        else:
+            plan.write(out_path, balloons, cell_values, progress)
+            return
+    if streaming is None:
+        streaming = len(balloons) >= STREAMING_REPORT_MIN_BALLOONS
+    if streaming:
+        stream_report(report_templates.template(template_path), out_path, layout, columns, balloons, cell_values,
+                      progress)
+        return
+    wb = report_templates.workbook(template_path)
+    ws = wb.active
+    for coordinate, value in (cell_values or {}).items():
+        ws[coordinate].value = value
+    fill_report(ws, layout, columns, balloons, progress)
+    if progress:
+        progress(len(balloons), len(balloons), "Saving workbook")
+    wb.save(out_path)
+
+
+def read_measurements(report_path, layout, columns, measured_column):
+    """Measured values typed into a filled report, by balloon number.
+
+    The report is opened read-only and its rows are streamed as plain values
+    (no cell objects or styles) from the first data row down to the first
+    row without a balloon number, where the footer starts. Returns
+    ``{number: (sheet, value)}``; ``sheet`` is None when ``columns`` has no
+    "sheet" column, and ``value`` is parsed like a requirement ("" if blank).
+    Formula cells give the value Excel last calculated.
+    """
+    number_index = columns.index("no")
+    sheet_index = columns.index("sheet") if "sheet" in columns else None
+    measured_index = column_index_from_string(measured_column) - 1
+    width = max(number_index, measured_index, sheet_index or 0) + 1
+    wb = load_workbook(report_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        # Saved dimensions may be stale; read up to the last row actually present
+        ws.reset_dimensions()
+        values = {}
+        for row in ws.iter_rows(min_row=layout.start_row, max_col=width, values_only=True):
+            row = tuple(row) + (None,) * (width - len(row))
+            try:
+                number = int(row[number_index])
+            except (TypeError, ValueError):
+                break
+            values[number] = (row[sheet_index] if sheet_index is not None else None, parse_value(row[measured_index]))
+        return values
+    finally:
+        wb.close()
+
+
+def _value_key(value, fmt):
+    """Comparable form of a report cell: numbers with their number format."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (bool, str)):
+        return value
+    return Decimal(number_text(value)), fmt
+
+
+def _match_rows(old, new):
+    """Pair each of the ``new`` row keys with an ``old`` row.
+
+    Returns ``(old index or None, unchanged)`` per new row. Common leading
+    and trailing rows are paired directly; only the rows in between are
+    diffed, so the work follows the size of the edit. A changed row pairs
+    with the old row it replaces, so the row keeps its other columns.
+    """
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    pairs = [(index, True) for index in range(start)]
+    matcher = SequenceMatcher(None, old[start:old_end], new[start:new_end], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs += [(start + index, True) for index in range(i1, i2)]
+        elif tag in ("replace", "insert"):
+            paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+            pairs += [(start + i1 + index, False) for index in range(paired)]
+            pairs += [(None, False)] * (j2 - j1 - paired)
+    pairs += [(old_end + index, True) for index in range(len(new) - new_end)]
+    return pairs
+
+
+def _carry_over(plan, report, layout, columns, pairs, old_count):
+    """What a report regenerated from ``plan`` keeps of ``report``.
+
+    Returns ``(kept, cell_values)``: the values typed after the report
+    columns by balloon index, as for ``ReportPlan.write``, and the header
+    and footer cells that differ from the template, by template cell.
+    Formulas stay the template's.
+    """
+    template = plan.template
+    kept = {}
+    for index, (source, _) in enumerate(pairs):
+        if source is None:
+            continue
+        cells = report.rows[layout.start_row + source].cells
+        values = {column: report.cell_value(*cell) for column, cell in cells.items() if column > len(columns)}
+        values = {column: value for column, value in values.items() if value not in (None, "")}
+        if values:
+            kept[index] = values
+
+    cell_values = {}
+    old_extra = layout.extra_rows(old_count)
+    for number, row in report.rows.items():
+        if layout.start_row <= number < layout.footer_row + old_extra:
+            continue
+        source = number if number < layout.start_row else number - old_extra
+        template_cells = template.rows[source].cells if source in template.rows else {}
+        for column, (attrs, inner) in row.cells.items():
+            template_cell = template_cells.get(column)
+            if "<f" in (inner or "") or (template_cell and "<f" in (template_cell[1] or "")):
+                continue
+            value = report.cell_value(attrs, inner)
+            if value not in (None, "") and value != (template.cell_value(*template_cell) if template_cell else None):
+                cell_values[f"{get_column_letter(column)}{source}"] = value
+    return kept, cell_values
+
+
+def refresh_report(template_path, report_path, layout, columns, balloons, cell_values=None, out_path=None,
+                   progress=None):
+    """Bring a report written earlier up to date with ``balloons``.
+
+    Report rows are matched to balloons by their report columns (all but the
+    number), so inserting or deleting a balloon only adds or removes its
+    own row. Unchanged rows are copied as they are, renumbered where they
+    moved; a changed row gets only its report columns rewritten, so what
+    was typed into other columns (measured values, remarks) stays with its
+    balloon. New rows take the formats of the row below the data, the
+    footer moves by the change in data rows, and ``cell_values`` (the
+    headers) are rewritten where they differ.
+
+    When the data shrinks from the template's data rows or more to fewer,
+    the rows freed up are laid out from ``template_path`` again. If the
+    report's formats no longer match the template's (it was saved by
+    another program), the report is regenerated instead, keeping the
+    typed-in values and the changed header and footer cells.
+
+    The report is written to ``out_path`` (default: in place) through a
+    ``.part`` file. ``progress`` is as for ``save_report_file``. Returns
+    ``(updated, inserted, deleted)`` row counts.
+    """
+    if "no" not in columns:
+        raise ValueError("Reports without a balloon number column cannot be refreshed")
+    out_path = out_path or report_path
+    report = XlsxTemplate(report_path)
+    patch = SheetPatch(report)
+    rows = report.rows
+    start = layout.start_row
+    number_column = columns.index("no") + 1
+    key_columns = [(column, field) for column, field in enumerate(columns, 1) if field != "no"]
+
+    def old_value(row, column):
+        cell = rows[row].cells.get(column) if row in rows else None
+        return report.cell_value(*cell) if cell is not None else None
+
+    # Report cells repeat a lot (zones, tolerances, equipment): decode each once
+    decoded = {}
+
+    def old_key(row):
+        cells = rows[row].cells
+        key = []
+        for column, _ in key_columns:
+            cell = cells.get(column)
+            if cell is None:
+                key.append(None)
+                continue
+            attrs, inner = cell
+            kind = (attrs.get("t"), attrs.get("s"), inner)
+            if kind not in decoded:
+                value = report.cell_value(attrs, inner)
+                fmt = report.number_format(int(attrs.get("s", 0))) if isinstance(value, Decimal) else None
+                decoded[kind] = _value_key(value, fmt)
+            key.append(decoded[kind])
+        return tuple(key)
+
+    # The report's data rows run down to the first row without a number
+    old_count = 0
+    while True:
+        number = old_value(start + old_count, number_column)
+        if not isinstance(number, Decimal) or number != number.to_integral_value():
+            break
+        old_count += 1
+    count = len(balloons)
+    old_footer = layout.footer_row + layout.extra_rows(old_count)
+    new_footer = layout.footer_row + layout.extra_rows(count)
+    shift = new_footer - old_footer
+
+    old_keys = [old_key(start + index) for index in range(old_count)]
+    new_keys = []
+    for balloon in balloons:
+        key = []
+        for _, field in key_columns:
+            value = report_value(balloon, field)
+            key.append(_value_key(value, number_format(value)))
+        new_keys.append(tuple(key))
+    pairs = _match_rows(old_keys, new_keys)
+    kept = sum(1 for index, _ in pairs if index is not None)
+    updated = sum(1 for index, same in pairs if index is not None and not same)
+    inserted = count - kept
+    deleted = old_count - kept
+
+    # Shrinking past the template's data rows: the formats of the rows that
+    # become blank again and of the first footer row come from the template
+    plan = None
+    if count < layout.template_rows <= old_count:
+        plan = report_templates.plan(template_path, layout, columns)
+        if not report.extends_styles(plan.template):
+            part_path = out_path + ".part"
+            try:
+                carried, values = _carry_over(plan, report, layout, columns, pairs, old_count)
+                values.update(cell_values or {})
+                plan.write(part_path, balloons, values, progress, carried)
+                os.replace(part_path, out_path)
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            return updated, inserted, deleted
+
+    overlay = {}
+    for coordinate, value in (cell_values or {}).items():
+        row, column = coordinate_to_tuple(coordinate)
+        overlay.setdefault(row, {})[column] = value
+
+    # The row below the data has the data rows' own formats, without values
+    end_row = start + old_count
+    blank_padding = layout.footer_row - 1 if end_row < layout.footer_row - 1 else None
+
+    def render(row, source, values=None, formats=None, blank=False):
+        """Row ``source`` of the report at ``row``, with ``values`` ({column: (value, numeric)}) written.
+
+        ``formats`` (a ``TemplateRow``) gives the row's formats and height;
+        ``blank`` leaves its values out.
+        """
+        old = rows.get(source)
+        if old is not None and row == source and not values and formats is None and not blank:
+            return old.xml
+        cells = dict(old.cells) if old is not None else {}
+        attrs = dict(old.attrs) if old is not None else {}
+        if formats is not None:
+            attrs = dict(formats.attrs)
+            styles = {column: cell_attrs.get("s") for column, (cell_attrs, _) in formats.cells.items()}
+            # Values outside the formatted cells are kept as they are
+            typed = {column: cell for column, cell in cells.items() if column not in styles and cell[1] is not None}
+            cells = {column: cells.get(column, ({}, None)) for column in styles}
+            cells = {column: (dict({key: value for key, value in cell_attrs.items() if key != "s"},
+                                   **({"s": styles[column]} if styles[column] else {})), inner)
+                     for column, (cell_attrs, inner) in cells.items()}
+            cells.update(typed)
+        if blank:
+            cells = {column: ({key: value for key, value in cell_attrs.items() if key == "s"}, None)
+                     for column, (cell_attrs, _) in cells.items()}
+        if not cells and not values and old is None:
+            return ""
+        attrs["r"] = str(row)
+        out = []
+        for column in sorted(set(cells) | set(values or ())):
+            ref = f"{get_column_letter(column)}{row}"
+            if values and column in values:
+                value, numeric = values[column]
+                style = int(cells[column][0].get("s", 0)) if column in cells else 0
+                if numeric:
+                    style = patch.formatted(style, number_format(value))
+                out.append(patch.cell(ref, style, value))
+            else:
+                cell_attrs, inner = cells[column]
+                cell_attrs = dict(cell_attrs, r=ref)
+                out.append(f"<c{format_attrs(cell_attrs)}/>" if inner is None
+                           else f"<c{format_attrs(cell_attrs)}>{inner}</c>")
+        return f"<row{format_attrs(attrs)}>{''.join(out)}</row>"
+
+    def data_values(balloon, fields):
+        return {column: (report_value(balloon, field), field in NUMERIC_FIELDS)
+                for column, field in enumerate(columns, 1) if field in fields}
+
+    def header_values(row):
+        values = overlay.get(row)
+        if not values:
+            return None
+        changed = {column: (value, False) for column, value in values.items()
+                   if _value_key(value, "General") != _value_key(old_value(row, column), "General")}
+        return changed or None
+
+    def output():
+        for row in range(1, start):
+            yield render(row, row, header_values(row))
+        for index, (balloon, (source, same)) in enumerate(zip(balloons, pairs)):
+            _row_progress(progress, index, count)
+            row = start + index
+            if source is None:
+                yield render(row, end_row, data_values(balloon, columns), blank=True)
+                continue
+            source += start
+            if not same:
+                yield render(row, source, data_values(balloon, columns))
+            elif old_value(source, number_column) != index + 1:
+                yield render(row, source, data_values(balloon, ("no",)))
+            else:
+                yield render(row, source)
+        # The row below the data, then the template's blank data rows
+        footer = old_footer
+        if plan is not None:
+            plain_row, styled_row = plan.row_builders(patch, count)
+            yield styled_row(start + count, None)
+            for row in range(start + count + 1, layout.footer_row):
+                yield plain_row(row)
+            # The old row below the data is the first footer row again
+            template_footer = plan.template.rows.get(layout.footer_row) or TemplateRow({}, None)
+            yield render(layout.footer_row, old_footer, formats=template_footer)
+            footer += 1
+        elif count < layout.template_rows:
+            yield render(start + count, end_row)
+            for row in range(start + count + 1, layout.footer_row):
+                if end_row < row < layout.footer_row:
+                    yield render(row, row)
+                elif blank_padding is not None:
+                    yield render(row, blank_padding)
+                else:
+                    yield render(row, end_row, blank=True)
+        elif old_count < layout.template_rows:
+            # The first footer row becomes the row below the data
+            yield render(new_footer, old_footer, formats=rows.get(end_row) or TemplateRow({}, None))
+            footer += 1
+        for source in range(footer, report.max_row + 1):
+            yield render(source + shift, source)
+
+    merges = []
+    for ref in report.merges:
+        min_col, min_row, max_col, max_row = range_boundaries(ref)
+        if min_row >= old_footer and shift:
+            ref = f"{get_column_letter(min_col)}{min_row + shift}:{get_column_letter(max_col)}{max_row + shift}"
+        merges.append(ref)
+
+    last_row = max(report.max_row + shift, start + count)
+    part_path = out_path + ".part"
+    try:
+        patch.save(part_path, output(), merges, last_row)
+        os.replace(part_path, out_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return updated, inserted, deleted
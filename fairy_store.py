@@ -0,0 +1,724 @@
+"""Columnar balloon storage shared by the FAIR-y variants.
+
+Numeric balloon attributes (page, position, radius, connector start, colour)
+live in typed NumPy arrays with amortised growth; free-text fields live in
+parallel lists. Per-page selection, bounding-box queries and coordinate
+transforms run vectorised over those columns.
+
+``BalloonStore`` still behaves like the old ``balloons`` list of dicts:
+indexing or iterating it yields ``BalloonRecord`` views that read and write
+the underlying columns, so existing code paths keep working unchanged.
+
+Requirement, tolerance and measured values are parsed once on entry (see
+``fairy_numeric``); the store derives exact lower/upper limits and the
+measurement's pass/fail result whenever one of them changes so the list and
+report never reparse.
+
+Balloon numbers are not stored. They are the balloon's position in an
+order-statistics tree (``BalloonOrder``), so deleting or inserting a balloon
+is O(log n) and never rewrites the numbers of the balloons after it.
+
+Each balloon also has a stable integer ``id`` that survives deletes, undo and
+project save/load. Every add, update and removal is logged with a sequence
+number in the store's ``ChangeJournal`` so consumers (list view, exporters)
+can process only what changed since the last sequence number they saw.
+"""
+
+import random
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from fairy_numeric import measurement_result, parse_value, tolerance_limits
+
+DEFAULT_BALLOON_COLOR = "#ff0000"
+
+# Numeric columns and their dtypes. Connector start points are NaN when the
+# balloon was placed without a line; colours are packed as 0xRRGGBB.
+NUMERIC_COLUMNS = (
+    ("id", np.int64),
+    ("page", np.int32),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("r", np.float64),
+    ("color", np.uint32),
+    ("highlight", np.bool_),
+    ("start_x", np.float64),
+    ("start_y", np.float64),
+)
+TEXT_COLUMNS = ("zone", "char", "req", "neg", "pos", "equip", "measured")
+# Tolerance limits derived from req/neg/pos, and the measured value's
+# "pass"/"fail" result against them; kept alongside the text columns.
+LIMIT_COLUMNS = ("lower", "upper", "result")
+_LIST_COLUMNS = TEXT_COLUMNS + LIMIT_COLUMNS
+
+# Field order of the legacy balloon dict, plus the derived limits.
+FIELDS = (
+    "id", "page", "no", "x", "y", "r",
+    "zone", "char", "req", "neg", "pos", "equip",
+    "color", "highlight", "start_x", "start_y",
+    "lower", "upper", "measured", "result",
+)
+# Fields computed by the store; they are read-only through records.
+DERIVED_FIELDS = ("no", "lower", "upper", "result")
+# Fields that cannot be assigned once the balloon exists.
+_READ_ONLY = DERIVED_FIELDS + ("id",)
+# Fields parsed into Decimal on entry; the derived fields follow them.
+_TOLERANCE_FIELDS = ("req", "neg", "pos", "measured")
+
+_DEFAULTS = {
+    "id": None, "page": 0, "no": 0, "x": 0.0, "y": 0.0, "r": 0.0,
+    "zone": "", "char": "", "req": "", "neg": "", "pos": "", "equip": "",
+    "color": DEFAULT_BALLOON_COLOR, "highlight": False,
+    "start_x": None, "start_y": None,
+    "lower": None, "upper": None, "measured": "", "result": "",
+}
+
+
+def pack_color(value):
+    """Pack a ``#rrggbb`` string into an int; invalid values fall back to red."""
+    try:
+        return int(value[1:7], 16) if len(value) == 7 and value[0] == "#" else int(DEFAULT_BALLOON_COLOR[1:], 16)
+    except (TypeError, ValueError):
+        return int(DEFAULT_BALLOON_COLOR[1:], 16)
+
+
+def unpack_color(value):
+    return f"#{int(value):06x}"
+
+
+def _optional_float(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else value
+
+
+_READERS = {
+    "id": int,
+    "page": int,
+    "x": float,
+    "y": float,
+    "r": float,
+    "color": unpack_color,
+    "highlight": bool,
+    "start_x": _optional_float,
+    "start_y": _optional_float,
+}
+
+_WRITERS = {
+    "color": pack_color,
+    "start_x": _nan_if_none,
+    "start_y": _nan_if_none,
+}
+
+
+def rotate_points(x, y, w, h, rot):
+    """Vectorised ``rotate_coords``: map raw page coords into the rotated view."""
+    if rot == 90:
+        return h - y, x
+    if rot == 180:
+        return w - x, h - y
+    if rot == 270:
+        return y, w - x
+    return x, y
+
+
+class _OrderNode:
+    __slots__ = ("slot", "prio", "size", "left", "right", "parent")
+
+    def __init__(self, slot, prio):
+        self.slot = slot
+        self.prio = prio
+        self.size = 1
+        self.left = None
+        self.right = None
+        self.parent = None
+
+
+def _size(node):
+    return node.size if node is not None else 0
+
+
+def _pull(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    if node.left is not None:
+        node.left.parent = node
+    if node.right is not None:
+        node.right.parent = node
+    return node
+
+
+def _split(node, k):
+    """Split into (first k nodes, the rest)."""
+    if node is None:
+        return None, None
+    if _size(node.left) >= k:
+        left, node.left = _split(node.left, k)
+        if left is not None:
+            left.parent = None
+        return left, _pull(node)
+    node.right, right = _split(node.right, k - _size(node.left) - 1)
+    if right is not None:
+        right.parent = None
+    return _pull(node), right
+
+
+def _merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.prio > b.prio:
+        a.right = _merge(a.right, b)
+        return _pull(a)
+    b.left = _merge(a, b.left)
+    return _pull(b)
+
+
+class BalloonOrder:
+    """Order-statistics tree (implicit treap) holding balloon slots in order.
+
+    ``insert``, ``remove``, ``rank`` and ``at`` are O(log n) expected, so a
+    balloon's number can be derived from its position without renumbering
+    every balloon after it.
+    """
+
+    def __init__(self, seed=None):
+        self._root = None
+        self._nodes = {}
+        self._rng = random.Random(seed)
+
+    def __len__(self):
+        return _size(self._root)
+
+    def __iter__(self):
+        stack, node = [], self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.slot
+            node = node.right
+
+    def __contains__(self, slot):
+        return slot in self._nodes
+
+    def insert(self, index, slot):
+        """Insert ``slot`` so that it ends up at position ``index``."""
+        if slot in self._nodes:
+            raise ValueError(f"slot {slot} is already ordered")
+        node = _OrderNode(slot, self._rng.random())
+        self._nodes[slot] = node
+        left, right = _split(self._root, max(0, min(index, len(self))))
+        self._root = _merge(_merge(left, node), right)
+        self._root.parent = None
+
+    def append(self, slot):
+        self.insert(len(self), slot)
+
+    def remove(self, slot):
+        index = self.rank(slot)
+        left, rest = _split(self._root, index)
+        _, right = _split(rest, 1)
+        self._root = _merge(left, right)
+        if self._root is not None:
+            self._root.parent = None
+        del self._nodes[slot]
+
+    def rank(self, slot):
+        """Zero-based position of ``slot``."""
+        node = self._nodes[slot]
+        index = _size(node.left)
+        while node.parent is not None:
+            if node is node.parent.right:
+                index += _size(node.parent.left) + 1
+            node = node.parent
+        return index
+
+    def at(self, index):
+        """Slot at zero-based position ``index`` (negative indexes allowed)."""
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("balloon index out of range")
+        node = self._root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.slot
+            else:
+                index -= left + 1
+                node = node.right
+
+    def remap(self, mapping):
+        """Renumber slots in place after the store compacts its columns."""
+        nodes = {}
+        for slot, node in self._nodes.items():
+            node.slot = int(mapping[slot])
+            nodes[node.slot] = node
+        self._nodes = nodes
+
+
+class ChangeSet:
+    """Balloon IDs touched since a consumer's last sequence number.
+
+    ``renumber_from`` is the lowest list position where a balloon was added
+    or removed (numbers from there on may have shifted), or None.
+    """
+
+    __slots__ = ("seq", "added", "updated", "removed", "renumber_from")
+
+    def __init__(self, seq, added, updated, removed, renumber_from):
+        self.seq = seq
+        self.added = added
+        self.updated = updated
+        self.removed = removed
+        self.renumber_from = renumber_from
+
+    def __bool__(self):
+        return bool(self.added or self.updated or self.removed)
+
+
+class ChangeJournal:
+    """Sequence-numbered log of balloon adds, updates and removals.
+
+    Each change takes the next ``seq``. A consumer remembers the ``seq`` it
+    last processed and asks ``changes_since(seq)`` for the IDs touched after
+    it. At most ``limit`` recent entries are kept; a consumer that falls
+    further behind, or whose ``seq`` predates ``reset()``, gets None and must
+    rebuild from scratch.
+    """
+
+    def __init__(self, limit=10000):
+        self.limit = max(1, int(limit))
+        self.seq = 0
+        self._entries = []  # (seq, op, id, position); seqs are contiguous
+        self._floor = 0     # changes at or before this seq are unavailable
+
+    def record(self, op, balloon_id, position=None):
+        self.seq += 1
+        self._entries.append((self.seq, op, balloon_id, position))
+        if len(self._entries) > 2 * self.limit:
+            dropped = len(self._entries) - self.limit
+            self._floor = self._entries[dropped - 1][0]
+            del self._entries[:dropped]
+        return self.seq
+
+    def reset(self):
+        """Forget all entries, e.g. when the store is cleared for a new project."""
+        self.seq += 1
+        self._entries.clear()
+        self._floor = self.seq
+
+    def changes_since(self, seq):
+        """Collapsed ``ChangeSet`` for changes after ``seq``, or None to resync."""
+        if seq < self._floor or seq > self.seq:
+            return None
+        start = seq + 1 - self._entries[0][0] if self._entries else 0
+        first_op, last_op = {}, {}
+        renumber_from = None
+        for _, op, balloon_id, position in self._entries[start:]:
+            first_op.setdefault(balloon_id, op)
+            last_op[balloon_id] = op
+            if position is not None and (renumber_from is None or position < renumber_from):
+                renumber_from = position
+        added, updated, removed = set(), set(), set()
+        for balloon_id, op in first_op.items():
+            existed_before = op != "add"
+            exists_now = last_op[balloon_id] != "remove"
+            if existed_before and exists_now:
+                updated.add(balloon_id)
+            elif exists_now:
+                added.add(balloon_id)
+            elif existed_before:
+                removed.add(balloon_id)
+        return ChangeSet(self.seq, added, updated, removed, renumber_from)
+
+
+class BalloonRecord(MutableMapping):
+    """Dict-like view of one balloon row in a ``BalloonStore``.
+
+    Records compare by identity, like the dicts they replace. Once removed
+    from the store a record keeps a detached copy of its values.
+    """
+
+    __slots__ = ("_store", "_slot", "_data")
+
+    def __init__(self, store, slot):
+        self._store = store
+        self._slot = slot
+        self._data = None
+
+    def __getitem__(self, key):
+        if self._data is not None:
+            return self._data[key]
+        return self._store._get(self._slot, key)
+
+    def __setitem__(self, key, value):
+        if self._data is not None:
+            if key not in self._data:
+                raise KeyError(key)
+            self._data[key] = value
+        else:
+            self._store._update(self._slot, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("balloon fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f"BalloonRecord({dict(self)!r})"
+
+    @property
+    def attached(self):
+        return self._data is None
+
+    def _detach(self):
+        self._data = {key: self._store._get(self._slot, key) for key in FIELDS}
+        self._store = None
+        self._slot = None
+
+
+class BalloonStore:
+    """Balloons held column-wise, with a list-of-dicts compatible interface.
+
+    Rows are addressed by slot. Removing a balloon only clears its ``live``
+    flag; the arrays are compacted once removed slots outnumber live ones, so
+    removal never shifts every column. Balloon order, and therefore the ``no``
+    field, comes from a ``BalloonOrder`` over the live slots. Changes are
+    logged to ``journal`` by balloon ``id``.
+    """
+
+    def __init__(self, capacity=64, journal=None):
+        self._cap = max(1, capacity)
+        self._size = 0
+        self._count = 0
+        self._live = np.zeros(self._cap, dtype=np.bool_)
+        self._cols = {name: np.zeros(self._cap, dtype=dtype) for name, dtype in NUMERIC_COLUMNS}
+        self._text = {name: [] for name in _LIST_COLUMNS}
+        self._records = []
+        self._order = BalloonOrder()
+        self._by_id = {}
+        self._next_id = 1
+        self.journal = journal if journal is not None else ChangeJournal()
+        self._slot_cache = None
+        self._rank_cache = None
+
+    # ---------------- list-of-dicts interface ----------------
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        records = self._records
+        return iter([records[s] for s in self.slots()])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.records(self.slots()[index])
+        return self._records[self._order.at(index)]
+
+    def __contains__(self, record):
+        return isinstance(record, BalloonRecord) and record._store is self
+
+    def by_id(self, balloon_id):
+        """Record with the given stable ID, or None."""
+        return self._by_id.get(balloon_id)
+
+    def index(self, record):
+        if record not in self:
+            raise ValueError("balloon is not in the store")
+        return self._order.rank(record._slot)
+
+    def append(self, values):
+        """Add a balloon from a mapping of legacy fields; returns its record.
+
+        Any ``no`` in ``values`` is ignored: numbers follow list order. An
+        ``id`` is kept if it is an unused integer, otherwise a new one is
+        assigned.
+        """
+        return self.insert(self._count, values)
+
+    def insert(self, index, values):
+        """Add a balloon at list position ``index``; returns its record."""
+        return self._insert(index, values, None)
+
+    def restore(self, index, record):
+        """Re-insert a removed record at ``index``, keeping its identity."""
+        if record.attached:
+            raise ValueError("balloon is already in a store")
+        values, record._data = record._data, None
+        return self._insert(index, values, record)
+
+    def _insert(self, index, values, record):
+        if self._size == self._cap:
+            self._grow(self._cap * 2)
+        slot = self._size
+        self._size += 1
+        self._count += 1
+        self._live[slot] = True
+        for name in _LIST_COLUMNS:
+            self._text[name].append(_DEFAULTS[name])
+        if record is None:
+            record = BalloonRecord(self, slot)
+        else:
+            record._store, record._slot = self, slot
+        self._records.append(record)
+        for key in FIELDS:
+            if key not in _READ_ONLY:
+                self._set(slot, key, values.get(key, _DEFAULTS[key]))
+        balloon_id = values.get("id")
+        if not isinstance(balloon_id, int) or isinstance(balloon_id, bool) or balloon_id in self._by_id:
+            balloon_id = self._next_id
+        self._next_id = max(self._next_id, balloon_id + 1)
+        self._cols["id"][slot] = balloon_id
+        self._by_id[balloon_id] = record
+        self._order.insert(index, slot)
+        self._invalidate()
+        self.journal.record("add", balloon_id, self._order.rank(slot))
+        return record
+
+    def remove(self, record):
+        if record not in self:
+            raise ValueError("balloon is not in the store")
+        slot = record._slot
+        balloon_id = int(self._cols["id"][slot])
+        position = self._order.rank(slot)
+        record._detach()
+        del self._by_id[balloon_id]
+        self._order.remove(slot)
+        self._live[slot] = False
+        self._records[slot] = None
+        for name in _LIST_COLUMNS:
+            self._text[name][slot] = None
+        self._count -= 1
+        self._invalidate()
+        self.journal.record("remove", balloon_id, position)
+        if self._size - self._count > max(64, self._count):
+            self._compact()
+
+    def pop(self, index=-1):
+        record = self[index]
+        self.remove(record)
+        return record
+
+    def clear(self):
+        for record in self:
+            record._detach()
+        journal = self.journal
+        self.__init__(self._cap, journal)
+        journal.reset()
+
+    # ---------------- vectorised queries ----------------
+    def slots(self):
+        """Live slots in balloon order (materialised once per change)."""
+        if self._slot_cache is None:
+            self._slot_cache = np.fromiter(self._order, dtype=np.intp, count=self._count)
+        return self._slot_cache
+
+    def numbers(self, slots=None):
+        """Balloon numbers (1-based list positions) for the given slots."""
+        if self._rank_cache is None:
+            order = self.slots()
+            ranks = np.zeros(self._size, dtype=np.int64)
+            ranks[order] = np.arange(1, len(order) + 1)
+            self._rank_cache = ranks
+        return self._rank_cache[self.slots() if slots is None else slots]
+
+    def snapshot(self, names=("page", "x", "y", "r", "start_x", "start_y", "color")):
+        """Copies of numeric columns in balloon order, plus ``no``.
+
+        The arrays share nothing with the store, so exporters can use them
+        from another thread or process while editing continues.
+        """
+        slots = self.slots()
+        data = {name: self._cols[name][slots] for name in names}
+        data["no"] = np.arange(1, len(slots) + 1, dtype=np.int64)
+        return data
+
+    def columns(self, fields):
+        """Detached ``fields`` of every balloon in order, one list per field.
+
+        Like ``snapshot`` this shares nothing with the store, so exporters can
+        use it on a worker thread while editing continues.
+        """
+        slots = self.slots()
+        columns = {}
+        for field in fields:
+            if field == "no":
+                columns[field] = list(range(1, len(slots) + 1))
+            elif field in self._text:
+                text = self._text[field]
+                columns[field] = [text[s] for s in slots.tolist()]
+            else:
+                values = self._cols[field][slots]
+                reader = _READERS[field]
+                if reader in (int, float, bool):
+                    # tolist() already yields the Python type
+                    columns[field] = values.tolist()
+                elif reader is _optional_float:
+                    column = values.tolist()
+                    for index in np.flatnonzero(np.isnan(values)).tolist():
+                        column[index] = None
+                    columns[field] = column
+                else:
+                    columns[field] = [reader(v) for v in values.tolist()]
+        return columns
+
+    def rows(self, fields):
+        """Like ``columns``, as one dict per balloon (the report writer's input)."""
+        columns = self.columns(fields)
+        return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
+
+    def record(self, slot):
+        return self._records[slot]
+
+    def records(self, slots):
+        records = self._records
+        return [records[s] for s in slots]
+
+    def column(self, name, slots=None):
+        """Numeric column for the given slots (all live balloons by default)."""
+        col = self._cols[name]
+        return col[self.slots() if slots is None else slots]
+
+    def page_slots(self, page):
+        """Slots on ``page`` in balloon order."""
+        order = self.slots()
+        return order[self._cols["page"][order] == page]
+
+    def on_page(self, page):
+        return self.records(self.page_slots(page))
+
+    def pages(self):
+        """Sorted distinct pages that carry at least one balloon."""
+        return np.unique(self.column("page"))
+
+    def in_bbox(self, x0, y0, x1, y1, page=None):
+        """Slots whose circle overlaps the rectangle (x0, y0)-(x1, y1)."""
+        slots = self.slots() if page is None else self.page_slots(page)
+        x = self._cols["x"][slots]
+        y = self._cols["y"][slots]
+        r = self._cols["r"][slots]
+        hit = (x + r >= x0) & (x - r <= x1) & (y + r >= y0) & (y - r <= y1)
+        return slots[hit]
+
+    def bounds(self, slots=None):
+        """Bounding box (x0, y0, x1, y1) of the balloon circles, or None."""
+        slots = self.slots() if slots is None else slots
+        if not len(slots):
+            return None
+        x = self._cols["x"][slots]
+        y = self._cols["y"][slots]
+        r = self._cols["r"][slots]
+        return (float((x - r).min()), float((y - r).min()),
+                float((x + r).max()), float((y + r).max()))
+
+    def transform(self, matrix, slots=None):
+        """Apply an affine ``(a, b, c, d, e, f)`` matrix to positions in place.
+
+        Uses the PDF/fitz convention ``x' = a*x + c*y + e``,
+        ``y' = b*x + d*y + f``. Connector start points move with the balloon;
+        NaN start points stay NaN.
+        """
+        a, b, c, d, e, f = (float(v) for v in matrix)
+        slots = self.slots() if slots is None else slots
+        for xn, yn in (("x", "y"), ("start_x", "start_y")):
+            x = self._cols[xn][slots]
+            y = self._cols[yn][slots]
+            self._cols[xn][slots] = a * x + c * y + e
+            self._cols[yn][slots] = b * x + d * y + f
+        for balloon_id in self._cols["id"][slots].tolist():
+            self.journal.record("update", balloon_id)
+
+    # ---------------- internals ----------------
+    def _get(self, slot, key):
+        text = self._text.get(key)
+        if text is not None:
+            return text[slot]
+        if key == "no":
+            if self._rank_cache is not None:
+                return int(self._rank_cache[slot])
+            return self._order.rank(slot) + 1
+        return _READERS[key](self._cols[key][slot])
+
+    def _update(self, slot, key, value):
+        self._set(slot, key, value)
+        self.journal.record("update", int(self._cols["id"][slot]))
+
+    def _set(self, slot, key, value):
+        if key in _READ_ONLY:
+            raise KeyError(f"'{key}' is maintained by the store and cannot be set")
+        text = self._text.get(key)
+        if text is not None:
+            if key in _TOLERANCE_FIELDS:
+                text[slot] = parse_value(value)
+                self._update_limits(slot)
+            else:
+                text[slot] = value
+            return
+        writer = _WRITERS.get(key)
+        self._cols[key][slot] = writer(value) if writer else value
+
+    def _update_limits(self, slot):
+        text = self._text
+        lower, upper = tolerance_limits(text["req"][slot], text["neg"][slot], text["pos"][slot])
+        text["lower"][slot] = lower
+        text["upper"][slot] = upper
+        text["result"][slot] = measurement_result(text["measured"][slot], lower, upper)
+
+    def _invalidate(self):
+        self._slot_cache = None
+        self._rank_cache = None
+
+    def _grow(self, capacity):
+        n = self._size
+        live = np.zeros(capacity, dtype=np.bool_)
+        live[:n] = self._live[:n]
+        self._live = live
+        for name, dtype in NUMERIC_COLUMNS:
+            col = np.zeros(capacity, dtype=dtype)
+            col[:n] = self._cols[name][:n]
+            self._cols[name] = col
+        self._cap = capacity
+
+    def _compact(self):
+        keep = np.flatnonzero(self._live[:self._size])
+        n = len(keep)
+        mapping = np.full(self._size, -1, dtype=np.intp)
+        mapping[keep] = np.arange(n)
+        self._order.remap(mapping)
+        cap = max(64, self._cap // 2 if n * 4 < self._cap else self._cap)
+        self._live = np.zeros(cap, dtype=np.bool_)
+        self._live[:n] = True
+        for name, dtype in NUMERIC_COLUMNS:
+            col = np.zeros(cap, dtype=dtype)
+            col[:n] = self._cols[name][keep]
+            self._cols[name] = col
+        for name in _LIST_COLUMNS:
+            old = self._text[name]
+            self._text[name] = [old[s] for s in keep]
+        self._records = [self._records[s] for s in keep]
+        for slot, record in enumerate(self._records):
+            record._slot = slot
+        self._cap = cap
+        self._size = n
+        self._invalidate()
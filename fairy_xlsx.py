@@ -0,0 +1,424 @@
+"""Direct OOXML patching of an .xlsx template.
+
+A report only changes one worksheet of its template: a few header cells and a
+block of data rows, with the footer moved below them. ``XlsxTemplate`` reads
+the template zip once and splits that sheet's XML into rows and cells;
+``SheetPatch`` writes a copy in which every other part is copied unchanged and
+only the sheet XML (rows, dimension and merge list), the shared strings and,
+when new number formats are needed, the cell formats in the styles part are
+rewritten. Rows are streamed into the output zip as they are produced.
+
+Only what a report template needs is supported. Templates the parser does not
+understand raise ``UnsupportedTemplate`` so the caller can fall back to
+openpyxl.
+"""
+
+import copy
+import html
+import posixpath
+import re
+import zipfile
+from decimal import Decimal
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils.cell import column_index_from_string, get_column_letter, range_boundaries
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+SHARED_STRINGS_REL = REL_NS + "/sharedStrings"
+STYLES_REL = REL_NS + "/styles"
+CALC_CHAIN_REL = REL_NS + "/calcChain"
+
+_ATTR = re.compile(r'([\w:.-]+)\s*=\s*"([^"]*)"')
+_ROW = re.compile(r"<row\b([^>]*?)(?:/>|>(.*?)</row>)", re.S)
+_CELL = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+_CELL_COLUMN = re.compile(r'<c\b[^>]*?\br="([A-Z]+)')
+_CELL_WITHOUT_REF = re.compile(r"<c\b(?![^>]*?\br=)")
+_SHEET_DATA = re.compile(r"<sheetData\s*/>|<sheetData\b[^>]*>(.*?)</sheetData>", re.S)
+_MERGE_CELLS = re.compile(r"<mergeCells\b[^>]*?(?:/>|>(.*?)</mergeCells>)", re.S)
+_DIMENSION = re.compile(r'(<dimension\b[^>]*\bref=")([^"]*)(")')
+_CELL_XFS = re.compile(r"(<cellXfs\b[^>]*>)(.*?)(</cellXfs>)", re.S)
+_XF = re.compile(r"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+_NUM_FMTS = re.compile(r"<numFmts\b[^>]*?(?:/>|>(.*?)</numFmts>)", re.S)
+_NUM_FMT = re.compile(r"<numFmt\b([^>]*?)/>")
+_SST = re.compile(r"(<sst\b[^>]*>)(.*)(</sst>)", re.S)
+_SST_EMPTY = re.compile(r"<sst\b[^>]*/>")
+_SI = re.compile(r"<si\b[^>]*?(?:/>|>(.*?)</si>)", re.S)
+_T = re.compile(r"<t\b[^>]*?(?:/>|>(.*?)</t>)", re.S)
+_V = re.compile(r"<v\b[^>]*>(.*?)</v>", re.S)
+_RPH = re.compile(r"<rPh\b.*?</rPh>", re.S)
+
+# Characters XML 1.0 cannot carry; openpyxl refuses them too
+_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class UnsupportedTemplate(Exception):
+    """The template uses OOXML the patcher does not handle."""
+
+
+def parse_attrs(text):
+    """Attributes of a start tag as an ordered dict of raw (escaped) values."""
+    return dict(_ATTR.findall(text))
+
+
+def format_attrs(attrs):
+    return "".join(f' {name}="{value}"' for name, value in attrs.items())
+
+
+def number_text(value):
+    """Cell text of a number, formatted as openpyxl writes it."""
+    return "%.16g" % value
+
+
+def _text_runs(xml):
+    """Text of a ``<si>`` or ``<is>`` body, phonetic runs left out."""
+    return html.unescape("".join(run or "" for run in _T.findall(_RPH.sub("", xml or ""))))
+
+
+class TemplateRow:
+    """One ``<row>`` of the template sheet: attributes and cells by column.
+
+    ``xml`` is the row exactly as it appears in the sheet. Cells are parsed
+    on first use, so a large sheet only pays for the rows that are read.
+    """
+
+    def __init__(self, attrs, body, xml=None):
+        self.attrs = attrs
+        self.body = body
+        self.xml = xml
+        self._cells = None
+
+    @property
+    def cells(self):
+        """Column -> (attrs, inner XML or None)."""
+        if self._cells is None:
+            cells = {}
+            for match in _CELL.finditer(self.body or ""):
+                attrs = parse_attrs(match.group(1))
+                column = column_index_from_string(attrs["r"].rstrip("0123456789").lstrip("$"))
+                cells[column] = (attrs, match.group(2))
+            self._cells = cells
+        return self._cells
+
+    @classmethod
+    def parse(cls, attrs_text, body, xml=None):
+        return cls(parse_attrs(attrs_text), body, xml)
+
+
+class XlsxTemplate:
+    """Parsed parts of a template workbook, read once and never modified."""
+
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as archive:
+            self.parts = [(info, archive.read(info.filename)) for info in archive.infolist()]
+        contents = {info.filename: data for info, data in self.parts}
+
+        workbook_path, workbook_rels = self._workbook_parts(contents)
+        workbook = ElementTree.fromstring(contents[workbook_path])
+        sheets = workbook.findall(f"{{{MAIN_NS}}}sheets/{{{MAIN_NS}}}sheet")
+        view = workbook.find(f"{{{MAIN_NS}}}bookViews/{{{MAIN_NS}}}workbookView")
+        active = int(view.get("activeTab", 0)) if view is not None else 0
+        if not sheets or active >= len(sheets):
+            raise UnsupportedTemplate("No worksheet")
+        targets = self._relationships(contents, workbook_path)
+        self.sheet_path = targets[sheets[active].get(f"{{{REL_NS}}}id")][1]
+        by_type = {rel_type: target for rel_type, target in targets.values()}
+        self.shared_strings_path = by_type.get(SHARED_STRINGS_REL)
+        self.styles_path = by_type.get(STYLES_REL)
+        self.calc_chain_path = by_type.get(CALC_CHAIN_REL)
+        self.workbook_rels_path = workbook_rels
+
+        self._parse_sheet(contents[self.sheet_path].decode("utf-8"))
+        self._parse_styles(contents[self.styles_path].decode("utf-8") if self.styles_path else None)
+        self._parse_shared_strings(contents.get(self.shared_strings_path))
+
+    @staticmethod
+    def _workbook_parts(contents):
+        rels = ElementTree.fromstring(contents["_rels/.rels"])
+        for rel in rels:
+            if rel.get("Type") == REL_NS + "/officeDocument":
+                workbook_path = rel.get("Target").lstrip("/")
+                folder, name = posixpath.split(workbook_path)
+                return workbook_path, posixpath.join(folder, "_rels", name + ".rels")
+        raise UnsupportedTemplate("No workbook part")
+
+    @staticmethod
+    def _relationships(contents, part_path):
+        """Relationship id -> (type, absolute part path) of ``part_path``."""
+        folder, name = posixpath.split(part_path)
+        rels = ElementTree.fromstring(contents[posixpath.join(folder, "_rels", name + ".rels")])
+        targets = {}
+        for rel in rels.iter(f"{{{PACKAGE_REL_NS}}}Relationship"):
+            target = rel.get("Target")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+            targets[rel.get("Id")] = (rel.get("Type"), path)
+        return targets
+
+    def _parse_sheet(self, xml):
+        if not re.match(r"(<\?xml[^>]*>\s*)?<worksheet\b", xml):
+            raise UnsupportedTemplate("Worksheet elements use a namespace prefix")
+        data = _SHEET_DATA.search(xml)
+        if data is None:
+            raise UnsupportedTemplate("No sheetData")
+        self.sheet_head = xml[:data.start()]
+        tail = xml[data.end():]
+
+        sheet_data = data.group(1) or ""
+        if _CELL_WITHOUT_REF.search(sheet_data):
+            raise UnsupportedTemplate("Cell without a reference")
+        if 't="shared"' in sheet_data:
+            raise UnsupportedTemplate("Shared formulas")
+        self.rows = {}
+        for match in _ROW.finditer(sheet_data):
+            row = TemplateRow.parse(match.group(1), match.group(2), match.group(0))
+            if "r" not in row.attrs:
+                raise UnsupportedTemplate("Row without a number")
+            self.rows[int(row.attrs["r"])] = row
+        merges = _MERGE_CELLS.search(tail)
+        self.merges = re.findall(r'<mergeCell\b[^>]*\bref="([^"]+)"', merges.group(1) or "") if merges else []
+
+        # Merged ranges count as used cells, as they do in openpyxl
+        bounds = [range_boundaries(ref) for ref in self.merges]
+        self.max_row = max([0] + list(self.rows) + [bound[3] for bound in bounds])
+        cell_columns = {column_index_from_string(letters) for letters in set(_CELL_COLUMN.findall(sheet_data))}
+        self.max_column = max([0] + list(cell_columns) + [bound[2] for bound in bounds])
+        # Merges go back where the template had them, or right after sheetData
+        if merges:
+            self.sheet_tail = (tail[:merges.start()], tail[merges.end():])
+        else:
+            self.sheet_tail = ("", tail)
+
+    def _parse_styles(self, xml):
+        self.styles_xml = xml
+        self.xfs = []
+        self.num_fmts = {}
+        if xml is None:
+            return
+        xfs = _CELL_XFS.search(xml)
+        if xfs is None:
+            raise UnsupportedTemplate("No cellXfs")
+        self.xfs = _XF.findall(xfs.group(2))
+        num_fmts = _NUM_FMTS.search(xml)
+        if num_fmts:
+            for match in _NUM_FMT.finditer(num_fmts.group(1) or ""):
+                attrs = parse_attrs(match.group(1))
+                self.num_fmts[attrs["formatCode"]] = int(attrs["numFmtId"])
+
+    def _parse_shared_strings(self, data):
+        self.sst_xml = data.decode("utf-8") if data is not None else None
+        self.sst_unique = len(re.findall(r"<si\b", self.sst_xml)) if data is not None else 0
+        count = re.search(r'<sst\b[^>]*\bcount="(\d+)"', self.sst_xml) if data is not None else None
+        self.sst_count = int(count.group(1)) if count else self.sst_unique
+
+    @property
+    def shared_strings(self):
+        """Texts of the shared string table, parsed on first use."""
+        strings = getattr(self, "_shared_strings", None)
+        if strings is None:
+            strings = self._shared_strings = [_text_runs(si) for si in _SI.findall(self.sst_xml or "")]
+        return strings
+
+    def cell_value(self, attrs, inner):
+        """Value of a parsed cell: str, bool, Decimal for numbers, or None.
+
+        Formula cells give their cached result.
+        """
+        kind = attrs.get("t", "n")
+        if kind == "inlineStr":
+            return _text_runs(inner)
+        value = _V.search(inner or "")
+        if value is None:
+            return None
+        text = html.unescape(value.group(1))
+        if kind == "s":
+            return self.shared_strings[int(text)]
+        if kind == "b":
+            return text == "1"
+        if kind in ("str", "e"):
+            return text
+        return Decimal(text)
+
+    def number_format(self, style):
+        """Number format code of cell format ``style``."""
+        formats = getattr(self, "_number_formats", None)
+        if formats is None:
+            formats = self._number_formats = {}
+        fmt = formats.get(style)
+        if fmt is None:
+            xf = self.xfs[style] if style < len(self.xfs) else ""
+            fmt_id = re.search(r'\bnumFmtId="(\d+)"', xf)
+            fmt_id = int(fmt_id.group(1)) if fmt_id else 0
+            codes = {custom_id: html.unescape(code) for code, custom_id in self.num_fmts.items()}
+            fmt = formats[style] = codes.get(fmt_id) or BUILTIN_FORMATS.get(fmt_id, "General")
+        return fmt
+
+    def extends_styles(self, template):
+        """True if this workbook's cell formats are ``template``'s plus added ones.
+
+        That is how ``SheetPatch`` writes them, so the template's style ids
+        mean the same here. A workbook saved again by another program
+        usually renumbers them.
+        """
+        if self.styles_xml is None or template.styles_xml is None:
+            return self.styles_xml == template.styles_xml
+
+        def rest(xml):
+            return _NUM_FMTS.sub("", _CELL_XFS.sub("", xml, count=1), count=1)
+
+        return (self.xfs[:len(template.xfs)] == template.xfs
+                and all(self.num_fmts.get(code) == fmt_id for code, fmt_id in template.num_fmts.items())
+                and rest(self.styles_xml) == rest(template.styles_xml))
+
+    def cell_style(self, row, column):
+        """Style index of a template cell; 0 where the cell does not exist."""
+        cell = self.rows.get(row)
+        cell = cell.cells.get(column) if cell else None
+        return int(cell[0].get("s", 0)) if cell else 0
+
+
+class SheetPatch:
+    """One output workbook built from an ``XlsxTemplate``.
+
+    Collects the shared strings and number-format styles the new cells need
+    while rows are produced, then writes them with the sheet.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.strings = {}
+        self.string_refs = 0
+        self.xfs = []  # added cell formats
+        self.num_fmts = {}  # added number formats: code -> id
+        self._formatted = {}
+        self._next_fmt_id = max([BUILTIN_FORMATS_MAX_SIZE - 1] + list(template.num_fmts.values())) + 1
+
+    def cell(self, ref, style, value):
+        """``<c>`` element for a new cell value."""
+        attrs = f' r="{ref}" s="{style}"' if style else f' r="{ref}"'
+        if value is None or value == "":
+            return f"<c{attrs}/>"
+        if isinstance(value, bool):
+            return f'<c{attrs} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float, Decimal)):
+            return f'<c{attrs} t="n"><v>{number_text(value)}</v></c>'
+        text = _ILLEGAL_CHARS.sub("", str(value))
+        if self.template.sst_xml is None:
+            space = ' xml:space="preserve"' if text != text.strip() else ""
+            return f'<c{attrs} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+        self.string_refs += 1
+        index = self.strings.get(text)
+        if index is None:
+            index = self.strings[text] = self.template.sst_unique + len(self.strings)
+        return f'<c{attrs} t="s"><v>{index}</v></c>'
+
+    def formatted(self, style, fmt):
+        """Index of cell format ``style`` with number format ``fmt``."""
+        key = (style, fmt)
+        index = self._formatted.get(key)
+        if index is not None:
+            return index
+        fmt_id = BUILTIN_FORMATS_REVERSE.get(fmt)
+        if fmt_id is None:
+            fmt_id = self.template.num_fmts.get(escape(fmt, {'"': "&quot;"})) or self.num_fmts.get(fmt)
+        if fmt_id is None:
+            fmt_id = self.num_fmts[fmt] = self._next_fmt_id
+            self._next_fmt_id += 1
+        xf = self.template.xfs[style] if style < len(self.template.xfs) else '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        current = re.search(r'\bnumFmtId="(\d+)"', xf)
+        if current and int(current.group(1)) == fmt_id:
+            index = style
+        else:
+            start = re.match(r"<xf\b[^>]*?(?=/?>)", xf).group(0)
+            attrs = parse_attrs(start)
+            attrs["numFmtId"] = str(fmt_id)
+            attrs["applyNumberFormat"] = "1"
+            index = len(self.template.xfs) + len(self.xfs)
+            self.xfs.append("<xf" + format_attrs(attrs) + xf[len(start):])
+        self._formatted[key] = index
+        return index
+
+    def save(self, out_path, rows, merges, last_row):
+        """Write the workbook; ``rows`` yields row XML in row order.
+
+        The calculation chain is left out (Excel rebuilds it), as its cell
+        references would be stale once the footer moves.
+        """
+        t = self.template
+        infos = {info.filename: info for info, _ in t.parts}
+        rewritten = {t.sheet_path, t.shared_strings_path, t.styles_path, t.calc_chain_path}
+        with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as out:
+            for info, data in t.parts:
+                if info.filename in rewritten:
+                    continue
+                # writestr fills in sizes and offsets; keep the template's infos clean
+                info = copy.copy(info)
+                if t.calc_chain_path and info.filename == "[Content_Types].xml":
+                    data = re.sub(rb'<Override\b[^>]*PartName="/' + re.escape(t.calc_chain_path.encode()) + rb'"[^>]*/>', b"", data)
+                elif t.calc_chain_path and info.filename == t.workbook_rels_path:
+                    data = re.sub(rb'<Relationship\b[^>]*Type="' + re.escape(CALC_CHAIN_REL.encode()) + rb'"[^>]*/>', b"", data)
+                out.writestr(info, data)
+
+            with out.open(copy.copy(infos[t.sheet_path]), "w") as sheet:
+                head = t.sheet_head
+                if t.max_column:
+                    head = _DIMENSION.sub(lambda m: f"{m.group(1)}A1:{get_column_letter(t.max_column)}{last_row}{m.group(3)}", head)
+                sheet.write(head.encode("utf-8") + b"<sheetData>")
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= 256:
+                        sheet.write("".join(batch).encode("utf-8"))
+                        batch = []
+                sheet.write(("".join(batch) + "</sheetData>").encode("utf-8"))
+                before, after = t.sheet_tail
+                merge_xml = ""
+                if merges:
+                    merge_xml = f'<mergeCells count="{len(merges)}">' + "".join(f'<mergeCell ref="{ref}"/>' for ref in merges) + "</mergeCells>"
+                sheet.write((before + merge_xml + after).encode("utf-8"))
+
+            if t.styles_path:
+                out.writestr(copy.copy(infos[t.styles_path]), self._styles_xml())
+            if t.shared_strings_path:
+                out.writestr(copy.copy(infos[t.shared_strings_path]), self._shared_strings_xml())
+
+    def _styles_xml(self):
+        xml = self.template.styles_xml
+        if self.xfs:
+            count = len(self.template.xfs) + len(self.xfs)
+            xml = _CELL_XFS.sub(lambda m: re.sub(r'\bcount="\d+"', f'count="{count}"', m.group(1)) + m.group(2) + "".join(self.xfs) + m.group(3), xml, count=1)
+        if self.num_fmts:
+            added = "".join(f'<numFmt numFmtId="{fmt_id}" formatCode="{escape(code, {chr(34): "&quot;"})}"/>' for code, fmt_id in self.num_fmts.items())
+            existing = _NUM_FMTS.search(xml)
+            if existing:
+                body = (existing.group(1) or "") + added
+                count = len(self.template.num_fmts) + len(self.num_fmts)
+                xml = xml[:existing.start()] + f'<numFmts count="{count}">{body}</numFmts>' + xml[existing.end():]
+            else:
+                at = xml.index("<fonts")
+                xml = xml[:at] + f'<numFmts count="{len(self.num_fmts)}">{added}</numFmts>' + xml[at:]
+        return xml.encode("utf-8")
+
+    def _shared_strings_xml(self):
+        xml = self.template.sst_xml
+        if not self.strings:
+            return xml.encode("utf-8")
+        added = []
+        for text in self.strings:
+            space = ' xml:space="preserve"' if text != text.strip() else ""
+            added.append(f"<si><t{space}>{escape(text)}</t></si>")
+        unique = self.template.sst_unique + len(self.strings)
+        count = self.template.sst_count + self.string_refs
+
+        def counts(start):
+            start = re.sub(r'\s(?:count|uniqueCount)="\d+"', "", start)
+            return start[:-1] + f' count="{count}" uniqueCount="{unique}">'
+
+        empty = _SST_EMPTY.search(xml)
+        if empty:
+            start = empty.group(0)[:-2] + ">"
+            return (xml[:empty.start()] + counts(start) + "".join(added) + "</sst>" + xml[empty.end():]).encode("utf-8")
+        match = _SST.search(xml)
+        return (xml[:match.start()] + counts(match.group(1)) + match.group(2) + "".join(added) + match.group(3) + xml[match.end():]).encode("utf-8")
@@ -2,14 +2,24 @@ from typing import ValuesView
 import fitz
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, colorchooser
+import tkinter.font as tkfont
 from PIL import Image, ImageTk
-from openpyxl import load_workbook
-from openpyxl.utils import range_boundaries
 from datetime import datetime
-import shutil
-from copy import copy
 import sys, os
+import multiprocessing
+import time
 import json
+import numpy as np
+from fairy_store import BalloonStore, rotate_points
+from fairy_history import History
+from fairy_pdf import export_ballooned_pdf_file, export_pages, SAVE_PROFILES, DEFAULT_SAVE_PROFILE
+from fairy_jobs import BackgroundJob
+from fairy_labels import label_origin
+from fairy_raster import export_raster, DEFAULT_RASTER_DPI
+from fairy_profiles import load_report_profiles
+from fairy_mes import DATA_FIELDS, data_file_format, export_balloon_data
+from fairy_numeric import parse_value, format_value, to_json_value
+from decimal import Decimal
 
 DEFAULT_BALLOON_COLOR = "#ff0000"
 HIGHLIGHT_FILL_COLOR = "SkyBlue"
@@ -27,14 +37,6 @@ def normalize_balloon_color(value, fallback=None):
     return normalize_balloon_color(fallback, DEFAULT_BALLOON_COLOR) if fallback != DEFAULT_BALLOON_COLOR else DEFAULT_BALLOON_COLOR
 
 
-def hex_to_fitz_rgb(value):
-    color_hex = normalize_balloon_color(value)
-    return (
-        int(color_hex[1:3], 16) / 255.0,
-        int(color_hex[3:5], 16) / 255.0,
-        int(color_hex[5:7], 16) / 255.0,
-    )
-
 #================resolves path of files to be used with pyinstaller
 def resource_path(relative_path):
     try:
@@ -51,21 +53,6 @@ def apply_icon(window):
     except:
         pass
 
-# ================ handle data types ===================
-def to_number(value):
-    value = value.strip()
-    try:
-        return int(value) if value.isdigit() else float(value)
-    except ValueError:
-        return value
-
-def to_number_list_item(value):
-    if isinstance(value, (int, float)):
-        return value
-    try:
-        return int(value) if value.isdigit() else float(value)
-    except ValueError:
-        return 0
 
 
 
@@ -76,12 +63,16 @@ doc = None
 num_pages = 0
 current_page_index = 0
 current_page = None  # set after a PDF is opened via open_pdf()
-TEMPLATE_XLSX = resource_path("FORMAT_WORBYN_2.xlsx")
+# Customer report profiles (template, layout, columns, headers; see
+# fairy_profiles). This build starts with DEFAULT_REPORT_PROFILE and can be
+# switched to any other from the toolbar.
+REPORT_PROFILES = load_report_profiles(resource_path)
+DEFAULT_REPORT_PROFILE = "worbyn"
+report_profile = REPORT_PROFILES[DEFAULT_REPORT_PROFILE]
 
 # ================= STATE =================
 zoom = 1.5
-balloon_no = 1
-balloons = []
+balloons = BalloonStore()  # columnar store; iterates like the old list of dicts
 last_balloon_cache = {"zone": "", "char": "", "req": "", "neg": "", "pos": "", "equip": ""}
 current_project_path = None
 project_dirty = False
@@ -100,45 +91,42 @@ two_point_mode = False
 pending_start = None
 selected_balloon_color = DEFAULT_BALLOON_COLOR
 
-# WORBYN report headers (matches FORMAT_WORBYN_2.xlsx layout from image)
-HEADER_KEYS = (
-    "fair_number",
-    "drawing_number",
-    "drawing_rev_no",
-    "customer_name",
-    "part_number",
-    "part_name",
-    "material_spec",
-    "mtc_no",
-    "batch_heat_no",
-    "inspection_date",
-)
-
-HEADER_CELL_MAP = {
-    "fair_number": "D4",
-    "drawing_number": "D5",
-    "drawing_rev_no": "D6",
-    "customer_name": "D7",
-    "part_number": "I4",
-    "part_name": "I5",
-    "material_spec": "M4",
-    "mtc_no": "M5",
-    "batch_heat_no": "M6",
-    "inspection_date": "M7",
+# Undo/redo: each entry holds only the changed values, so memory grows with
+# the limit rather than with project size.
+UNDO_HISTORY_LIMIT = 200
+history = History(UNDO_HISTORY_LIMIT)
+
+# Background PDF export; the project is read-only while it runs
+EXPORT_POLL_MS = 100
+export_job = None
+# Background report/data export; it works on a snapshot, so editing goes on
+snapshot_job = None
+
+# Output profiles offered when saving the ballooned PDF (see fairy_pdf.SAVE_PROFILES)
+PDF_SAVE_PROFILE_LABELS = {
+    "fast": "Fast - write as-is (largest file)",
+    "balanced": "Balanced - drop unused objects, compress streams",
+    "smallest": "Smallest - also merge duplicates and pack objects (slowest)",
 }
 
+# Page selections offered when saving the ballooned PDF (see fairy_pdf.export_pages)
+PDF_PAGE_SELECTION_LABELS = {
+    "all": "All pages",
+    "annotated": "Pages with balloons only",
+    "current": "Current page",
+    "range": "Pages:",
+}
+
+# Resolutions offered for image export
+RASTER_DPI_CHOICES = (100, 150, 200, 300)
+BALLOON_EDIT_FIELDS = ("zone", "char", "req", "neg", "pos", "equip")
 
 def default_headers():
-    return {key: "" for key in HEADER_KEYS}
+    return report_profile.default_headers()
 
 
 def normalize_headers(headers):
-    normalized = default_headers()
-    if isinstance(headers, dict):
-        for key in HEADER_KEYS:
-            val = headers.get(key, "")
-            normalized[key] = "" if val is None else str(val).strip()
-    return normalized
+    return report_profile.normalize_headers(headers)
 
 
 project_headers = default_headers()
@@ -192,6 +180,17 @@ def render_pdf():
     canvas.create_image(offset_x, offset_y, anchor="nw",
                         image=rendered_img, tags="pdf")
 
+label_fonts = {}  # pixel size -> (canvas font, descent in pixels)
+
+
+def label_font(size_px):
+    """Canvas font for balloon labels at ``size_px`` pixels, with its descent."""
+    if size_px not in label_fonts:
+        font = tkfont.Font(family="Arial", size=-size_px)
+        label_fonts[size_px] = (font, font.metrics("descent"))
+    return label_fonts[size_px]
+
+
 def render_overlays():
     canvas.delete("overlay")
     page = doc[current_page_index]
@@ -215,21 +214,27 @@ def render_overlays():
             tags="overlay"
         )
 
-    for b in balloons:
-        if b["page"] != current_page_index:
-            continue
-
-        x, y = rotate_coords(b["x"], b["y"], w, h, effective_rotation)
-        x = x * zoom + offset_x
-        y = y * zoom + offset_y
-        r = b["r"] * zoom
+    # Transform every balloon on the page to canvas space in one pass
+    slots = balloons.page_slots(current_page_index)
+    xs, ys = rotate_points(balloons.column("x", slots), balloons.column("y", slots), w, h, effective_rotation)
+    start_xs, start_ys = rotate_points(
+        balloons.column("start_x", slots), balloons.column("start_y", slots), w, h, effective_rotation
+    )
+    xs = xs * zoom + offset_x
+    ys = ys * zoom + offset_y
+    start_xs = start_xs * zoom + offset_x
+    start_ys = start_ys * zoom + offset_y
+    rs = balloons.column("r", slots) * zoom
+    numbers = balloons.numbers(slots)
+    has_connector = ~(np.isnan(start_xs) | np.isnan(start_ys))
+
+    for i, b in enumerate(balloons.records(slots)):
+        x, y, r = xs[i], ys[i], rs[i]
         balloon_color = normalize_balloon_color(b.get("color"))
 
         # Draw connector if this balloon was placed via two-point mode
-        if b.get("start_x") is not None and b.get("start_y") is not None:
-            sx, sy = rotate_coords(b["start_x"], b["start_y"], w, h, effective_rotation)
-            sx = sx * zoom + offset_x
-            sy = sy * zoom + offset_y
+        if has_connector[i]:
+            sx, sy = start_xs[i], start_ys[i]
             line_width = max(2, r / 10)
             dx = x - sx
             dy = y - sy
@@ -272,10 +277,17 @@ def render_overlays():
             tags="overlay"
         )
 
+        # Same metrics as the PDF export: centred by glyph advances, baseline
+        # below the centre; Tk anchors text by the bottom of its descent.
+        text = str(numbers[i])
+        size_px = max(1, int(round(r)))
+        font, descent = label_font(size_px)
+        tx, ty = label_origin(x, y, text, size_px)
         canvas.create_text(
-            x, y,
-            text=str(b["no"]),
-            font=("Arial", int(r)),
+            tx, ty + descent,
+            text=text,
+            font=font,
+            anchor="sw",
             fill=outline,
             tags="overlay"
         )
@@ -295,10 +307,13 @@ def render(force=False):
 
 
 def open_pdf():
-    global PDF_IN, doc, num_pages, current_page_index, balloons, balloon_no
+    global PDF_IN, doc, num_pages, current_page_index, balloons
     global offset_x, offset_y, page_cache, pending_start, project_dirty, current_project_path
     global project_headers, headers_dirty, rotation
 
+    if export_running():
+        return
+
     path = filedialog.askopenfilename(
         title="Select PDF",
         filetypes=[("PDF files", "*.pdf")]
@@ -315,7 +330,7 @@ def open_pdf():
     num_pages = len(doc)
     current_page_index = 0
     balloons.clear()
-    balloon_no = 1
+    history.clear()
     offset_x = offset_y = 0
     page_cache.clear()
     pending_start = None
@@ -338,7 +353,7 @@ def open_pdf():
 # =====================================================
 def safe_insert(entry, value):
     """Ensure values are stored safely in string form only."""
-    entry.insert(0, "" if value is None else str(value))
+    entry.insert(0, format_value(value))
 
 
 def requirement_popup(existing=None):
@@ -593,9 +608,10 @@ def requirement_popup(existing=None):
         req_val_raw = get_value(req)
         neg_val_raw = get_value(neg)
         pos_val_raw = get_value(pos)
-        req_val = to_number(req_val_raw)
-        neg_val = to_number(neg_val_raw)
-        pos_val = to_number(pos_val_raw)
+        # Parse once here; the store keeps the Decimal and derives the limits
+        req_val = parse_value(req_val_raw)
+        neg_val = parse_value(neg_val_raw)
+        pos_val = parse_value(pos_val_raw)
 
         if not req_val_raw:
             messagebox.showwarning("Missing", "Requirement is mandatory")
@@ -683,9 +699,11 @@ def headers_popup():
     if not doc:
         messagebox.showwarning("No File", "Open file to work on")
         return
+    if export_running():
+        return
 
     popup = tk.Toplevel(root)
-    popup.title("Headers")
+    popup.title(f"Headers - {report_profile.name}")
     apply_icon(popup)
     popup.transient(root)
     popup.grab_set()
@@ -694,45 +712,56 @@ def headers_popup():
     popup.columnconfigure(3, weight=1)
 
     values = normalize_headers(project_headers)
-    if not values["inspection_date"]:
-        values["inspection_date"] = datetime.now().strftime("%d/%m/%Y")
+    date_key = report_profile.date_key
+    if date_key and not values[date_key]:
+        values[date_key] = datetime.now().strftime(report_profile.date_format)
 
     entries = {}
-    layout = [
-        ("FAIR Number", "fair_number", "Part Number", "part_number"),
-        ("Drawing Number", "drawing_number", "Part Name", "part_name"),
-        ("Drawing Rev No", "drawing_rev_no", "Material Spec", "material_spec"),
-        ("Customer Name", "customer_name", "MTC No", "mtc_no"),
-        ("Batch/Heat No", "batch_heat_no", "Inspection Date", "inspection_date"),
-    ]
 
+    def integer_validate(new_value):
+        return new_value == "" or new_value.isdigit()
+
+    vcmd_int = (popup.register(integer_validate), "%P")
+
+    # Each profile row is a left and a right label/entry pair
     row_idx = 0
-    for left_label, left_key, right_label, right_key in layout:
-        tk.Label(popup, text=left_label).grid(row=row_idx, column=0, padx=(10, 6), pady=6, sticky="e")
-        left_entry = tk.Entry(popup, width=24)
-        safe_insert(left_entry, values.get(left_key, ""))
-        left_entry.grid(row=row_idx, column=1, padx=(0, 16), pady=6, sticky="we")
-        entries[left_key] = left_entry
-
-        tk.Label(popup, text=right_label).grid(row=row_idx, column=2, padx=(0, 6), pady=6, sticky="e")
-        right_entry = tk.Entry(popup, width=24)
-        safe_insert(right_entry, values.get(right_key, ""))
-        right_entry.grid(row=row_idx, column=3, padx=(0, 10), pady=6, sticky="we")
-        entries[right_key] = right_entry
+    for row in report_profile.header_rows:
+        for side, (label, key) in enumerate(row):
+            tk.Label(popup, text=label).grid(
+                row=row_idx, column=side * 2, padx=(0 if side else 10, 6), pady=6, sticky="e"
+            )
+            if key in report_profile.integer_keys:
+                entry = tk.Entry(popup, width=24, validate="key", validatecommand=vcmd_int)
+            else:
+                entry = tk.Entry(popup, width=24)
+            safe_insert(entry, values.get(key, ""))
+            entry.grid(row=row_idx, column=side * 2 + 1, padx=(0, 10 if side else 16), pady=6, sticky="we")
+            entries[key] = entry
         row_idx += 1
 
-    order = [
-        "fair_number", "part_number", "drawing_number", "part_name",
-        "drawing_rev_no", "material_spec", "customer_name", "mtc_no",
-        "batch_heat_no", "inspection_date",
-    ]
+    order = report_profile.header_order
 
     def close_without_save():
         popup.destroy()
 
     def save_headers():
-        for key in HEADER_KEYS:
+        for key in order:
+            value = entries[key].get().strip()
+            if key in report_profile.integer_keys and value and not value.isdigit():
+                messagebox.showwarning("Invalid Value", f"{report_profile.header_labels[key]} must be numeric")
+                entries[key].focus_set()
+                return
+
+        before = dict(project_headers)
+        for key in report_profile.header_keys:
             project_headers[key] = entries[key].get().strip()
+        after = dict(project_headers)
+        if after != before:
+            history.record(
+                "edit headers",
+                undo=lambda: set_headers(before),
+                redo=lambda: set_headers(after),
+            )
         global project_dirty, headers_dirty
         project_dirty = True
         headers_dirty = True
@@ -753,11 +782,41 @@ def headers_popup():
         row=row_idx, column=3, padx=(0, 10), pady=(8, 10), sticky="e"
     )
 
-    entries["fair_number"].focus_set()
-    popup.after(50, lambda: entries["fair_number"].select_range(0, tk.END))
+    entries[order[0]].focus_set()
+    popup.after(50, lambda: entries[order[0]].select_range(0, tk.END))
     popup.wait_window()
 
 
+def set_headers(values):
+    global headers_dirty
+    project_headers.update(values)
+    headers_dirty = True
+
+def set_report_profile(key):
+    """Switch the report profile (template, columns and headers) without a restart.
+
+    Header values carry over where the new profile uses the same keys; the
+    others are kept too, so switching back restores them.
+    """
+    global report_profile, project_headers, project_dirty, headers_dirty
+    profile = REPORT_PROFILES.get(key)
+    if profile is None or profile is report_profile:
+        return
+    if export_running():
+        report_profile_var.set(report_profile.name)
+        return
+    report_profile = profile
+    project_headers = {**project_headers, **normalize_headers(project_headers)}
+    report_profile.prepare()
+    if doc:
+        project_dirty = True
+        headers_dirty = True
+    report_profile_var.set(report_profile.name)
+    list_view_state["page"] = None  # limit column labels changed
+    update_balloon_list()
+
+
+
 def confirm_missing_headers():
     result = {"continue": True}
 
@@ -809,6 +868,8 @@ def toggle_two_point_mode():
     if not doc:
         messagebox.showwarning("No File", "No file to apply setting")
         return
+    if export_running():
+        return
 
     global two_point_mode
     two_point_mode = not two_point_mode
@@ -820,8 +881,10 @@ def add_balloon(event):
     if not doc:
         messagebox.showwarning("No File", "Open file to work on")
         return
+    if export_running():
+        return
 
-    global balloon_no, pending_start
+    global pending_start
 
     display_x = (event.x - offset_x) / zoom
     display_y = (event.y - offset_y) / zoom
@@ -847,7 +910,6 @@ def add_balloon(event):
 
     balloons.append({
         "page": current_page_index,
-        "no": balloon_no,
         "x": pdf_x,
         "y": pdf_y,
         "r": balloon_radius_slider.get(),
@@ -876,7 +938,7 @@ def add_balloon(event):
         balloons[-1]["neg"]  = data["neg"]
         balloons[-1]["pos"]  = data["pos"]
         balloons[-1]["equip"]  = data["equip"]
-        balloon_no += 1
+        record_balloon_added(balloons[-1])
         
         # Mark project as dirty
         global project_dirty
@@ -895,14 +957,12 @@ def add_balloon(event):
 # DELETE balloon 
 # =====================================================
 def delete_balloon(balloon):
+    # Numbers follow list order, so later balloons renumber without being touched
+    index = balloons.index(balloon)
     balloons.remove(balloon)
+    record_balloon_deleted(balloon, index)
 
-    # renumber globally
-    for i, b in enumerate(balloons, start=1):
-        b["no"] = i
-
-    global balloon_no, project_dirty
-    balloon_no = len(balloons) + 1
+    global project_dirty
     project_dirty = True
 
     update_balloon_list()
@@ -927,18 +987,22 @@ def highlight_balloon(balloon, duration=2000):
 # EDIT balloon (from list)
 # =====================================================
 def on_balloon_edit(balloon):
+    if export_running():
+        return
 
     highlight_balloon(balloon)
 
     result = requirement_popup(existing=balloon)
 
     if result["action"] == "save":
+        before = {key: balloon[key] for key in BALLOON_EDIT_FIELDS}
         balloon["zone"] = result["zone"]
         balloon["char"] = result["char"]
         balloon["req"]  = result["req"]
         balloon["neg"]  = result["neg"]
         balloon["pos"]  = result["pos"]
         balloon["equip"]  = result["equip"]
+        record_balloon_edited(balloon, before, {key: balloon[key] for key in BALLOON_EDIT_FIELDS})
         
         # Mark project as dirty
         global project_dirty
@@ -962,7 +1026,7 @@ def on_balloon_edit_mouse(event):
     lb.selection_set(idx)
     lb.activate(idx)
 
-    page_balloons = [b for b in balloons if b["page"] == current_page_index]
+    page_balloons = balloons.on_page(current_page_index)
     balloon_idx = idx - 2
 
     if balloon_idx >= len(page_balloons):
@@ -982,7 +1046,7 @@ def on_balloon_edit_key(event):
     if idx < 2:
         return
 
-    page_balloons = [b for b in balloons if b["page"] == current_page_index]
+    page_balloons = balloons.on_page(current_page_index)
     balloon_idx = idx - 2
 
     if balloon_idx >= len(page_balloons):
@@ -992,6 +1056,8 @@ def on_balloon_edit_key(event):
 
 
 def on_balloon_delete_key(event):
+    if export_running():
+        return
     lb = event.widget
     sel = lb.curselection()
 
@@ -1002,7 +1068,7 @@ def on_balloon_delete_key(event):
     if idx < 2:
         return
 
-    page_balloons = [b for b in balloons if b["page"] == current_page_index]
+    page_balloons = balloons.on_page(current_page_index)
     balloon_idx = idx - 2
 
     if balloon_idx >= len(page_balloons):
@@ -1098,24 +1164,35 @@ def end_pan(event):
 # rotating the page
 # =====================================================
 
-def rotate_left():
-    if not doc:
-        return
-    global rotation, project_dirty
-    rotation = (rotation - 90) % 360
-    project_dirty = True
+def set_rotation(value):
+    global rotation
+    rotation = value
     clear_pending_start()
-    render(force=True)
 
-def rotate_right():
+
+def rotate_view(delta):
     if not doc:
         return
-    global rotation, project_dirty
-    rotation = (rotation + 90) % 360
+    if export_running():
+        return
+    global project_dirty
+    old_rotation = rotation
+    new_rotation = (rotation + delta) % 360
+    set_rotation(new_rotation)
+    history.record(
+        "rotate page",
+        undo=lambda: set_rotation(old_rotation),
+        redo=lambda: set_rotation(new_rotation),
+    )
     project_dirty = True
-    clear_pending_start()
     render(force=True)
 
+def rotate_left():
+    rotate_view(-90)
+
+def rotate_right():
+    rotate_view(90)
+
 # =====================================================
 # PAGE NAV / UNDO
 # =====================================================
@@ -1135,15 +1212,66 @@ def prev_page():
         clear_pending_start()
         render()
 
+def show_page(page_index):
+    global current_page_index, offset_x, offset_y
+    if page_index != current_page_index:
+        current_page_index = page_index
+        offset_x = offset_y = 0
+        clear_pending_start()
+
+
+# =====================================================
+# UNDO / REDO (command history)
+# =====================================================
+def _on_balloon_page(balloon, action):
+    """Wrap a balloon command so undo/redo also shows the balloon's page."""
+    def run():
+        action()
+        show_page(balloon["page"])
+    return run
+
+
+def record_balloon_added(balloon):
+    index = balloons.index(balloon)
+    history.record(
+        "add balloon",
+        undo=_on_balloon_page(balloon, lambda: balloons.remove(balloon)),
+        redo=_on_balloon_page(balloon, lambda: balloons.restore(index, balloon)),
+    )
+
+
+def record_balloon_deleted(balloon, index):
+    history.record(
+        "delete balloon",
+        undo=_on_balloon_page(balloon, lambda: balloons.restore(index, balloon)),
+        redo=_on_balloon_page(balloon, lambda: balloons.remove(balloon)),
+    )
+
+
+def record_balloon_edited(balloon, before, after):
+    if before == after:
+        return
+    history.record(
+        "edit balloon",
+        undo=_on_balloon_page(balloon, lambda: balloon.update(before)),
+        redo=_on_balloon_page(balloon, lambda: balloon.update(after)),
+    )
+
+
+def _step_history(step):
+    global project_dirty
+    if not doc or export_running() or step() is None:
+        return
+    project_dirty = True
+    render(force=True)
+
+
 def undo():
-    global balloon_no, project_dirty
-    for i in reversed(range(len(balloons))):
-        if balloons[i]["page"] == current_page_index:
-            balloons.pop(i)
-            balloon_no -= 1
-            project_dirty = True
-            break
-    render()
+    _step_history(history.undo)
+
+
+def redo():
+    _step_history(history.redo)
 
 
 # =====================================================
@@ -1170,7 +1298,8 @@ def show_shortcuts():
         ("Escape", "Exit any Popup"),
         ("Ctrl + Q", "Exit Application"),
         ("Ctrl + T", "Toggle balloon Mode"),
-        ("Ctrl + Z", "Undo balloon"),
+        ("Ctrl + Z", "Undo"),
+        ("Ctrl + Y / Ctrl + Shift + Z", "Redo"),
         ("Right-Click x2", "Two-point mode: start then end point"),
         ("Enter", "Edit Selected balloon"),
         ("Delete", "Delete Selected balloon"),
@@ -1197,9 +1326,16 @@ def show_shortcuts():
 # =====================================================
 # LIST VIEW
 # =====================================================
+# Journal position the list view was last drawn at
+list_view_state = {"page": None, "seq": 0}
+
+
 def update_balloon_list():
     # Fixed column widths for neat alignment in the list view
-    w_no, w_zone, w_char, w_req, w_tol, w_equip = 3, 6, 28, 8, 6, 22
+    w_no, w_zone, w_char, w_req, w_tol, w_equip, w_result = 3, 6, 28, 8, 6, 22, 4
+    # Lower/upper limit columns are labelled per report profile
+    w_limit = report_profile.limit_width
+    lower_label, upper_label = report_profile.limit_labels
     header = (
         f"{'No':<{w_no}} | "
         f"{'Zone':<{w_zone}} | "
@@ -1207,30 +1343,54 @@ def update_balloon_list():
         f"{'Req':<{w_req}} | "
         f"{'-Tol':<{w_tol}} | "
         f"{'+Tol':<{w_tol}} | "
-        f"{'Low':<{w_tol}} | "
-        f"{'Up':<{w_tol}} | "
-        f"{'Equip':<{w_equip}}"
+        f"{lower_label:<{w_limit}} | "
+        f"{upper_label:<{w_limit}} | "
+        f"{'Equip':<{w_equip}} | "
+        f"{'Actual':<{w_limit}} | "
+        f"{'Res':<{w_result}}"
     )
     sep = "-" * len(header)
 
+    def format_row(b):
+        return (
+            f"{str(b['no']):<{w_no}} | "
+            f"{str(b['zone']):<{w_zone}} | "
+            f"{str(b['char']):<{w_char}} | "
+            f"{format_value(b['req']):<{w_req}} | "
+            f"{format_value(b['neg']):<{w_tol}} | "
+            f"{format_value(b['pos']):<{w_tol}} | "
+            f"{format_value(b['lower']):<{w_limit}} | "
+            f"{format_value(b['upper']):<{w_limit}} | "
+            f"{str(b['equip']):<{w_equip}} | "
+            f"{format_value(b['measured']):<{w_limit}} | "
+            f"{b['result']:<{w_result}}"
+        )
+
+    # Rewrite only the rows of balloons updated since the list was last drawn;
+    # adds/removes renumber rows, and a page switch needs a full rebuild.
+    changes = None
+    if list_view_state["page"] == current_page_index:
+        changes = balloons.journal.changes_since(list_view_state["seq"])
+    list_view_state["seq"] = balloons.journal.seq
+    list_view_state["page"] = current_page_index
+    if changes is not None and not changes.added and not changes.removed:
+        page_slots = balloons.page_slots(current_page_index)
+        if balloon_listbox.size() - 2 == len(page_slots):
+            ids = balloons.column("id", page_slots)
+            selected = balloon_listbox.curselection()
+            for row in np.flatnonzero(np.isin(ids, list(changes.updated))).tolist():
+                balloon_listbox.delete(row + 2)
+                balloon_listbox.insert(row + 2, format_row(balloons.record(page_slots[row])))
+            for idx in selected:
+                balloon_listbox.selection_set(idx)
+            return
+
     balloon_listbox.delete(0, tk.END)
     balloon_listbox.insert(tk.END, header)
     balloon_listbox.insert(tk.END, sep)
 
-    for b in balloons:
-        if b["page"] == current_page_index:     
-            balloon_listbox.insert(
-                tk.END,
-                f"{str(b['no']):<{w_no}} | "
-                f"{str(b['zone']):<{w_zone}} | "
-                f"{str(b['char']):<{w_char}} | "
-                f"{str(b['req']):<{w_req}} | "
-                f"{str(b['neg']):<{w_tol}} | "
-                f"{str(b['pos']):<{w_tol}} | "
-                f"{str(round(to_number_list_item(b['req']) - to_number_list_item(b['neg']), 2)):<{w_tol}} | "
-                f"{str(round(to_number_list_item(b['req']) + to_number_list_item(b['pos']), 2)):<{w_tol}} | "
-                f"{str(b['equip']):<{w_equip}}"
-            )
+    for b in balloons.on_page(current_page_index):
+        balloon_listbox.insert(tk.END, format_row(b))
 
 # =====================================================
 # SAVE BALLOONED PDF
@@ -1240,6 +1400,9 @@ def save_pdf():
         messagebox.showwarning("No File", "No file to save PDF")
         return
 
+    if export_running():
+        return
+
     if not balloons:
         messagebox.showwarning("No data", "No balloons to export")
         return
@@ -1257,72 +1420,319 @@ def save_pdf():
     if not PDF_OUT:
         return
 
-    out = fitz.open()
-    for i in range(num_pages):
-        src_page = doc[i]
-        effective_rotation = get_effective_rotation(src_page)
-
-        # Copy the source page exactly — content, fonts, resources, and stored
-        # page.rotation all transfer intact. No coordinate transformation needed.
-        out.insert_pdf(doc, from_page=i, to_page=i)
-        p = out[i]
-
-        # Apply any additional user rotation on top of the page's stored rotation.
-        if rotation != 0:
-            p.set_rotation(effective_rotation % 360)
-
-        for b in balloons:
-            if b["page"] != i:
-                continue
-
-            # Balloon coords are stored in raw mediabox space (unrotated) by
-            # add_balloon's inverse_rotate_coords. PyMuPDF's drawing API on an
-            # inserted page also uses raw mediabox coordinates — /Rotate is
-            # ignored for drawing. The /Rotate stored on the page handles the
-            # visual orientation, so draw directly at raw coords: no transform.
-            x, y = b["x"], b["y"]
-            r = b["r"]
-            balloon_rgb = hex_to_fitz_rgb(b.get("color"))
-
-            # Draw connector line if this was a two-point balloon.
-            if b.get("start_x") is not None and b.get("start_y") is not None:
-                sx, sy = b["start_x"], b["start_y"]
-                dx = x - sx
-                dy = y - sy
-                dist = (dx * dx + dy * dy) ** 0.5
-                if dist < 1e-6:
-                    ex, ey = x, y
-                else:
-                    scale = r / dist
-                    ex = x - dx * scale
-                    ey = y - dy * scale
-                p.draw_line(fitz.Point(sx, sy), fitz.Point(ex, ey), color=balloon_rgb, width=r / 10)
-                handle_r = r / 10
-                p.draw_oval(
-                    fitz.Rect(sx - handle_r, sy - handle_r, sx + handle_r, sy + handle_r),
-                    color=balloon_rgb,
-                    fill=balloon_rgb,
-                    width=1,
-                )
+    options = choose_pdf_output()
+    if not options:
+        return
+
+    start_pdf_export(PDF_OUT, *options)
+
+
+def choose_pdf_output():
+    """Ask for the output profile, layer mode and pages; remembers the choice.
 
-            p.draw_oval(fitz.Rect(x - r, y - r, x + r, y + r), color=balloon_rgb, width=r / 10)
-            text = str(b["no"])
-            font_size = r
+    Returns ``(profile, layered, pages)`` with ``pages`` None for the whole
+    document, or None if cancelled.
+    """
+    state = load_app_state()
+    last = state.get("pdf_save_profile", DEFAULT_SAVE_PROFILE)
+    if last not in SAVE_PROFILES:
+        last = DEFAULT_SAVE_PROFILE
+
+    popup = tk.Toplevel(root)
+    popup.title("PDF Output")
+    apply_icon(popup)
+    popup.transient(root)
+    popup.grab_set()
+    popup.resizable(False, False)
+
+    choice = tk.StringVar(value=last)
+    layered = tk.BooleanVar(value=bool(state.get("pdf_balloon_layer", False)))
+    selection = tk.StringVar(value=state.get("pdf_pages", "all"))
+    if selection.get() not in PDF_PAGE_SELECTION_LABELS:
+        selection.set("all")
+    result = {"profile": None, "pages": None}
+
+    tk.Label(popup, text="Save the ballooned PDF as:", padx=12, pady=8).pack(anchor="w")
+    for name in SAVE_PROFILES:
+        tk.Radiobutton(
+            popup,
+            text=PDF_SAVE_PROFILE_LABELS.get(name, name),
+            variable=choice,
+            value=name,
+            padx=12
+        ).pack(anchor="w")
+
+    tk.Label(popup, text="Pages to include:", padx=12, pady=8).pack(anchor="w")
+    page_widgets = []
+    for name, label in PDF_PAGE_SELECTION_LABELS.items():
+        row = tk.Frame(popup, padx=12)
+        row.pack(anchor="w")
+        button = tk.Radiobutton(row, text=label, variable=selection, value=name)
+        button.pack(side="left")
+        page_widgets.append(button)
+    range_entry = tk.Entry(row, width=18)
+    range_entry.insert(0, state.get("pdf_page_range", f"1-{num_pages}"))
+    range_entry.pack(side="left")
+    range_entry.bind("<FocusIn>", lambda e: selection.set("range"))
+    page_widgets.append(range_entry)
+
+    def on_layered():
+        # The layer is added to the whole drawing, so pages cannot be picked
+        for widget in page_widgets:
+            widget.config(state="disabled" if layered.get() else "normal")
+
+    tk.Checkbutton(
+        popup,
+        text="Balloons as a toggleable \"FAIR Balloons\" layer\n"
+             "(whole drawing kept as-is; re-saving to the same file only updates the layer)",
+        variable=layered,
+        command=on_layered,
+        justify="left",
+        padx=12,
+        pady=8
+    ).pack(anchor="w")
+    on_layered()
+
+    def on_ok():
+        if not layered.get():
             try:
-                text_width = fitz.get_text_length(text, fontsize=font_size)
-            except Exception:
-                text_width = font_size * 0.6 * len(text)
-            tx = x - text_width / 2
-            ty = y + font_size * 0.35
-            p.insert_text(fitz.Point(tx, ty), text, fontsize=font_size, color=balloon_rgb)
-    out.save(PDF_OUT)
-    out.close()
-    messagebox.showinfo("Saved", f"Ballooned drawing saved as {PDF_OUT}")
-    try:
-        if messagebox.askyesno("Open file", "Open the saved PDF now?"):
-            os.startfile(PDF_OUT)
-    except Exception:
-        pass
+                result["pages"] = export_pages(
+                    selection.get(),
+                    num_pages,
+                    balloons.snapshot(("page",)),
+                    current=current_page_index,
+                    page_range=range_entry.get()
+                )
+            except ValueError as e:
+                messagebox.showwarning("Invalid Pages", str(e), parent=popup)
+                return
+        result["profile"] = choice.get()
+        popup.destroy()
+
+    btn_row = tk.Frame(popup, padx=12, pady=12)
+    btn_row.pack(fill="x")
+    tk.Button(btn_row, text="Save", width=12, command=on_ok).pack(side="left")
+    tk.Button(btn_row, text="Cancel", width=12, command=popup.destroy).pack(side="right")
+
+    popup.bind("<Return>", lambda e: on_ok())
+    popup.bind("<Escape>", lambda e: popup.destroy())
+    popup.wait_window()
+
+    if not result["profile"]:
+        return None
+    state["pdf_save_profile"] = result["profile"]
+    state["pdf_balloon_layer"] = layered.get()
+    state["pdf_pages"] = selection.get()
+    state["pdf_page_range"] = range_entry.get()
+    save_app_state(state)
+    return result["profile"], layered.get(), result["pages"]
+
+
+def export_running():
+    """True (after telling the user) while a background export is running."""
+    if export_job and export_job.running:
+        messagebox.showinfo(
+            "Export Running",
+            "The project is read-only while an export runs.\n"
+            "Wait for it to finish or cancel it first."
+        )
+        return True
+    return False
+
+
+def _export_pdf_work(job, pdf_path, out_path, snapshot, view_rotation, profile, layered, pages):
+    export_ballooned_pdf_file(
+        pdf_path, out_path, snapshot, view_rotation, job.report, profile=profile, layered=layered, pages=pages
+    )
+    return out_path
+
+
+def start_pdf_export(out_path, profile=DEFAULT_SAVE_PROFILE, layered=False, pages=None):
+    """Export the ballooned PDF in the background."""
+
+    def on_success(result, seconds):
+        size_mb = os.path.getsize(out_path) / (1024 * 1024)
+        messagebox.showinfo(
+            "Saved",
+            f"Ballooned drawing saved as {out_path}\n\n"
+            f"{'Balloon layer' if layered else 'Profile: ' + profile} - {size_mb:.1f} MB in {seconds:.1f} s"
+        )
+        try:
+            if messagebox.askyesno("Open file", "Open the saved PDF now?"):
+                os.startfile(out_path)
+        except Exception:
+            pass
+
+    run_export_job(
+        "Saving PDF", "PDF", on_success,
+        _export_pdf_work, PDF_IN, out_path, balloons.snapshot(), rotation, profile, layered, pages
+    )
+
+
+def run_export_job(title, what, on_success, work, *args, exclusive=True):
+    """Run ``work(job, *args)`` on a worker thread with a progress window.
+
+    The worker gets snapshots and opens its own document handle; this window
+    only polls the job, so navigation stays live. ``on_success(result,
+    seconds)`` runs on the Tk thread once the work completes. An
+    ``exclusive`` job keeps the project read-only (``export_job``); others
+    run as the ``snapshot_job`` while editing goes on.
+    """
+    global export_job, snapshot_job
+
+    job = BackgroundJob(work, *args)
+    started = time.perf_counter()
+
+    win = tk.Toplevel(root)
+    win.title(title)
+    apply_icon(win)
+    win.transient(root)
+    win.resizable(False, False)
+
+    status = tk.Label(win, text="Preparing...", anchor="w", width=45)
+    status.pack(fill="x", padx=12, pady=(12, 4))
+    bar = ttk.Progressbar(win, length=320, mode="determinate")
+    bar.pack(fill="x", padx=12)
+
+    def cancel():
+        job.cancel()
+        cancel_button.config(state="disabled")
+        status.config(text="Cancelling...")
+
+    cancel_button = tk.Button(win, text="Cancel", width=10, command=cancel)
+    cancel_button.pack(pady=12)
+    win.protocol("WM_DELETE_WINDOW", cancel)
+
+    def poll():
+        global export_job, snapshot_job
+        done, total, message = job.progress
+        if total:
+            bar.config(maximum=total, value=done)
+        if message and not job.cancelled:
+            status.config(text=message)
+        if job.running:
+            root.after(EXPORT_POLL_MS, poll)
+            return
+
+        if exclusive:
+            export_job = None
+        else:
+            snapshot_job = None
+        win.destroy()
+        if job.error is not None:
+            messagebox.showerror("Save Failed", f"Could not save {what}:\n{job.error}")
+            return
+        if job.result is None:
+            messagebox.showinfo("Cancelled", f"{what} export cancelled. No file was written.")
+            return
+        on_success(job.result, time.perf_counter() - started)
+
+    if exclusive:
+        export_job = job.start()
+    else:
+        snapshot_job = job.start()
+    root.after(EXPORT_POLL_MS, poll)
+
+
+# =====================================================
+# SAVE IMAGES (PNG / TIFF)
+# =====================================================
+def save_images():
+    if not doc:
+        messagebox.showwarning("No File", "No file to save images")
+        return
+
+    if export_running():
+        return
+
+    if not balloons:
+        messagebox.showwarning("No data", "No balloons to export")
+        return
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    out_path = filedialog.asksaveasfilename(
+        initialfile=f"FAIR_QA_drawing_{timestamp}.png",
+        defaultextension=".png",
+        filetypes=[("PNG images (one per page)", "*.png"), ("Multi-page TIFF", "*.tif *.tiff")],
+        title="Save Ballooned Pages As Images"
+    )
+    if not out_path:
+        return
+
+    image_format = "tiff" if out_path.lower().endswith((".tif", ".tiff")) else "png"
+    options = choose_image_output()
+    if not options:
+        return
+    dpi, annotated_only = options
+
+    def on_success(files, seconds):
+        target = files[0] if image_format == "tiff" else os.path.dirname(out_path)
+        messagebox.showinfo(
+            "Saved",
+            f"{len(files)} image file(s) saved to {target}\n\n{dpi} dpi in {seconds:.1f} s"
+        )
+
+    run_export_job(
+        "Saving Images", "images", on_success,
+        _export_images_work, PDF_IN, out_path, balloons.snapshot(), rotation, dpi, image_format, annotated_only
+    )
+
+
+def _export_images_work(job, pdf_path, out_path, snapshot, view_rotation, dpi, image_format, annotated_only):
+    return export_raster(
+        pdf_path, out_path, snapshot, view_rotation, dpi, image_format,
+        annotated_only=annotated_only, progress=job.report
+    )
+
+
+def choose_image_output():
+    """Ask for resolution and page selection; returns ``(dpi, annotated_only)``."""
+    state = load_app_state()
+
+    popup = tk.Toplevel(root)
+    popup.title("Image Output")
+    apply_icon(popup)
+    popup.transient(root)
+    popup.grab_set()
+    popup.resizable(False, False)
+
+    dpi = tk.IntVar(value=state.get("raster_dpi", DEFAULT_RASTER_DPI))
+    annotated_only = tk.BooleanVar(value=bool(state.get("raster_annotated_only", True)))
+    result = {"ok": False}
+
+    tk.Label(popup, text="Resolution (dpi):", padx=12, pady=8).pack(anchor="w")
+    dpi_row = tk.Frame(popup, padx=12)
+    dpi_row.pack(anchor="w")
+    for value in RASTER_DPI_CHOICES:
+        tk.Radiobutton(dpi_row, text=str(value), variable=dpi, value=value).pack(side="left")
+
+    tk.Checkbutton(
+        popup,
+        text="Only pages with balloons",
+        variable=annotated_only,
+        padx=12,
+        pady=8
+    ).pack(anchor="w")
+
+    def on_ok():
+        result["ok"] = True
+        popup.destroy()
+
+    btn_row = tk.Frame(popup, padx=12, pady=12)
+    btn_row.pack(fill="x")
+    tk.Button(btn_row, text="Save", width=12, command=on_ok).pack(side="left")
+    tk.Button(btn_row, text="Cancel", width=12, command=popup.destroy).pack(side="right")
+
+    popup.bind("<Return>", lambda e: on_ok())
+    popup.bind("<Escape>", lambda e: popup.destroy())
+    popup.wait_window()
+
+    if not result["ok"]:
+        return None
+    state["raster_dpi"] = dpi.get()
+    state["raster_annotated_only"] = annotated_only.get()
+    save_app_state(state)
+    return dpi.get(), annotated_only.get()
 
 
 # =====================================================
@@ -1333,13 +1743,16 @@ def save_report():
         messagebox.showwarning("No File", "No file to save Report")
         return
 
+    if snapshot_running():
+        return
+
     if not balloons:
         messagebox.showwarning("No data", "No balloons to export")
         return
 
     headers = normalize_headers(project_headers)
-    filled_headers = [key for key in HEADER_KEYS if headers.get(key)]
-    if filled_headers and len(filled_headers) < len(HEADER_KEYS):
+    filled_headers = [key for key in report_profile.header_keys if headers.get(key)]
+    if filled_headers and len(filled_headers) < len(report_profile.header_keys):
         if not confirm_missing_headers():
             headers_popup()
             return
@@ -1357,112 +1770,204 @@ def save_report():
     if not report_file:
         return
 
-    shutil.copy(TEMPLATE_XLSX, report_file)
-    wb = load_workbook(report_file)
-    ws = wb.active
-
-    for key, cell in HEADER_CELL_MAP.items():
-        val = headers.get(key)
-        if val not in ("", None):
-            ws[cell].value = val
-
-    # The template has 36 data rows (10-45). Row 45 participates in the merged
-    START_ROW = 10
-    TEMPLATE_ROWS = 35
-    LAST_TEMPLATE_ROW = START_ROW + TEMPLATE_ROWS - 1 
-    INSERT_AT = LAST_TEMPLATE_ROW + 1                 
-    template_row_idx = LAST_TEMPLATE_ROW
-    footer_rows = {46: ws.row_dimensions[46].height,
-                   47: ws.row_dimensions[47].height,
-                   48: ws.row_dimensions[48].height}
-
-    def copy_row_style(src_row_idx, dest_row_idx, clear_values=True):
-        # Copy styles across all columns to preserve borders/alignment
-        for col_idx in range(1, ws.max_column + 1):
-            src_cell = ws.cell(row=src_row_idx, column=col_idx)
-            dest_cell = ws.cell(row=dest_row_idx, column=col_idx)
-            dest_cell._style = copy(src_cell._style)
-            if clear_values:
-                dest_cell.value = None
-        # Copy row height to keep grid consistent
-        ws.row_dimensions[dest_row_idx].height = ws.row_dimensions[src_row_idx].height
-
-    balloon_count = len(balloons)
-    extra_rows = max(0, balloon_count - TEMPLATE_ROWS)
-
-    # Insert new rows just above the merged footer block (row 23+)
-    if extra_rows > 0:
-        ws.insert_rows(INSERT_AT, amount=extra_rows)
-
-        for i in range(extra_rows):
-            target_row = INSERT_AT + i
-            copy_row_style(template_row_idx, target_row)
-
-        # Re-merge the footer block (Legends/Observations/Sign-off) so it
-        # stays intact after the shift, and restore footer row heights.
-        footer_merges = [
-            "A46:B46", "C46:M46",
-            "A47:D47", "E47:H47", "I47:J47", "K47:M47",
-            "A48:D48", "E48:H48", "I48:J48", "K48:M48",
+    rows = balloons.rows(report_profile.fields)
+
+    def on_success(result, seconds):
+        messagebox.showinfo("Saved", f"FAIR report created:\n{report_file}\n\n{len(rows)} balloon(s) in {seconds:.1f} s")
+        try:
+            if messagebox.askyesno("Open file", "Open the saved report now?"):
+                os.startfile(report_file)
+        except Exception:
+            pass
+
+    # The worker only sees detached rows and headers, so editing (or opening
+    # the next drawing) can go on while the report is written
+    run_export_job(
+        "Saving Report", "report", on_success,
+        _export_report_work, report_profile, report_file, rows, headers, exclusive=False
+    )
+
+
+def _export_report_work(job, profile, out_path, rows, headers):
+    # Template parsed and planned once per session; very large reports are streamed
+    profile.save_report(out_path, rows, headers, progress=job.report)
+    return out_path
+
+
+def refresh_report():
+    """Update a report saved earlier in place, keeping what was typed into it."""
+    if not doc:
+        messagebox.showwarning("No File", "No file to refresh Report")
+        return
+
+    if snapshot_running():
+        return
+
+    report_file = filedialog.askopenfilename(
+        title="Refresh FAIR Report",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not report_file:
+        return
+
+    rows = balloons.rows(report_profile.fields)
+    headers = normalize_headers(project_headers)
+
+    def on_success(result, seconds):
+        updated, inserted, deleted = result
+        messagebox.showinfo(
+            "Refreshed",
+            f"FAIR report updated:\n{report_file}\n\n"
+            f"{updated} row(s) changed, {inserted} added, {deleted} removed in {seconds:.1f} s"
+        )
+
+    run_export_job(
+        "Refreshing Report", "report", on_success,
+        _refresh_report_work, report_profile, report_file, rows, headers, exclusive=False
+    )
+
+
+def _refresh_report_work(job, profile, report_path, rows, headers):
+    # Only changed, added and removed rows are rewritten; measured values and
+    # remarks typed into the report stay with their balloons
+    return profile.refresh_report(report_path, rows, headers, progress=job.report)
+
+
+def snapshot_running():
+    """True (after telling the user) while a report or data export is running."""
+    if snapshot_job and snapshot_job.running:
+        messagebox.showinfo("Export Running", "A report or data export is still running.\nWait for it to finish or cancel it first.")
+        return True
+    return False
+
+
+# =====================================================
+# EXPORT BALLOON DATA (CSV / JSON Lines for MES)
+# =====================================================
+def save_data():
+    if not doc:
+        messagebox.showwarning("No File", "No file to export data")
+        return
+
+    if snapshot_running():
+        return
+
+    if not balloons:
+        messagebox.showwarning("No data", "No balloons to export")
+        return
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    out_path = filedialog.asksaveasfilename(
+        title="Export Balloon Data",
+        initialfile=f"FAIR_data_{timestamp}.csv",
+        defaultextension=".csv",
+        filetypes=[
+            ("CSV", "*.csv"),
+            ("JSON Lines", "*.jsonl"),
+            ("CSV, gzipped", "*.csv.gz"),
+            ("JSON Lines, gzipped", "*.jsonl.gz"),
         ]
-        for rng in footer_merges:
-            if rng in ws.merged_cells:
-                ws.unmerge_cells(rng)
-        for rng in footer_merges:
-            min_col, min_row, max_col, max_row = range_boundaries(rng)
-            ws.merge_cells(
-                start_row=min_row + extra_rows,
-                start_column=min_col,
-                end_row=max_row + extra_rows,
-                end_column=max_col,
-            )
-        for src_row, height in footer_rows.items():
-            ws.row_dimensions[src_row + extra_rows].height = height
+    )
+    if not out_path:
+        return
 
-    # Refresh styles on all data rows (including originals) to keep borders/alignments
-    style_src_row = START_ROW  # first data row has canonical formatting
-    total_rows = balloon_count + 1
-    for r in range(START_ROW, START_ROW + total_rows):
-        copy_row_style(style_src_row, r, clear_values=False)
+    data_format, compress = data_file_format(out_path)
+    columns = balloons.columns(DATA_FIELDS)
 
-    def write_num(cell, val):
-        cell.value = val
+    def on_success(count, seconds):
+        size_mb = os.path.getsize(out_path) / (1024 * 1024)
+        messagebox.showinfo("Saved", f"{count} balloon(s) exported to:\n{out_path}\n\n{size_mb:.1f} MB in {seconds:.1f} s")
 
-        if isinstance(val, float) and val.is_integer():
-            cell.number_format = "0.0"
-        else:
-            cell.number_format = "General"
+    run_export_job(
+        "Exporting Data", "balloon data", on_success,
+        _export_data_work, columns, out_path, data_format, compress, exclusive=False
+    )
+
+
+def _export_data_work(job, columns, out_path, data_format, compress):
+    return export_balloon_data(columns, out_path, data_format, compress, progress=job.report)
+
+
+# =====================================================
+# IMPORT MEASURED VALUES (from a filled report)
+# =====================================================
+def import_measurements():
+    global project_dirty
+    if not doc:
+        messagebox.showwarning("No File", "Open file to work on")
+        return
+
+    if export_running():
+        return
+
+    if not balloons:
+        messagebox.showwarning("No data", "No balloons to match measurements to")
+        return
+
+    report_file = filedialog.askopenfilename(
+        title="Import Measured Values From FAIR Report",
+        filetypes=[("Excel files", "*.xlsx")]
+    )
+    if not report_file:
+        return
 
-    # WRITE DATA (flows naturally)
-    row = START_ROW
-    for b in balloons:
-        ws.cell(row=row, column=1).value = b["no"]
-        _c2 = ws.cell(row=row, column=2)
-        write_num(_c2, b["page"] + 1)
-        ws.cell(row=row, column=3).value = b["zone"]
-        ws.cell(row=row, column=4).value = b['char']
-        _c5 = ws.cell(row=row, column=5)
-        write_num(_c5, b["req"])
-        _c6 = ws.cell(row=row, column=6)
-        write_num(_c6, b["pos"])
-        _c7 = ws.cell(row=row, column=7)
-        write_num(_c7, b["neg"])
-        val8 = round(to_number_list_item(b['req']) - to_number_list_item(b['neg']), 2)
-        _c8 = ws.cell(row=row, column=8)
-        write_num(_c8, val8)
-        val9 = round(to_number_list_item(b['req']) + to_number_list_item(b['pos']), 2)
-        _c9 = ws.cell(row=row, column=9)
-        write_num(_c9, val9)
-        ws.cell(row=row, column=10).value = b["equip"]
-        row += 1
-
-    wb.save(report_file)
-    messagebox.showinfo("Saved", f"FAIR report created:\n{report_file}")
     try:
-        if messagebox.askyesno("Open file", "Open the saved report now?"):
-            os.startfile(report_file)
-    except Exception:
-        pass
+        values = report_profile.read_measurements(report_file)
+    except Exception as exc:
+        messagebox.showerror("Import Failed", f"Could not read measured values:\n{exc}")
+        return
+
+    # Match rows to balloons by number; a blank cell keeps the current value,
+    # and a row whose sheet differs from the balloon's page is left alone
+    before, after = {}, {}
+    unmatched = mismatched = 0
+    for number, (sheet, value) in values.items():
+        if value == "":
+            continue
+        if not 1 <= number <= len(balloons):
+            unmatched += 1
+            continue
+        balloon = balloons[number - 1]
+        if sheet is not None and not _same_sheet(sheet, balloon["page"]):
+            mismatched += 1
+            continue
+        if balloon["measured"] != value:
+            before[balloon["id"]] = balloon["measured"]
+            after[balloon["id"]] = value
+
+    if after:
+        set_measurements(after)
+        history.record(
+            "import measurements",
+            undo=lambda: set_measurements(before),
+            redo=lambda: set_measurements(after),
+        )
+        project_dirty = True
+
+    results = balloons.columns(("result",))["result"]
+    message = (
+        f"{len(after)} measured value(s) updated from the report.\n\n"
+        f"Pass: {results.count('pass')}   Fail: {results.count('fail')}"
+    )
+    if unmatched or mismatched:
+        message += f"\n\nSkipped: {unmatched} row(s) with no such balloon, {mismatched} on a different sheet"
+    messagebox.showinfo("Measurements Imported", message)
+
+
+def _same_sheet(sheet, page):
+    try:
+        return int(sheet) == page + 1
+    except (TypeError, ValueError):
+        return False
+
+
+def set_measurements(values):
+    """Set measured values by balloon id."""
+    for balloon_id, value in values.items():
+        balloon = balloons.by_id(balloon_id)
+        if balloon is not None:
+            balloon["measured"] = value
+    update_balloon_list()
 
 
 # =====================================================
@@ -1484,6 +1989,7 @@ def save_project_to_path(project_file):
             "rotation": rotation,
             "selected_balloon_color": normalize_balloon_color(selected_balloon_color)
         },
+        "report_profile": report_profile.key,
         "headers": normalize_headers(project_headers),
         "balloons": []
     }
@@ -1491,6 +1997,7 @@ def save_project_to_path(project_file):
     # Deep copy balloons, excluding UI-only fields
     for b in balloons:
         balloon_data = {
+            "id": b["id"],
             "page": b["page"],
             "no": b["no"],
             "x": b["x"],
@@ -1498,12 +2005,15 @@ def save_project_to_path(project_file):
             "r": b["r"],
             "zone": b["zone"],
             "char": b["char"],
-            "req": b["req"],
-            "neg": b["neg"],
-            "pos": b["pos"],
+            "req": to_json_value(b["req"]),
+            "neg": to_json_value(b["neg"]),
+            "pos": to_json_value(b["pos"]),
             "equip": b["equip"],
             "color": normalize_balloon_color(b.get("color"))
         }
+        # Include the measured value (imported from a filled report) if present
+        if b["measured"] != "":
+            balloon_data["measured"] = to_json_value(b["measured"])
         # Include connector data if present
         if b.get("start_x") is not None:
             balloon_data["start_x"] = b["start_x"]
@@ -1522,7 +2032,8 @@ def save_project_to_path(project_file):
         project_dirty = False
         headers_dirty = False
 
-        state = {"last_project": project_file}
+        state = load_app_state()
+        state["last_project"] = project_file
         save_app_state(state)
 
         return True
@@ -1568,7 +2079,8 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
     """Core project loading logic (no file dialog). Returns True on success, False on failure."""
     try:
         with open(project_file, 'r') as f:
-            project_data = json.load(f)
+            # Decimal keeps numeric fields exactly as they were saved
+            project_data = json.load(f, parse_float=Decimal)
     except json.JSONDecodeError:
         messagebox.showerror("Load Error", "Invalid project file: corrupted or not valid JSON")
         return False
@@ -1615,7 +2127,7 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
             return False
 
     # Close existing document if open
-    global doc, PDF_IN, num_pages, current_page_index, balloons, balloon_no
+    global doc, PDF_IN, num_pages, current_page_index, balloons
     global zoom, offset_x, offset_y, page_cache, pending_start, project_dirty
     global project_headers, headers_dirty, rotation, selected_balloon_color, current_project_path
 
@@ -1641,6 +2153,7 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
 
     # Load balloons
     balloons.clear()
+    history.clear()
     skipped_balloons = []
 
     for balloon_data in project_data["balloons"]:
@@ -1655,10 +2168,10 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
             skipped_balloons.append(f"balloon {balloon_data['no']} - invalid page {balloon_data['page']}")
             continue
 
-        # Create balloon with all data
+        # Create balloon with all data; its number follows from load order
         balloon = {
+            "id": balloon_data.get("id"),
             "page": balloon_data["page"],
-            "no": balloon_data["no"],
             "x": balloon_data["x"],
             "y": balloon_data["y"],
             "r": balloon_data["r"],
@@ -1671,13 +2184,11 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
             "color": normalize_balloon_color(balloon_data.get("color")),
             "highlight": False,  # UI state not saved
             "start_x": balloon_data.get("start_x"),
-            "start_y": balloon_data.get("start_y")
+            "start_y": balloon_data.get("start_y"),
+            "measured": balloon_data.get("measured", "")
         }
         balloons.append(balloon)
 
-    # Recalculate balloon number
-    balloon_no = len(balloons) + 1
-
     # Reset session state
     current_page_index = 0
     zoom = 1.5
@@ -1697,6 +2208,9 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
         view_data.get("selected_balloon_color", selected_balloon_color),
         selected_balloon_color,
     )
+    # Projects saved before report profiles keep the current profile
+    if project_data.get("report_profile") in REPORT_PROFILES:
+        set_report_profile(project_data["report_profile"])
     project_headers = normalize_headers(project_data.get("headers", {}))
 
     # Sync color controls with restored project setting.
@@ -1731,6 +2245,8 @@ def load_project_from_path(project_file, show_success_msg=True, prompt_for_pdf=T
 
 def load_project():
     """Open project with file dialog."""
+    if export_running():
+        return
     project_file = filedialog.askopenfilename(
         title="Open Project",
         filetypes=[("FAIR Project files", "*.fairy"), ("All files", "*.*")]
@@ -1810,6 +2326,18 @@ def auto_restore_last_project():
 def on_app_close():
 
     # Check for unsaved changes
+    running = [job for job in (export_job, snapshot_job) if job and job.running]
+    if running:
+        if not messagebox.askyesno(
+            "Export Running",
+            "An export is still running.\n\nCancel it and close?"
+        ):
+            return
+        for job in running:
+            job.cancel()
+        for job in running:
+            job.wait(5)
+
     if not project_dirty:
         root.destroy()
         return
@@ -1850,233 +2378,274 @@ def update_two_point_ui():
     render_two_point_preview()
 
 
-root = tk.Tk()
-# Start maximized to use full screen
-try:
-    root.state("zoomed")  # Windows
-except Exception:
-    root.attributes("-zoomed", True)  # fallback
-root.title("FAIR-y")
-try:
-    root.iconbitmap(resource_path("app-icon.ico"))
-except Exception:
-    pass
-
-root.protocol("WM_DELETE_WINDOW", on_app_close)
-
-toolbar = tk.Frame(root)
-toolbar.pack(fill="x", padx=5)
-
-#=======================================================
-# UI Button Binds
-#=======================================================
-tk.Button(toolbar, text="Open PDF", command=open_pdf).pack(side="left")
-tk.Button(toolbar, text="Open Project", command=load_project).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Prev Page", command=prev_page).pack(side="left")
-tk.Button(toolbar, text="Next Page", command=next_page).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Rotate Left", command=rotate_left).pack(side="left")
-tk.Button(toolbar, text="Rotate Right", command=rotate_right).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Undo balloon", command=undo).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Save PDF", command=save_pdf).pack(side="left")
-tk.Button(toolbar, text="Save Report", command=save_report).pack(side="left")
-tk.Button(toolbar, text="Save Project", command=save_project).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Headers", command=headers_popup).pack(side="left", padx=(0,5))
-tk.Button(toolbar, text="Help", command=show_shortcuts).pack(side="left")
-
-def render_two_point_preview():
-    if "two_point_preview" not in globals():
-        return
-    c = two_point_preview
-    c.delete("all")
-    w = int(c.cget("width"))
-    h = int(c.cget("height"))
-    padding = 6
-    r = 9
-    cx = w - padding - r
-    cy = h // 2
-    outline = normalize_balloon_color(selected_balloon_color)
-    if two_point_mode:
-        sx = padding + 4
-        sy = cy
-        # project line to circle edge
-        dx = cx - sx
-        dy = cy - sy
-        dist = (dx * dx + dy * dy) ** 0.5 or 1
-        ex = cx - dx * (r / dist)
-        ey = cy - dy * (r / dist)
-        c.create_line(sx, sy, ex, ey, fill=outline, width=2)
-        c.create_oval(sx-3, sy-3, sx+3, sy+3, outline=outline, fill=outline, width=1)
-    c.create_oval(cx-r, cy-r, cx+r, cy+r, outline=outline, width=2)
-
-
-def update_color_swatch():
-    if "color_swatch" not in globals():
-        return
-    color_swatch.configure(bg=normalize_balloon_color(selected_balloon_color))
+if __name__ == "__main__":
+    # Worker processes (parallel PDF export) re-import this module; only the
+    # main process builds the UI. freeze_support() covers the PyInstaller build.
+    multiprocessing.freeze_support()
 
+    root = tk.Tk()
+    # Start maximized to use full screen
+    try:
+        root.state("zoomed")  # Windows
+    except Exception:
+        root.attributes("-zoomed", True)  # fallback
+    root.title("FAIR-y")
+    try:
+        root.iconbitmap(resource_path("app-icon.ico"))
+    except Exception:
+        pass
 
-def pick_balloon_color():
-    global selected_balloon_color, project_dirty
-    _, chosen_hex = colorchooser.askcolor(
-        color=normalize_balloon_color(selected_balloon_color),
-        title="Select Balloon Color"
+    root.protocol("WM_DELETE_WINDOW", on_app_close)
+
+    toolbar = tk.Frame(root)
+    toolbar.pack(fill="x", padx=5)
+
+    #=======================================================
+    # UI Button Binds
+    #=======================================================
+    tk.Button(toolbar, text="Open PDF", command=open_pdf).pack(side="left")
+    tk.Button(toolbar, text="Open Project", command=load_project).pack(side="left", padx=(0,5))
+    tk.Button(toolbar, text="Prev Page", command=prev_page).pack(side="left")
+    tk.Button(toolbar, text="Next Page", command=next_page).pack(side="left", padx=(0,5))
+    tk.Button(toolbar, text="Rotate Left", command=rotate_left).pack(side="left")
+    tk.Button(toolbar, text="Rotate Right", command=rotate_right).pack(side="left", padx=(0,5))
+    tk.Button(toolbar, text="Undo", command=undo).pack(side="left")
+    tk.Button(toolbar, text="Redo", command=redo).pack(side="left", padx=(0,5))
+    tk.Button(toolbar, text="Save PDF", command=save_pdf).pack(side="left")
+    tk.Button(toolbar, text="Save Images", command=save_images).pack(side="left")
+    tk.Button(toolbar, text="Save Report", command=save_report).pack(side="left")
+    tk.Button(toolbar, text="Refresh Report", command=refresh_report).pack(side="left")
+    tk.Button(toolbar, text="Save Data", command=save_data).pack(side="left")
+    tk.Button(toolbar, text="Import Measured", command=import_measurements).pack(side="left")
+    tk.Button(toolbar, text="Save Project", command=save_project).pack(side="left", padx=(0,5))
+    tk.Button(toolbar, text="Headers", command=headers_popup).pack(side="left", padx=(0,5))
+    tk.Label(toolbar, text="Report:").pack(side="left")
+    report_profile_names = {profile.name: key for key, profile in REPORT_PROFILES.items()}
+    report_profile_var = tk.StringVar(value=report_profile.name)
+    report_profile_box = ttk.Combobox(
+        toolbar, textvariable=report_profile_var, values=list(report_profile_names),
+        state="readonly", width=max(len(name) for name in report_profile_names) + 2,
     )
-    if not chosen_hex:
-        return
-    new_color = normalize_balloon_color(chosen_hex, selected_balloon_color)
-    if new_color == selected_balloon_color:
-        return
-    selected_balloon_color = new_color
-    project_dirty = True
-    update_color_swatch()
-    update_preview(balloon_radius_slider.get())
-    render_two_point_preview()
-    if doc:
-        render_overlays()
+    report_profile_box.pack(side="left", padx=(0, 5))
+    report_profile_box.bind(
+        "<<ComboboxSelected>>", lambda e: set_report_profile(report_profile_names[report_profile_var.get()])
+    )
+    tk.Button(toolbar, text="Help", command=show_shortcuts).pack(side="left")
 
-#=======================================================
-# Keyboard Button Binds
-#=======================================================
-root.bind("<Control-O>", lambda e: open_pdf())
-root.bind("<Control-o>", lambda e: open_pdf())
-root.bind("<Control-P>", lambda e: load_project())
-root.bind("<Control-p>", lambda e: load_project())
-root.bind("<Control-H>", lambda e: headers_popup())
-root.bind("<Control-h>", lambda e: headers_popup())
-root.bind("<Shift-C>", lambda e: pick_balloon_color())
-root.bind("<Shift-c>", lambda e: pick_balloon_color())
-root.bind("<Control-Shift-P>", lambda e: save_project())
-root.bind("<Control-Shift-p>", lambda e: save_project())
-root.bind("<Control-S>", lambda e: save_pdf())
-root.bind("<Control-s>", lambda e: save_pdf())
-root.bind("<Control-Shift-S>", lambda e: save_report())
-root.bind("<Right>", lambda e: next_page())
-root.bind("<Left>", lambda e: prev_page())
-root.bind("<Control-Z>", lambda e: undo())
-root.bind("<Control-z>", lambda e: undo())
-root.bind("<Control-/>", lambda e: show_shortcuts())
-root.bind("<Control-plus>", zoom_in_key)
-root.bind("<Control-KP_Add>", zoom_in_key)
-root.bind("<Control-equal>", zoom_in_key)  # Ctrl+= for + on many keyboards
-root.bind("<Control-minus>", zoom_out_key)
-root.bind("<Control-KP_Subtract>", zoom_out_key)
-root.bind("<Shift-Left>",lambda e:  rotate_left())
-root.bind("<Shift-Right>",lambda e: rotate_right())
-root.bind("<Shift-Up>", radius_increase)
-root.bind("<Shift-Down>", radius_decrease)
-root.bind("<Control-Q>", lambda e: on_app_close())
-root.bind("<Control-q>", lambda e: on_app_close())
-root.bind("<Control-T>", lambda e: toggle_two_point_mode())
-root.bind("<Control-t>", lambda e: toggle_two_point_mode())
-
-#=========================zoom slider===============================
-def set_zoom_from_slider(val):
-    """Set absolute zoom from the slider (%), updating label and render."""
-    global zoom
-    try:
-        target = float(val) / 100.0
-    except Exception:
-        return
-    target = max(0.5, min(10.0, target))
-    if zoom_slider_updating:
-        return
-    apply_zoom(target / zoom)
-    update_zoom_ui(target)
-
-def update_zoom_ui(current_zoom):
-    """Keep zoom slider/label in sync after any zoom change (keys/mouse/slider)."""
-    pct = int(current_zoom * 100)
-    if 'zoom_slider' in globals():
-        global zoom_slider_updating
-        zoom_slider_updating = True
+    def render_two_point_preview():
+        if "two_point_preview" not in globals():
+            return
+        c = two_point_preview
+        c.delete("all")
+        w = int(c.cget("width"))
+        h = int(c.cget("height"))
+        padding = 6
+        r = 9
+        cx = w - padding - r
+        cy = h // 2
+        outline = normalize_balloon_color(selected_balloon_color)
+        if two_point_mode:
+            sx = padding + 4
+            sy = cy
+            # project line to circle edge
+            dx = cx - sx
+            dy = cy - sy
+            dist = (dx * dx + dy * dy) ** 0.5 or 1
+            ex = cx - dx * (r / dist)
+            ey = cy - dy * (r / dist)
+            c.create_line(sx, sy, ex, ey, fill=outline, width=2)
+            c.create_oval(sx-3, sy-3, sx+3, sy+3, outline=outline, fill=outline, width=1)
+        c.create_oval(cx-r, cy-r, cx+r, cy+r, outline=outline, width=2)
+
+
+    def update_color_swatch():
+        if "color_swatch" not in globals():
+            return
+        color_swatch.configure(bg=normalize_balloon_color(selected_balloon_color))
+
+
+    def pick_balloon_color():
+        global project_dirty
+        if export_running():
+            return
+        _, chosen_hex = colorchooser.askcolor(
+            color=normalize_balloon_color(selected_balloon_color),
+            title="Select Balloon Color"
+        )
+        if not chosen_hex:
+            return
+        new_color = normalize_balloon_color(chosen_hex, selected_balloon_color)
+        if new_color == selected_balloon_color:
+            return
+        old_color = selected_balloon_color
+        set_selected_balloon_color(new_color)
+        history.record(
+            "change balloon color",
+            undo=lambda: set_selected_balloon_color(old_color),
+            redo=lambda: set_selected_balloon_color(new_color),
+        )
+        project_dirty = True
+        if doc:
+            render_overlays()
+
+
+    def set_selected_balloon_color(value):
+        global selected_balloon_color
+        selected_balloon_color = value
+        update_color_swatch()
+        update_preview(balloon_radius_slider.get())
+        render_two_point_preview()
+
+    #=======================================================
+    # Keyboard Button Binds
+    #=======================================================
+    root.bind("<Control-O>", lambda e: open_pdf())
+    root.bind("<Control-o>", lambda e: open_pdf())
+    root.bind("<Control-P>", lambda e: load_project())
+    root.bind("<Control-p>", lambda e: load_project())
+    root.bind("<Control-H>", lambda e: headers_popup())
+    root.bind("<Control-h>", lambda e: headers_popup())
+    root.bind("<Shift-C>", lambda e: pick_balloon_color())
+    root.bind("<Shift-c>", lambda e: pick_balloon_color())
+    root.bind("<Control-Shift-P>", lambda e: save_project())
+    root.bind("<Control-Shift-p>", lambda e: save_project())
+    root.bind("<Control-S>", lambda e: save_pdf())
+    root.bind("<Control-s>", lambda e: save_pdf())
+    root.bind("<Control-Shift-S>", lambda e: save_report())
+    root.bind("<Right>", lambda e: next_page())
+    root.bind("<Left>", lambda e: prev_page())
+    root.bind("<Control-Z>", lambda e: undo())
+    root.bind("<Control-z>", lambda e: undo())
+    root.bind("<Control-Y>", lambda e: redo())
+    root.bind("<Control-y>", lambda e: redo())
+    root.bind("<Control-Shift-Z>", lambda e: redo())
+    root.bind("<Control-Shift-z>", lambda e: redo())
+    root.bind("<Control-/>", lambda e: show_shortcuts())
+    root.bind("<Control-plus>", zoom_in_key)
+    root.bind("<Control-KP_Add>", zoom_in_key)
+    root.bind("<Control-equal>", zoom_in_key)  # Ctrl+= for + on many keyboards
+    root.bind("<Control-minus>", zoom_out_key)
+    root.bind("<Control-KP_Subtract>", zoom_out_key)
+    root.bind("<Shift-Left>",lambda e:  rotate_left())
+    root.bind("<Shift-Right>",lambda e: rotate_right())
+    root.bind("<Shift-Up>", radius_increase)
+    root.bind("<Shift-Down>", radius_decrease)
+    root.bind("<Control-Q>", lambda e: on_app_close())
+    root.bind("<Control-q>", lambda e: on_app_close())
+    root.bind("<Control-T>", lambda e: toggle_two_point_mode())
+    root.bind("<Control-t>", lambda e: toggle_two_point_mode())
+
+    #=========================zoom slider===============================
+    def set_zoom_from_slider(val):
+        """Set absolute zoom from the slider (%), updating label and render."""
+        global zoom
         try:
-            zoom_slider.set(pct)
-        finally:
-            zoom_slider_updating = False
-
-zoom_slider_updating = False
-
-zoom_slider = tk.Scale(
-    toolbar,
-    from_=50,
-    to=1000,
-    orient="horizontal",
-    label="Zoom %",
-    command=set_zoom_from_slider
-)
-zoom_slider.set(int(zoom * 100))
-zoom_slider.pack(padx=5, side="right")
-update_zoom_ui(zoom)
-
-balloon_radius_slider = tk.Scale(toolbar, from_=3, to=25, orient="horizontal", label="Balloon Size")
-balloon_radius_slider.set(6)
-balloon_radius_slider.pack(side="right")
-
-preview_canvas = tk.Canvas(toolbar, width=50, height=50, bg="#ababab")
-preview_canvas.pack(side="right", padx=5)
-
-def update_preview(val):
-    preview_canvas.delete("all")
-    r = int(val) * zoom
-    preview_canvas.create_oval(
-        25-r,
-        25-r,
-        25+r,
-        25+r,
-        outline=normalize_balloon_color(selected_balloon_color),
-        width=2
+            target = float(val) / 100.0
+        except Exception:
+            return
+        target = max(0.5, min(10.0, target))
+        if zoom_slider_updating:
+            return
+        apply_zoom(target / zoom)
+        update_zoom_ui(target)
+
+    def update_zoom_ui(current_zoom):
+        """Keep zoom slider/label in sync after any zoom change (keys/mouse/slider)."""
+        pct = int(current_zoom * 100)
+        if 'zoom_slider' in globals():
+            global zoom_slider_updating
+            zoom_slider_updating = True
+            try:
+                zoom_slider.set(pct)
+            finally:
+                zoom_slider_updating = False
+
+    zoom_slider_updating = False
+
+    zoom_slider = tk.Scale(
+        toolbar,
+        from_=50,
+        to=1000,
+        orient="horizontal",
+        label="Zoom %",
+        command=set_zoom_from_slider
     )
+    zoom_slider.set(int(zoom * 100))
+    zoom_slider.pack(padx=5, side="right")
+    update_zoom_ui(zoom)
 
-balloon_radius_slider.config(command=update_preview)
-update_preview(balloon_radius_slider.get())
+    balloon_radius_slider = tk.Scale(toolbar, from_=3, to=25, orient="horizontal", label="Balloon Size")
+    balloon_radius_slider.set(6)
+    balloon_radius_slider.pack(side="right")
+
+    preview_canvas = tk.Canvas(toolbar, width=50, height=50, bg="#ababab")
+    preview_canvas.pack(side="right", padx=5)
+
+    def update_preview(val):
+        preview_canvas.delete("all")
+        r = int(val) * zoom
+        preview_canvas.create_oval(
+            25-r,
+            25-r,
+            25+r,
+            25+r,
+            outline=normalize_balloon_color(selected_balloon_color),
+            width=2
+        )
+
+    balloon_radius_slider.config(command=update_preview)
+    update_preview(balloon_radius_slider.get())
+
+    #===========================two-point-mode====================================
+    two_point_button = tk.Button(toolbar, text="Balloon without line", width= 16, command=toggle_two_point_mode)
+    two_point_button.pack(side="right", padx=(8, 0))
+    two_point_preview = tk.Canvas(toolbar, width=50, height=50, bg="#ababab", highlightthickness=0)
+    two_point_preview.pack(side="right", padx=(6, 0))
+    update_two_point_ui()
 
-#===========================two-point-mode====================================
-two_point_button = tk.Button(toolbar, text="Balloon without line", width= 16, command=toggle_two_point_mode)
-two_point_button.pack(side="right", padx=(8, 0))
-two_point_preview = tk.Canvas(toolbar, width=50, height=50, bg="#ababab", highlightthickness=0)
-two_point_preview.pack(side="right", padx=(6, 0))
-update_two_point_ui()
+    color_pick_button = tk.Button(toolbar, text="Pick Balloon Color",width=16, command=pick_balloon_color)
+    color_pick_button.pack(side="right", padx=(8, 0))
+    color_swatch = tk.Canvas(toolbar, width=50, height=50, highlightthickness=0)
+    color_swatch.pack(side="right", padx=(4, 0))
+    update_color_swatch()
 
-color_pick_button = tk.Button(toolbar, text="Pick Balloon Color",width=16, command=pick_balloon_color)
-color_pick_button.pack(side="right", padx=(8, 0))
-color_swatch = tk.Canvas(toolbar, width=50, height=50, highlightthickness=0)
-color_swatch.pack(side="right", padx=(4, 0))
-update_color_swatch()
+    # Splitter so the list can be resized by the user
+    paned = tk.PanedWindow(root, orient="vertical")
+    paned.pack(fill="both", expand=True)
 
-# Splitter so the list can be resized by the user
-paned = tk.PanedWindow(root, orient="vertical")
-paned.pack(fill="both", expand=True)
+    balloon_listbox = tk.Listbox(
+        paned,
+        font=("Consolas", 10),
+        selectmode="browse",
+        exportselection=False
+    )
 
-balloon_listbox = tk.Listbox(
-    paned,
-    font=("Consolas", 10),
-    selectmode="browse",
-    exportselection=False
-)
+    balloon_listbox.bind("<Double-Button-1>", on_balloon_edit_mouse)
+    balloon_listbox.bind("<Return>", on_balloon_edit_key)
+    balloon_listbox.bind("<Delete>", on_balloon_delete_key)
 
-balloon_listbox.bind("<Double-Button-1>", on_balloon_edit_mouse)
-balloon_listbox.bind("<Return>", on_balloon_edit_key)
-balloon_listbox.bind("<Delete>", on_balloon_delete_key)
+    paned.add(balloon_listbox, minsize=120)
 
-paned.add(balloon_listbox, minsize=120)
+    # Give initial focus so arrow keys work without first click
+    root.after(50, balloon_listbox.focus_set)
 
-# Give initial focus so arrow keys work without first click
-root.after(50, balloon_listbox.focus_set)
 
+    canvas = tk.Canvas(paned, bg="gray")
+    paned.add(canvas, minsize=200)
 
-canvas = tk.Canvas(paned, bg="gray")
-paned.add(canvas, minsize=200)
+    canvas.bind("<Button-3>", add_balloon)
+    canvas.bind("<Button-1>", start_pan)
+    canvas.bind("<B1-Motion>", do_pan)
+    canvas.bind("<ButtonRelease-1>", end_pan)
+    canvas.bind("<MouseWheel>", zoom_canvas)
 
-canvas.bind("<Button-3>", add_balloon)
-canvas.bind("<Button-1>", start_pan)
-canvas.bind("<B1-Motion>", do_pan)
-canvas.bind("<ButtonRelease-1>", end_pan)
-canvas.bind("<MouseWheel>", zoom_canvas)
+    # Parse and plan the report template once the window is up
+    root.after(50, lambda: report_profile.prepare())
 
-# Auto-restore last session
-root.after(100, auto_restore_last_project)
+    # Auto-restore last session
+    root.after(100, auto_restore_last_project)
 
-render()
-root.mainloop()
-if doc:
-    doc.close()
+    render()
+    root.mainloop()
+    if doc:
+        doc.close()